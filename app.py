@@ -5,13 +5,14 @@ import os
 # Load env vars from .env file (searching upwards)
 load_dotenv(find_dotenv(), override=True)
 
-from src.ui.components import render_sidebar, check_api_key, render_privacy_notice
+from src.ui.components import render_sidebar, check_api_key, render_privacy_notice, begin_script_run
 from src.ui.pages import (
     render_dashboard, render_learning_path, render_lesson_generator,
     render_labs, render_quiz_engine, render_scenarios,
-    render_submission, render_settings
+    render_submission, render_library, render_settings
 )
 from src.ui.styles import load_custom_css
+from src.core.rate_limit import ServiceBusyError
 
 # Page Config
 st.set_page_config(
@@ -29,6 +30,8 @@ if "openai_api_key" not in st.session_state:
     st.session_state.openai_api_key = ""
 
 def main():
+    # A rerun or page switch abandons whatever the previous run was still generating
+    begin_script_run()
     render_privacy_notice()
     
     page = render_sidebar()
@@ -39,22 +42,28 @@ def main():
     if page != "Settings" and not check_api_key():
         st.stop()
         
-    if page == "Dashboard":
-        render_dashboard()
-    elif page == "Learning Path":
-        render_learning_path()
-    elif page == "Lesson Generator":
-        render_lesson_generator()
-    elif page == "Labs":
-        render_labs()
-    elif page == "Quiz Engine":
-        render_quiz_engine()
-    elif page == "Scenarios":
-        render_scenarios()
-    elif page == "Submission & Grading":
-        render_submission()
-    elif page == "Settings":
-        render_settings()
+    try:
+        if page == "Dashboard":
+            render_dashboard()
+        elif page == "Learning Path":
+            render_learning_path()
+        elif page == "Lesson Generator":
+            render_lesson_generator()
+        elif page == "Labs":
+            render_labs()
+        elif page == "Quiz Engine":
+            render_quiz_engine()
+        elif page == "Scenarios":
+            render_scenarios()
+        elif page == "Submission & Grading":
+            render_submission()
+        elif page == "Library":
+            render_library()
+        elif page == "Settings":
+            render_settings()
+    except ServiceBusyError as e:
+        # Every retry was rejected (429/5xx): ask the learner to come back instead of a traceback
+        st.warning(str(e))
 
 if __name__ == "__main__":
     main()
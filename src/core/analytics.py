@@ -1,19 +1,34 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from src.core.schemas import UserProgress
 from src.core.objectives import ALL_DOMAINS
+from src.core.mastery import MASTERED, rank_objectives
 
 def calculate_domain_scores(progress: UserProgress) -> Dict[str, float]:
-    """Returns average score percentage per domain."""
+    """Returns average score percentage per domain (from the running aggregates: O(1) per domain)."""
     scores = {}
     for domain in ALL_DOMAINS:
-        domain_scores = progress.quiz_scores.get(domain, [])
-        if domain_scores:
-            avg = sum(domain_scores) / len(domain_scores)
-            scores[domain] = round(avg, 1)
-        else:
-            scores[domain] = 0.0
+        stats = progress.domain_stats(domain)
+        scores[domain] = round(stats.mean, 1) if stats.count else 0.0
     return scores
 
+def domain_score_summary(progress: UserProgress) -> Dict[str, Dict[str, float]]:
+    """Per started domain: attempts, mean, spread, recent form (EWMA) and trend in points per quiz."""
+    summary = {}
+    for domain in ALL_DOMAINS:
+        stats = progress.domain_stats(domain)
+        if not stats.count:
+            continue
+        summary[domain] = {
+            "attempts": stats.count,
+            "mean": round(stats.mean, 1),
+            "stddev": round(stats.stddev, 1),
+            "min": stats.min,
+            "max": stats.max,
+            "recent": round(stats.ewma, 1),
+            "trend": round(stats.trend, 1),
+        }
+    return summary
+
 def get_overall_progress(progress: UserProgress) -> float:
     """Returns overall completion percentage (naive implementation)."""
     # Just averaging domain scores for now, can be sophisticated later
@@ -22,17 +37,34 @@ def get_overall_progress(progress: UserProgress) -> float:
         return 0.0
     return round(sum(domain_scores.values()) / len(domain_scores), 1)
 
+def weakest_domain(progress: UserProgress) -> Optional[str]:
+    """Lowest-scoring domain among those started, or None if no quiz has been taken."""
+    # A score of 0 implies not started, which is also a candidate but handled separately
+    started_scores = {k: v for k, v in calculate_domain_scores(progress).items() if v > 0}
+    if not started_scores:
+        return None
+    return min(started_scores, key=started_scores.get)
+
 def recommend_next_step(progress: UserProgress) -> str:
-    """Suggests the next logical action based on weak areas."""
+    """Suggests the weakest practiced objective, else the next one not practiced yet (see rank_objectives)."""
+    if progress.mastery:
+        objective, p, gain = rank_objectives(progress)[0]
+        if p >= MASTERED:
+            return "Great job! Every objective looks mastered. Try a comprehensive scenario."
+        if objective.id not in progress.mastery:
+            return (f"Start {objective.id} '{objective.title}' ({objective.domain}) - you have not practiced it yet, "
+                    f"and your practiced objectives are on track.")
+        return (f"Work on {objective.id} '{objective.title}' ({objective.domain}) - estimated mastery {p:.0%}, "
+                f"expected gain +{gain:.0%} per practice question.")
+
+    # No per-question history yet (progress from before outcomes were recorded): use domain averages
     domain_scores = calculate_domain_scores(progress)
-    # Find lowest scoring domain that isn't 0 (0 implies not started, which is also a candidate but maybe prompt to start)
-    started_scores = {k: v for k, v in domain_scores.items() if v > 0}
+    weakest = weakest_domain(progress)
     
-    if not started_scores:
+    if weakest is None:
         return "Start with 'AI Fundamentals' to build your base."
     
-    weakest_domain = min(started_scores, key=started_scores.get)
-    if started_scores[weakest_domain] < 70:
-        return f"Review '{weakest_domain}' - your average score is {started_scores[weakest_domain]}%."
+    if domain_scores[weakest] < 70:
+        return f"Review '{weakest}' - your average score is {domain_scores[weakest]}%."
     
     return "Great job! Try a comprehensive scenario or move to the next domain."
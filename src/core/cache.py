@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional, Type
+from pydantic import BaseModel, ValidationError
+from src.core.storage import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+
+def make_cache_key(
+    system_prompt: str,
+    user_prompt: str,
+    model: str,
+    temperature: float,
+    schema_name: str
+) -> str:
+    """Content address of a generation request."""
+    material = json.dumps(
+        [system_prompt, user_prompt, model, round(float(temperature), 3), schema_name],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    """
+    Persistent cache of validated generation results, one JSON file per key.
+    The file mtime doubles as the "last used" stamp, so eviction is LRU by
+    mtime once the cache exceeds max_entries or max_bytes. Entries older than
+    max_age_seconds (by creation time) are dropped on read and on eviction.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str, model_schema: Type[BaseModel]) -> Optional[BaseModel]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("schema") != model_schema.__name__ or self._expired(entry):
+            self._remove(path)
+            return None
+
+        try:
+            obj = model_schema(**entry["payload"])
+        except (ValidationError, KeyError, TypeError):
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return obj
+
+    def put(self, key: str, obj: BaseModel):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {
+            "key": key,
+            "schema": type(obj).__name__,
+            "created_at": time.time(),
+            "payload": obj.model_dump(mode="json")
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until within limits."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            now = time.time()
+            # mtime >= created_at, so an entry untouched for max_age is certainly expired
+            live = []
+            for mtime, size, path in entries:
+                if now - mtime > self.max_age_seconds:
+                    self._remove(path)
+                else:
+                    live.append((mtime, size, path))
+
+            live.sort()
+            total_bytes = sum(size for _, size, _ in live)
+            while live and (len(live) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = live.pop(0)
+                total_bytes -= size
+                self._remove(path)
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.cache_dir, name))
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry.get("created_at", 0) > self.max_age_seconds
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
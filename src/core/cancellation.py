@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+# A session with no script run for this long is treated as ended: its token is
+# cancelled and dropped, so the registry only holds live sessions
+SESSION_IDLE_TTL_S = 3600.0
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation is abandoned part-way (navigation, rerun, stale prefetch)."""
+
+
+class CancelToken:
+    """Thread-safe flag checked by streaming loops and section workers."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled(self.reason)
+
+
+class CancelRegistry:
+    """
+    The current CancelToken of every Streamlit session. Each script run gets
+    a fresh token and cancels the previous run's, so generations started by
+    a run that was interrupted (page switch, rerun) stop streaming. Sessions
+    idle for idle_ttl_s are evicted, least recently used first.
+    """
+
+    def __init__(self, idle_ttl_s: float = SESSION_IDLE_TTL_S, clock: Callable[[], float] = time.monotonic):
+        self.idle_ttl_s = idle_ttl_s
+        self.clock = clock
+        self._tokens: "OrderedDict[str, Tuple[CancelToken, float]]" = OrderedDict() # Oldest use first
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def _evict_idle(self, now: float) -> List[CancelToken]:
+        expired = []
+        while self._tokens:
+            session_id, (token, used_at) = next(iter(self._tokens.items()))
+            if now - used_at < self.idle_ttl_s:
+                break
+            del self._tokens[session_id]
+            expired.append(token)
+        return expired
+
+    def _touch(self, session_id: str, token: CancelToken, now: float):
+        self._tokens[session_id] = (token, now)
+        self._tokens.move_to_end(session_id)
+
+    def new_run(self, session_id: str, reason: str = "rerun") -> CancelToken:
+        now = self.clock()
+        with self._lock:
+            previous = self._tokens.pop(session_id, (None, now))[0]
+            expired = self._evict_idle(now)
+            token = CancelToken()
+            self._touch(session_id, token, now)
+        if previous is not None:
+            previous.cancel(reason)
+        for stale in expired:
+            stale.cancel("session expired")
+        return token
+
+    def current(self, session_id: str) -> CancelToken:
+        now = self.clock()
+        with self._lock:
+            token = self._tokens.get(session_id, (CancelToken(), now))[0]
+            self._touch(session_id, token, now)
+            return token
+
+    def cancel(self, session_id: str, reason: str = "cancelled"):
+        with self._lock:
+            entry = self._tokens.get(session_id)
+        if entry is not None:
+            entry[0].cancel(reason)
+
+
+cancel_registry = CancelRegistry()
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from openai import OpenAI
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - httpx ships with the openai SDK
+    httpx = None
+
+# Shared connection pool for every learner session in this process
+POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "64"))
+POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "32"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_POOL_KEEPALIVE_EXPIRY", "90"))
+MAX_IN_FLIGHT = int(os.getenv("OPENAI_MAX_IN_FLIGHT", "48"))
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 120.0
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_http_client = None
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed via httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+def _get_http_client():
+    """One keep-alive httpx pool shared by all OpenAI clients (no per-request TLS handshakes)."""
+    global _http_client
+    if _http_client is None and httpx is not None:
+        from openai import DefaultHttpxClient
+        _http_client = DefaultHttpxClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+    return _http_client
+
+
+def get_shared_client(api_key: str, base_url: Optional[str] = None) -> OpenAI:
+    """
+    Process-wide OpenAI client for an (API key, base URL) pair.
+    Each learner's key gets its own client object, so keys never leak between
+    sessions, but all of them share the same connection pool.
+    """
+    registry_key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), base_url)
+    client = _clients.get(registry_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(registry_key)
+        if client is None:
+            # Retries are left to OpenAIClient, which coordinates them through the shared rate limiter
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=_get_http_client(), max_retries=0)
+            _clients[registry_key] = client
+    return client
+
+
+@contextmanager
+def in_flight_slot():
+    """Bounds the number of concurrent upstream requests across all sessions."""
+    _in_flight.acquire()
+    try:
+        yield
+    finally:
+        _in_flight.release()
+
@@ -0,0 +1,274 @@
+import csv
+import os
+import warnings
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from src.core.mastery import BKT_SLIP_GUESS, DEFAULT_DIFFICULTY, MASTERED, MASTERY_THRESHOLD, OBJECTIVE_IDS, P_INIT
+from src.core.objectives import ALL_DOMAINS, OBJECTIVES
+from src.core.schemas import ProgressSummary, UserProgress
+
+# Exam model for the pass forecast: questions spread evenly over the objectives
+EXAM_QUESTIONS = 60
+PASS_MARK = 70.0
+AT_RISK_PASS_PROBABILITY = 0.5
+COHORT_PERCENTILES = (10, 25, 50, 75, 90)
+
+_OBJECTIVE_INDEX = {objective_id: i for i, objective_id in enumerate(OBJECTIVE_IDS)}
+_DOMAIN_INDEX = {domain: i for i, domain in enumerate(ALL_DOMAINS)}
+# Objective columns of each domain, for per-domain mastery
+_DOMAIN_OBJECTIVES = [np.array([i for i, o in enumerate(OBJECTIVES) if o.domain == d]) for d in ALL_DOMAINS]
+
+
+@dataclass
+class CohortColumns:
+    """
+    Every learner's progress as columns: one row per learner, one column per
+    domain (quiz aggregates) or objective (mastery). Domain scores of domains
+    a learner has not started are NaN.
+    """
+    learner_ids: List[str]
+    quiz_count: np.ndarray      # (learners, domains) quizzes taken
+    quiz_mean: np.ndarray       # (learners, domains) mean score, NaN if none
+    quiz_recent: np.ndarray     # (learners, domains) EWMA score, NaN if none
+    mastery: np.ndarray         # (learners, objectives) P(mastered)
+    attempts: np.ndarray        # (learners, objectives) answered questions
+    lessons_completed: np.ndarray
+    labs_completed: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.learner_ids)
+
+    @classmethod
+    def empty(cls, n: int) -> "CohortColumns":
+        domains, objectives = len(ALL_DOMAINS), len(OBJECTIVE_IDS)
+        return cls(
+            learner_ids=[""] * n,
+            quiz_count=np.zeros((n, domains), dtype=np.int32),
+            quiz_mean=np.full((n, domains), np.nan),
+            quiz_recent=np.full((n, domains), np.nan),
+            mastery=np.full((n, objectives), P_INIT),
+            attempts=np.zeros((n, objectives), dtype=np.int32),
+            lessons_completed=np.zeros(n, dtype=np.int32),
+            labs_completed=np.zeros(n, dtype=np.int32),
+        )
+
+    def _trim(self, n: int) -> "CohortColumns":
+        return CohortColumns(self.learner_ids[:n], self.quiz_count[:n], self.quiz_mean[:n], self.quiz_recent[:n],
+                             self.mastery[:n], self.attempts[:n], self.lessons_completed[:n], self.labs_completed[:n])
+
+
+def build_columns(records: Iterable[Tuple[str, UserProgress]], size_hint: int = 1024) -> CohortColumns:
+    """
+    Streams (learner id, progress) records into columns. Only the running
+    aggregates and mastery states are read, so each learner costs the same
+    however long their history is; the arrays grow by doubling.
+    """
+    columns = CohortColumns.empty(max(size_hint, 1))
+    n = 0
+    for learner_id, progress in records:
+        if n == len(columns):
+            grown = CohortColumns.empty(2 * n)
+            for name in ("quiz_count", "quiz_mean", "quiz_recent", "mastery", "attempts", "lessons_completed", "labs_completed"):
+                getattr(grown, name)[:n] = getattr(columns, name)
+            grown.learner_ids[:n] = columns.learner_ids
+            columns = grown
+        columns.learner_ids[n] = learner_id
+        for domain, stats in progress.score_stats.items():
+            d = _DOMAIN_INDEX.get(domain)
+            if d is not None and stats.count:
+                columns.quiz_count[n, d] = stats.count
+                columns.quiz_mean[n, d] = stats.total / stats.count
+                columns.quiz_recent[n, d] = stats.ewma
+        for objective_id, state in progress.mastery.items():
+            o = _OBJECTIVE_INDEX.get(objective_id)
+            if o is not None:
+                columns.mastery[n, o] = state.p
+                columns.attempts[n, o] = state.attempts
+        columns.lessons_completed[n] = len(progress.completed_lessons)
+        columns.labs_completed[n] = len(progress.completed_labs)
+        n += 1
+    return columns._trim(n)
+
+
+def load_columns(backend, learner_ids: Optional[List[str]] = None) -> CohortColumns:
+    """
+    Every learner in a ProgressBackend (or just learner_ids), as columns. Read
+    with load_summaries, which bypasses any cache and, in SQLite, reads the
+    aggregate tables directly instead of loading each learner.
+    """
+    learner_ids = backend.users() if learner_ids is None else learner_ids
+    columns = CohortColumns.empty(len(learner_ids))
+    n = 0
+    for summary in backend.load_summaries(learner_ids):
+        _fill_rows(columns, n, summary)
+        n += len(summary.user_ids)
+    return columns
+
+
+def _fill_rows(columns: CohortColumns, n: int, summary: ProgressSummary):
+    """Copies a summary's rows into the columns from row n on, one vectorized assignment per column."""
+    end = n + len(summary.user_ids)
+    columns.learner_ids[n:end] = summary.user_ids
+    row = {user_id: n + i for i, user_id in enumerate(summary.user_ids)}
+
+    scores = [(row[user_id], _DOMAIN_INDEX[domain], count, total, ewma)
+              for user_id, domain, count, total, ewma in summary.scores if domain in _DOMAIN_INDEX and count]
+    if scores:
+        rows, cols, counts, totals, ewmas = np.array(scores, dtype=float).T
+        rows, cols = rows.astype(np.intp), cols.astype(np.intp)
+        columns.quiz_count[rows, cols] = counts
+        columns.quiz_mean[rows, cols] = totals / counts
+        columns.quiz_recent[rows, cols] = ewmas
+    mastery = [(row[user_id], _OBJECTIVE_INDEX[objective_id], p, attempts)
+               for user_id, objective_id, p, attempts in summary.mastery if objective_id in _OBJECTIVE_INDEX]
+    if mastery:
+        rows, cols, ps, attempts = np.array(mastery, dtype=float).T
+        rows, cols = rows.astype(np.intp), cols.astype(np.intp)
+        columns.mastery[rows, cols] = ps
+        columns.attempts[rows, cols] = attempts
+    for counts, target in ((summary.lessons, columns.lessons_completed), (summary.labs, columns.labs_completed)):
+        if counts:
+            target[[row[user_id] for user_id in counts]] = list(counts.values())
+
+
+def _normal_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF (Abramowitz & Stegun 7.1.26 erf, |error| < 1.5e-7), vectorized."""
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def forecast_pass(mastery: np.ndarray, pass_mark: float = PASS_MARK, questions: int = EXAM_QUESTIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expected exam score (%) and probability of reaching pass_mark for each
+    row of mastery. A question on an objective is answered correctly with
+    p(1 - slip) + (1 - p)guess; the score's spread over an exam of that many
+    questions is approximated as normal.
+    """
+    slip, guess = BKT_SLIP_GUESS[DEFAULT_DIFFICULTY]
+    p_correct = mastery * (1 - slip) + (1 - mastery) * guess
+    expected = p_correct.mean(axis=1)
+    variance = (p_correct * (1 - p_correct)).mean(axis=1) / questions
+    z = (expected - pass_mark / 100.0) / np.sqrt(np.maximum(variance, 1e-12))
+    return expected * 100.0, _normal_cdf(z)
+
+
+def _percentiles(values: np.ndarray, axis: int = 0) -> Dict[str, np.ndarray]:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns (a domain nobody started) give NaN
+        points = np.nanpercentile(values, COHORT_PERCENTILES, axis=axis)
+    return {f"p{pct}": points[i] for i, pct in enumerate(COHORT_PERCENTILES)}
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+@dataclass
+class CohortReport:
+    learners: Dict[str, np.ndarray]   # one column per learner attribute
+    domains: Dict[str, np.ndarray]    # one row per domain
+    objectives: Dict[str, np.ndarray] # one row per objective
+    summary: Dict[str, float] = field(default_factory=dict)
+
+    def at_risk(self, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        """At-risk learners, least likely to pass first."""
+        rows = np.flatnonzero(self.learners["at_risk"])
+        rows = rows[np.argsort(self.learners["pass_probability"][rows], kind="stable")]
+        if limit is not None:
+            rows = rows[:limit]
+        return [{name: _scalar(column[i]) for name, column in self.learners.items()} for i in rows]
+
+
+def analyze(columns: CohortColumns, pass_mark: float = PASS_MARK,
+            at_risk_probability: float = AT_RISK_PASS_PROBABILITY) -> CohortReport:
+    """Per-learner forecasts and per-domain and per-objective distributions, all as whole-array operations."""
+    n = len(columns)
+    expected, pass_probability = forecast_pass(columns.mastery, pass_mark)
+    active = (columns.attempts.sum(axis=1) > 0) | (columns.quiz_count.sum(axis=1) > 0)
+    at_risk = active & (pass_probability < at_risk_probability)
+
+    domain_mastery = np.stack([columns.mastery[:, cols].mean(axis=1) for cols in _DOMAIN_OBJECTIVES], axis=1)
+    weakest_domain = np.asarray(ALL_DOMAINS, dtype=object)[np.argmin(domain_mastery, axis=1)] if n else np.array([], dtype=object)
+    weakest_objective = np.asarray(OBJECTIVE_IDS, dtype=object)[np.argmin(columns.mastery, axis=1)] if n else np.array([], dtype=object)
+
+    learners = {
+        "learner_id": np.asarray(columns.learner_ids, dtype=object),
+        "expected_score": np.round(expected, 1),
+        "pass_probability": np.round(pass_probability, 3),
+        "at_risk": at_risk,
+        "weakest_domain": weakest_domain,
+        "weakest_objective": weakest_objective,
+        "questions_answered": columns.attempts.sum(axis=1),
+        "quizzes_taken": columns.quiz_count.sum(axis=1),
+        "lessons_completed": columns.lessons_completed,
+        "labs_completed": columns.labs_completed,
+    }
+    for d, domain in enumerate(ALL_DOMAINS):
+        learners[f"score:{domain}"] = np.round(columns.quiz_mean[:, d], 1)
+
+    started = columns.quiz_count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        domains = {
+            "domain": np.asarray(ALL_DOMAINS, dtype=object),
+            "learners_started": started.sum(axis=0),
+            "quizzes": columns.quiz_count.sum(axis=0),
+            "mean_score": np.round(np.nansum(columns.quiz_mean, axis=0) / started.sum(axis=0), 1),
+            "pass_rate": np.round((columns.quiz_recent >= pass_mark).sum(axis=0) / started.sum(axis=0), 3),
+            "mean_mastery": np.round(domain_mastery.mean(axis=0), 3) if n else np.full(len(ALL_DOMAINS), np.nan),
+        }
+    domains.update({name: np.round(values, 1) for name, values in _percentiles(columns.quiz_mean).items()})
+
+    practiced = columns.attempts > 0
+    objectives = {
+        "objective_id": np.asarray(OBJECTIVE_IDS, dtype=object),
+        "domain": np.asarray([o.domain for o in OBJECTIVES], dtype=object),
+        "learners_practiced": practiced.sum(axis=0),
+        "questions_answered": columns.attempts.sum(axis=0),
+        "mean_mastery": np.round(columns.mastery.mean(axis=0), 3) if n else np.full(len(OBJECTIVE_IDS), np.nan),
+        "share_mastered": np.round((columns.mastery >= MASTERED).mean(axis=0), 3) if n else np.zeros(len(OBJECTIVE_IDS)),
+        "share_weak": np.round((practiced & (columns.mastery < MASTERY_THRESHOLD)).mean(axis=0), 3) if n else np.zeros(len(OBJECTIVE_IDS)),
+    }
+    objectives.update({name: np.round(values, 3) for name, values in _percentiles(columns.mastery).items()})
+
+    summary = {
+        "learners": n,
+        "active_learners": int(active.sum()),
+        "forecast_pass_rate": round(float(pass_probability[active].mean()), 3) if active.any() else 0.0,
+        "expected_passes": round(float(pass_probability[active].sum()), 1),
+        "at_risk": int(at_risk.sum()),
+    }
+    return CohortReport(learners, domains, objectives, summary)
+
+
+def _write_csv(path: str, table: Dict[str, np.ndarray]):
+    names = list(table)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*(table[name].tolist() for name in names)))
+
+
+def export_report(report: CohortReport, directory: str, fmt: str = "csv") -> List[str]:
+    """
+    Writes learners, domains and objectives tables to directory, as CSV or as
+    columnar .npz archives (one array per column, loadable with np.load).
+    Returns the paths written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in (("learners", report.learners), ("domains", report.domains), ("objectives", report.objectives)):
+        if fmt == "csv":
+            path = os.path.join(directory, f"{name}.csv")
+            _write_csv(path, table)
+        elif fmt == "npz":
+            path = os.path.join(directory, f"{name}.npz")
+            np.savez_compressed(path, **{column: np.asarray(values).astype(str) if np.asarray(values).dtype == object else values
+                                         for column, values in table.items()})
+        else:
+            raise ValueError(f"Unknown export format {fmt!r} (choose csv or npz)")
+        paths.append(path)
+    return paths
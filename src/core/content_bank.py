@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Type
+from pydantic import BaseModel, ValidationError
+from src.core.schemas import Lesson, Lab, Quiz, Assignment
+from src.core.storage import DATA_DIR
+
+CONTENT_BANK_DIR = os.path.join(DATA_DIR, "content_bank")
+CONTENT_BANK_VERSION = os.getenv("CONTENT_BANK_VERSION", "v1")
+
+BANK_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "lesson": Lesson,
+    "lab": Lab,
+    "quiz": Quiz,
+    "assignment": Assignment
+}
+
+
+def bank_key(kind: str, **params) -> str:
+    """
+    Stable key for a piece of content. params are the PromptBuilder inputs
+    the pages use (domain, objective, level, role, ...).
+    """
+    normalized = {k: (v.strip() if isinstance(v, str) else v) for k, v in params.items()}
+    material = json.dumps([kind, normalized], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+class ContentBank:
+    """
+    Versioned store of pre-generated content:
+        data/content_bank/<version>/<kind>/<key>.json
+        data/content_bank/<version>/manifest.json
+    Pages look content up here first and only call the API on a miss.
+    """
+
+    def __init__(self, root: str = CONTENT_BANK_DIR, version: str = CONTENT_BANK_VERSION):
+        self.root = root
+        self.version = version
+        self._lock = threading.Lock()
+
+    @property
+    def version_dir(self) -> str:
+        return os.path.join(self.root, self.version)
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.version_dir, kind, f"{key}.json")
+
+    def has(self, kind: str, **params) -> bool:
+        return os.path.exists(self._path(kind, bank_key(kind, **params)))
+
+    def get(self, kind: str, **params) -> Optional[BaseModel]:
+        path = self._path(kind, bank_key(kind, **params))
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return BANK_SCHEMAS[kind](**entry["payload"])
+        except (OSError, ValueError, KeyError, ValidationError):
+            return None
+
+    def put(self, kind: str, obj: BaseModel, **params):
+        key = bank_key(kind, **params)
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "kind": kind,
+            "params": params,
+            "created_at": time.time(),
+            "payload": obj.model_dump(mode="json")
+        }
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def count(self, kind: str) -> int:
+        kind_dir = os.path.join(self.version_dir, kind)
+        if not os.path.isdir(kind_dir):
+            return 0
+        return sum(1 for name in os.listdir(kind_dir) if name.endswith(".json"))
+
+    def write_manifest(self, info: Dict[str, Any]):
+        os.makedirs(self.version_dir, exist_ok=True)
+        manifest = {
+            "version": self.version,
+            "updated_at": time.time(),
+            "counts": {kind: self.count(kind) for kind in BANK_SCHEMAS},
+            **info
+        }
+        with self._lock:
+            with open(os.path.join(self.version_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
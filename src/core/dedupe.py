@@ -0,0 +1,146 @@
+import re
+import threading
+import zlib
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+
+# Question stems share boilerplate ("Which of the following best describes ..."). It is
+# stripped before shingling, so a reworded template still matches and two stems that only
+# share the template do not. "not", "true"/"false" and "most"/"least" change the question
+# and are kept
+TEMPLATE_WORDS = frozenset("""
+    a about also an and any are as at be best by can could define defined defines definition describe
+    described describes description do does example explain explains following for from given has have
+    how in into is it its likely main may might of on option options or primary purpose refers select
+    should statement statements that the their these this those to what when where which who why will
+    with would
+""".split())
+NUM_PERM = 128
+# 16 bands x 8 rows: a pair becomes a candidate above Jaccard ~0.7, and one at the
+# threshold is found with probability > 0.999. Shorter bands let stems that only
+# share a few words collide and flood the buckets
+NUM_BANDS = 16
+# Word shingles: stems differing in one content word ("supervised" / "unsupervised",
+# "Question 1" / "Question 2") stay below this
+DEFAULT_THRESHOLD = 0.9
+# A bucket this full holds keys that only share common phrasing; it stops growing (the
+# keys are still reachable through their other bands)
+MAX_BUCKET = 256
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def content_words(text: str) -> List[str]:
+    """Normalized words without template words (all of them if nothing else is left)."""
+    words = normalize(text).split()
+    return [w for w in words if w not in TEMPLATE_WORDS] or words
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Stable 32-bit hashes of the content words and adjacent word pairs of the text."""
+    words = content_words(text)
+    grams = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])} or {""}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text)
+        # (a*x + b) mod p for every permutation at once; uint64 overflow is part of the hash
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def estimated_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """MinHash estimate of the Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of texts with LSH banding: a query only compares
+    against entries sharing at least one band, scored in one NumPy
+    comparison against the signature matrix, so lookups stay fast as the
+    index grows.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM,
+                 num_bands: int = NUM_BANDS, seed: int = 1, max_bucket: int = MAX_BUCKET):
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be a multiple of num_bands")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, seed)
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.max_bucket = max_bucket
+        self._bands: List[Dict[bytes, List[int]]] = [{} for _ in range(num_bands)]
+        self._matrix = np.zeros((1024, num_perm), dtype=np.uint32) # One signature per row
+        self._keys: List[Hashable] = [] # Row -> key
+        self._rows: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(text)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.num_bands)]
+
+    def find_signature(self, signature: np.ndarray) -> Optional[Hashable]:
+        """Key of the most similar indexed entry at or above the threshold, or None."""
+        with self._lock:
+            candidates = set()
+            for band, band_key in zip(self._bands, self._band_keys(signature)):
+                candidates.update(band.get(band_key, ()))
+            if not candidates:
+                return None
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            scores = np.count_nonzero(self._matrix[rows] == signature, axis=1)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold * len(signature):
+                return None
+            return self._keys[rows[best]]
+
+    def find(self, text: str) -> Optional[Hashable]:
+        return self.find_signature(self.signature(text))
+
+    def add_signature(self, key: Hashable, signature: np.ndarray):
+        with self._lock:
+            if key in self._rows:
+                return
+            row = len(self._keys)
+            if row == len(self._matrix):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+            self._matrix[row] = signature
+            self._keys.append(key)
+            self._rows[key] = row
+            for band, band_key in zip(self._bands, self._band_keys(signature)):
+                bucket = band.setdefault(band_key, [])
+                if len(bucket) < self.max_bucket:
+                    bucket.append(row)
+
+    def add(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """Indexes text unless it near-duplicates an entry; returns that entry's key (None if added)."""
+        signature = self.signature(text)
+        duplicate = self.find_signature(signature)
+        if duplicate is None:
+            self.add_signature(key, signature)
+        return duplicate
+
@@ -0,0 +1,102 @@
+import threading
+from typing import Any, Dict
+from src.core.storage import load_settings
+from src.core.telemetry import MetricsStore
+
+# Hedge once the first chunk is later than this percentile of recent TTFTs for the task
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_DELAY_MS = 500.0
+# Used until the task has enough TTFT samples for a percentile
+HEDGE_DEFAULT_DELAY_MS = 5000.0
+HEDGE_MIN_SAMPLES = 20
+HEDGE_SAMPLE_WINDOW = 200
+# Every hedgeable call earns this fraction of a hedge (so at most ~10% extra requests),
+# banked up to HEDGE_MAX_CREDIT for bursts of stalls
+HEDGE_BUDGET_FRACTION = 0.1
+HEDGE_MAX_CREDIT = 3.0
+
+
+class HedgePolicy:
+    """
+    Decides when a generation call whose first chunk is late gets a duplicate
+    request, and caps how many duplicates are sent. The first of the two
+    streams to produce content wins and the other one is closed.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+        default_delay_ms: float = HEDGE_DEFAULT_DELAY_MS,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        budget_fraction: float = HEDGE_BUDGET_FRACTION,
+        max_credit: float = HEDGE_MAX_CREDIT
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.min_samples = min_samples
+        self.budget_fraction = budget_fraction
+        self.max_credit = max_credit
+        self._credit = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "fired": 0, "won": 0, "over_budget": 0}
+
+    def deadline_ms(self, metrics: MetricsStore, task: str, model: str) -> float:
+        """How long to wait for the first chunk before hedging."""
+        samples = metrics.upstream_values("ttft_ms", task, model, limit=HEDGE_SAMPLE_WINDOW)
+        if len(samples) < self.min_samples:
+            return self.default_delay_ms
+        observed = metrics.percentile("ttft_ms", self.percentile, task, model, limit=HEDGE_SAMPLE_WINDOW)
+        return max(self.min_delay_ms, observed)
+
+    def on_call(self):
+        """A hedgeable call started: it earns part of a hedge."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self._credit = min(self.max_credit, self._credit + self.budget_fraction)
+
+    def try_fire(self) -> bool:
+        """Spends one hedge from the budget; False when the budget is used up."""
+        with self._lock:
+            if self._credit < 1.0:
+                self.stats["over_budget"] += 1
+                return False
+            self._credit -= 1.0
+            self.stats["fired"] += 1
+            return True
+
+    def on_hedge_won(self):
+        with self._lock:
+            self.stats["won"] += 1
+
+    def update(self, settings: Dict[str, Any]):
+        """Applies the hedging part of the persisted settings."""
+        self.enabled = bool(settings.get("hedge_requests", False))
+        self.percentile = float(settings.get("hedge_percentile", HEDGE_PERCENTILE))
+
+    def to_settings(self) -> Dict[str, Any]:
+        return {"hedge_requests": self.enabled, "hedge_percentile": self.percentile}
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "HedgePolicy":
+        policy = cls()
+        policy.update(settings)
+        return policy
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            fired = self.stats["fired"]
+            return {
+                "Hedgeable calls": self.stats["calls"],
+                "Hedges fired": fired,
+                "Hedges won": self.stats["won"],
+                "Win rate": f"{self.stats['won'] / fired:.0%}" if fired else "-",
+                "Skipped (budget)": self.stats["over_budget"],
+            }
+
+
+# Process-wide hedging config, kept in sync with Settings
+hedge_policy = HedgePolicy.from_settings(load_settings())
@@ -0,0 +1,184 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Optional
+from src.core.cancellation import CancelToken, GenerationCancelled
+from src.core.schemas import Lesson
+from src.core.prompts import PromptBuilder
+
+DEFAULT_SECTION_CONCURRENCY = 4
+MAX_SECTION_CONCURRENCY = 8
+
+SECTION_WRITER_PROMPT = PromptBuilder.SYSTEM_SECTION
+
+# Streamed section text is pushed to the UI at most this often, or sooner when a
+# paragraph completes, but never faster than the minimum (avoids re-render storms)
+STREAM_RENDER_INTERVAL_MS = 250
+MIN_RENDER_INTERVAL_MS = 50
+
+# Per-section states reported through the progress callback
+SECTION_PENDING = "pending"
+SECTION_WRITING = "writing"
+SECTION_DONE = "done"
+SECTION_FAILED = "failed"
+
+
+def _write_section(client, prompt: str, on_start: Callable[[], None], parts: List[str], cancel_token: CancelToken) -> str:
+    """Streams one section body into parts (readable by the caller meanwhile) and returns the joined markdown."""
+    cancel_token.raise_if_cancelled()
+    on_start()
+    for text_chunk in client.generate_chat_response(SECTION_WRITER_PROMPT, [{"role": "user", "content": prompt}],
+                                                    task="section", cancel_token=cancel_token):
+        parts.append(text_chunk)
+        cancel_token.raise_if_cancelled()
+    return "".join(parts)
+
+
+class _StreamThrottle:
+    """Decides when a section's streamed text is worth re-rendering."""
+
+    def __init__(self, count: int, interval_ms: float):
+        self.interval = interval_ms / 1000.0
+        self.min_interval = min(MIN_RENDER_INTERVAL_MS / 1000.0, self.interval)
+        self.last_flush = [0.0] * count
+        self.last_text = [""] * count
+
+    def should_flush(self, index: int, text: str, now: float) -> bool:
+        if text == self.last_text[index]:
+            return False
+        elapsed = now - self.last_flush[index]
+        if elapsed >= self.interval:
+            return True
+        # A paragraph finished since the last render
+        return elapsed >= self.min_interval and text.count("\n\n") > self.last_text[index].count("\n\n")
+
+    def flushed(self, index: int, text: str, now: float):
+        self.last_flush[index] = now
+        self.last_text[index] = text
+
+
+def expand_sections(
+    client,
+    lesson: Lesson,
+    role: str,
+    max_concurrency: int = DEFAULT_SECTION_CONCURRENCY,
+    on_progress: Optional[Callable[[List[str]], None]] = None,
+    thread_initializer: Optional[Callable[[], None]] = None,
+    cancel_token: Optional[CancelToken] = None,
+    on_section_update: Optional[Callable[[int, str, str], None]] = None,
+    render_interval_ms: float = STREAM_RENDER_INTERVAL_MS
+) -> Lesson:
+    """
+    Writes the body of every section of an outlined lesson.
+    All section prompts are submitted at once to a bounded thread pool, so the
+    wall-clock time is roughly that of the slowest section instead of the sum.
+    Results are written back into lesson.sections in their original order.
+
+    on_progress is always called from the calling thread (safe for Streamlit)
+    with the list of per-section states. on_section_update(index, text, state)
+    is also called from the calling thread with each section's text so far,
+    throttled to render_interval_ms (sooner on paragraph boundaries), and once
+    more when the section finishes.
+
+    When cancel_token is cancelled, sections not yet started are dropped, the
+    running ones close their streams, and GenerationCancelled is raised. If
+    the caller is interrupted (e.g. Streamlit stops the script on a page
+    switch), the token is cancelled so no section keeps streaming.
+    """
+    cancel_token = cancel_token or CancelToken()
+    sections = lesson.sections
+    if not sections:
+        return lesson
+
+    max_concurrency = max(1, min(max_concurrency, MAX_SECTION_CONCURRENCY, len(sections)))
+    states = [SECTION_PENDING] * len(sections)
+    started = [False] * len(sections)
+    buffers: List[List[str]] = [[] for _ in sections]
+    throttle = _StreamThrottle(len(sections), render_interval_ms)
+    last_reported = []
+
+    def report():
+        # Workers only flip a flag; the state list is owned by this thread
+        for i, flag in enumerate(started):
+            if flag and states[i] == SECTION_PENDING:
+                states[i] = SECTION_WRITING
+        if on_progress and states != last_reported:
+            last_reported[:] = states
+            on_progress(list(states))
+        if on_section_update:
+            now = time.monotonic()
+            for i, state in enumerate(states):
+                if state == SECTION_WRITING:
+                    text = "".join(buffers[i])
+                    if throttle.should_flush(i, text, now):
+                        throttle.flushed(i, text, now)
+                        on_section_update(i, text, state)
+
+    def mark_started(index: int) -> Callable[[], None]:
+        def _mark():
+            started[index] = True
+        return _mark
+
+    report()
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_concurrency, initializer=thread_initializer) as pool:
+        futures = {}
+        for i, section in enumerate(sections):
+            prompt = PromptBuilder.section_content_prompt(
+                section.title, lesson.domain, role, lesson.overview
+            )
+            futures[pool.submit(_write_section, client, prompt, mark_started(i), buffers[i], cancel_token)] = i
+
+        pending = set(futures)
+        poll_interval = 0.5 if on_section_update is None else throttle.min_interval
+        try:
+            while pending:
+                cancel_token.raise_if_cancelled()
+                # Poll so that "writing" transitions and streamed text show up before completion
+                done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures[future]
+                    try:
+                        sections[i].content = future.result()
+                        states[i] = SECTION_DONE
+                    except Exception as e:
+                        states[i] = SECTION_FAILED
+                        errors.append(e)
+                    if on_section_update:
+                        text = sections[i].content if states[i] == SECTION_DONE else "".join(buffers[i])
+                        on_section_update(i, text, states[i])
+                report()
+        except BaseException:
+            # Don't let the pool's shutdown wait for sections nobody will read
+            cancel_token.cancel("aborted")
+            for future in pending:
+                future.cancel()
+            raise
+
+    if errors:
+        raise errors[0]
+    return lesson
+
+
+def build_lesson(
+    client,
+    domain: str,
+    objective: str,
+    level: str,
+    duration: int,
+    role: str,
+    max_concurrency: int = DEFAULT_SECTION_CONCURRENCY,
+    use_cache: bool = True,
+    cancel_token: Optional[CancelToken] = None
+) -> Optional[Lesson]:
+    """Outline + concurrent section expansion without any UI (used for batch generation)."""
+    outline_prompt = PromptBuilder.lesson_outline_prompt(domain, objective, level, duration, role)
+    lesson_obj = None
+    for chunk in client.generate_content_stream(PromptBuilder.SYSTEM_LESSON, outline_prompt, Lesson, use_cache=use_cache,
+                                                task="outline", cancel_token=cancel_token):
+        if isinstance(chunk, Lesson):
+            lesson_obj = chunk
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+    if lesson_obj is None:
+        return None
+    return expand_sections(client, lesson_obj, role, max_concurrency=max_concurrency, cancel_token=cancel_token)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from pydantic import ValidationError
+from src.core.schemas import Lesson
+from src.core.storage import DATA_DIR
+
+LESSON_INDEX_DIR = os.path.join(DATA_DIR, "lesson_index")
+NGRAM_SIZES = (2, 3, 4)
+DEFAULT_THRESHOLD = 0.75
+
+# Expanded before matching so "IT Support Spec." and "IT support specialist" agree
+ROLE_ABBREVIATIONS = {
+    "spec": "specialist",
+    "mgr": "manager",
+    "mngr": "manager",
+    "eng": "engineer",
+    "engr": "engineer",
+    "admin": "administrator",
+    "sysadmin": "system administrator",
+    "dev": "developer",
+    "sr": "senior",
+    "jr": "junior",
+    "assoc": "associate",
+    "dir": "director",
+    "exec": "executive",
+    "tech": "technician",
+}
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_role(role: str) -> str:
+    words = _NON_WORD.sub(" ", role.lower()).split()
+    return " ".join(ROLE_ABBREVIATIONS.get(w, w) for w in words)
+
+
+def char_ngrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1))
+
+
+@dataclass
+class LessonMatch:
+    lesson_id: str
+    role: str
+    score: float
+
+
+class LessonIndex:
+    """
+    Previously generated lessons, looked up by objective/level/duration and
+    the closest audience role (character n-gram TF-IDF, cosine similarity):
+        data/lesson_index/entries.json
+        data/lesson_index/lessons/<id>.json
+    """
+
+    def __init__(self, root: str = LESSON_INDEX_DIR, threshold: float = DEFAULT_THRESHOLD):
+        self.root = root
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, dict]] = None
+        self._vectors: Dict[str, Dict[str, float]] = {}
+        self._idf: Dict[str, float] = {}
+
+    @property
+    def _entries_path(self) -> str:
+        return os.path.join(self.root, "entries.json")
+
+    def _lesson_path(self, lesson_id: str) -> str:
+        return os.path.join(self.root, "lessons", f"{lesson_id}.json")
+
+    def _load(self) -> Dict[str, dict]:
+        """Caller holds the lock."""
+        if self._entries is None:
+            try:
+                with open(self._entries_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+            self._reindex()
+        return self._entries
+
+    def _reindex(self):
+        """Recomputes IDF over all indexed roles and the stored role vectors."""
+        counts = {lesson_id: char_ngrams(entry["role_norm"]) for lesson_id, entry in self._entries.items()}
+        df = Counter(gram for grams in counts.values() for gram in grams)
+        total = len(counts)
+        self._idf = {gram: math.log((1 + total) / (1 + n)) + 1 for gram, n in df.items()}
+        self._vectors = {lesson_id: self._vectorize(grams) for lesson_id, grams in counts.items()}
+
+    def _vectorize(self, grams: Counter) -> Dict[str, float]:
+        # Unseen n-grams get the maximum IDF, as if they occurred in no indexed role
+        max_idf = math.log(1 + len(self._entries or ())) + 1
+        weights = {gram: count * self._idf.get(gram, max_idf) for gram, count in grams.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {gram: w / norm for gram, w in weights.items()}
+
+    @staticmethod
+    def _lesson_id(objective_id: str, level: str, duration: int, role_norm: str) -> str:
+        material = json.dumps([objective_id, level, duration, role_norm])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+    def add(self, lesson: Lesson, objective_id: str, level: str, duration: int, role: str) -> str:
+        role_norm = normalize_role(role)
+        lesson_id = self._lesson_id(objective_id, level, duration, role_norm)
+        path = self._lesson_path(lesson_id)
+        with self._lock:
+            entries = self._load()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(lesson.model_dump(mode="json"), f)
+            os.replace(tmp_path, path)
+
+            entries[lesson_id] = {
+                "objective_id": objective_id,
+                "level": level,
+                "duration": duration,
+                "role": role.strip(),
+                "role_norm": role_norm,
+                "created_at": time.time()
+            }
+            tmp_path = f"{self._entries_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self._entries_path)
+            self._reindex()
+        return lesson_id
+
+    def search(self, objective_id: str, level: str, duration: int, role: str, k: int = 3) -> List[LessonMatch]:
+        """Top-k lessons for the same objective/level/duration, by role similarity (no threshold)."""
+        role_norm = normalize_role(role)
+        with self._lock:
+            entries = self._load()
+            query = self._vectorize(char_ngrams(role_norm))
+            matches = []
+            for lesson_id, entry in entries.items():
+                if (entry["objective_id"], entry["level"], entry["duration"]) != (objective_id, level, duration):
+                    continue
+                vector = self._vectors[lesson_id]
+                score = 1.0 if entry["role_norm"] == role_norm else sum(w * vector.get(g, 0.0) for g, w in query.items())
+                matches.append(LessonMatch(lesson_id, entry["role"], round(score, 4)))
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:k]
+
+    def best_match(self, objective_id: str, level: str, duration: int, role: str) -> Optional[LessonMatch]:
+        """The most similar cached lesson, if it clears the similarity threshold."""
+        matches = self.search(objective_id, level, duration, role, k=1)
+        if matches and matches[0].score >= self.threshold:
+            return matches[0]
+        return None
+
+    def load(self, lesson_id: str) -> Optional[Lesson]:
+        try:
+            with open(self._lesson_path(lesson_id), "r", encoding="utf-8") as f:
+                return Lesson(**json.load(f))
+        except (OSError, ValueError, ValidationError):
+            return None
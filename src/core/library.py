@@ -0,0 +1,199 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type, Union
+from pydantic import BaseModel
+from src.core.lesson_index import normalize_role
+from src.core.schemas import Lesson, Lab, Quiz, Assignment
+from src.core.storage import DATA_DIR
+
+ARTIFACT_LIBRARY_DB = os.path.join(DATA_DIR, "library.db")
+
+ARTIFACT_KINDS: Dict[str, Type[BaseModel]] = {"lesson": Lesson, "lab": Lab, "quiz": Quiz, "assignment": Assignment}
+Artifact = Union[Lesson, Lab, Quiz, Assignment]
+
+_SEARCH_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def artifact_kind(artifact: Artifact) -> str:
+    for kind, model in ARTIFACT_KINDS.items():
+        if isinstance(artifact, model):
+            return kind
+    raise TypeError(f"Not a library artifact: {type(artifact).__name__}")
+
+
+def artifact_title(artifact: Artifact) -> str:
+    if isinstance(artifact, Quiz):
+        return f"{artifact.domain} quiz ({len(artifact.questions)} questions)"
+    return artifact.title
+
+
+def artifact_text(artifact: Artifact) -> str:
+    """Everything worth searching in an artifact besides its title."""
+    if isinstance(artifact, Lesson):
+        parts = [artifact.overview, *artifact.key_terms, *artifact.misconceptions]
+        parts += [f"{s.title}\n{s.content}" for s in artifact.sections]
+        parts += [f"{c.question}\n{c.answer}" for c in artifact.checks]
+    elif isinstance(artifact, Lab):
+        parts = [artifact.goal, *artifact.tools, *artifact.rubric, *artifact.hints]
+        parts += [step.instruction for step in artifact.steps]
+    elif isinstance(artifact, Quiz):
+        parts = [f"{q.prompt}\n{' '.join(q.options)}\n{q.rationale}\n{' '.join(q.tags)}" for q in artifact.questions]
+    else:
+        parts = [artifact.scenario, artifact.task, *artifact.deliverables, artifact.submission_requirements,
+                 *artifact.rubric, *artifact.self_check]
+    return "\n".join(parts)
+
+
+def fts_query(text: str) -> Optional[str]:
+    """User input as an FTS5 query: every word must appear, the last one as a prefix (search as you type)."""
+    terms = _SEARCH_TERM.findall(text.lower())
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+@dataclass
+class LibraryEntry:
+    artifact_id: str
+    kind: str
+    title: str
+    domain: str
+    objective_id: Optional[str]
+    level: Optional[str]
+    role: Optional[str]
+    created_at: float
+    snippet: str = ""
+
+
+class ArtifactLibrary:
+    """
+    Every lesson, lab, quiz and assignment shown to a learner, kept so it can
+    be reopened without calling the API. Artifacts are keyed by kind, domain,
+    objective, level and role, and a full-text index (SQLite FTS5) covers
+    titles, sections, steps, questions and rubrics. Identical artifacts are
+    stored once.
+    """
+
+    def __init__(self, db_path: str = ARTIFACT_LIBRARY_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    objective_id TEXT,
+                    level TEXT,
+                    role TEXT,
+                    role_norm TEXT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_artifacts_key ON artifacts(kind, domain, objective_id, level, role_norm);
+                CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts(created_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS artifacts_fts USING fts5(
+                    artifact_id UNINDEXED, title, body, tokenize = 'porter unicode61'
+                );
+            """)
+        return self._conn
+
+    @staticmethod
+    def _artifact_id(kind: str, payload: str) -> str:
+        return hashlib.sha256(f"{kind}\n{payload}".encode("utf-8")).hexdigest()[:32]
+
+    def add(self, artifact: Artifact, objective_id: Optional[str] = None, level: Optional[str] = None,
+            role: Optional[str] = None) -> str:
+        """Stores artifact (once) and returns its id. objective_id defaults to the artifact's own."""
+        kind = artifact_kind(artifact)
+        payload = artifact.model_dump_json()
+        artifact_id = self._artifact_id(kind, payload)
+        objective_id = objective_id or getattr(artifact, "objective_id", None)
+        level = level or getattr(getattr(artifact, "level", None), "value", None)
+        title = artifact_title(artifact)
+        role = role.strip() if role else None
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                added = conn.execute(
+                    "INSERT OR IGNORE INTO artifacts (id, kind, title, domain, objective_id, level, role, role_norm, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (artifact_id, kind, title, artifact.domain, objective_id, level, role,
+                     normalize_role(role) if role else None, payload, time.time())
+                ).rowcount
+                if added:
+                    conn.execute("INSERT INTO artifacts_fts (artifact_id, title, body) VALUES (?, ?, ?)",
+                                 (artifact_id, title, artifact_text(artifact)))
+        return artifact_id
+
+    def load(self, artifact_id: str) -> Optional[Artifact]:
+        with self._lock:
+            row = self._connection().execute("SELECT kind, payload FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        if row is None:
+            return None
+        return ARTIFACT_KINDS[row[0]].model_validate_json(row[1])
+
+    def delete(self, artifact_id: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM artifacts WHERE id = ?", (artifact_id,))
+                conn.execute("DELETE FROM artifacts_fts WHERE artifact_id = ?", (artifact_id,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+
+    def _filters(self, kind: Optional[str], domain: Optional[str], objective_id: Optional[str],
+                 level: Optional[str], role: Optional[str]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, value in (("kind", kind), ("domain", domain), ("objective_id", objective_id), ("level", level)):
+            if value:
+                clauses.append(f"a.{column} = ?")
+                params.append(value)
+        if role:
+            clauses.append("a.role_norm = ?")
+            params.append(normalize_role(role))
+        return (" AND ".join(clauses) or "1"), params
+
+    def search(self, query: str = "", kind: Optional[str] = None, domain: Optional[str] = None,
+               objective_id: Optional[str] = None, level: Optional[str] = None, role: Optional[str] = None,
+               limit: int = 50) -> List[LibraryEntry]:
+        """
+        Artifacts matching every filter given, best text match first (BM25,
+        titles weighted over bodies), or newest first when there is no query.
+        """
+        where, params = self._filters(kind, domain, objective_id, level, role)
+        columns = "a.id, a.kind, a.title, a.domain, a.objective_id, a.level, a.role, a.created_at"
+        match = fts_query(query)
+        with self._lock:
+            conn = self._connection()
+            if match:
+                rows = conn.execute(
+                    f"SELECT {columns}, snippet(artifacts_fts, 2, '**', '**', '…', 16) FROM artifacts_fts "
+                    f"JOIN artifacts a ON a.id = artifacts_fts.artifact_id "
+                    f"WHERE artifacts_fts MATCH ? AND {where} "
+                    f"ORDER BY bm25(artifacts_fts, 0.0, 5.0, 1.0) LIMIT ?",
+                    [match, *params, limit]
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {columns}, '' FROM artifacts a WHERE {where} ORDER BY a.created_at DESC LIMIT ?",
+                    [*params, limit]
+                ).fetchall()
+        return [LibraryEntry(*row) for row in rows]
@@ -0,0 +1,189 @@
+import re
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from src.core.objectives import OBJECTIVES, LearningObjective, get_objectives_by_domain
+from src.core.scheduler import schedule_outcomes
+from src.core.schemas import DifficultyLevel, ObjectiveMastery, QuestionOutcome, Quiz, UserProgress
+
+# Bayesian knowledge tracing: prior mastery and the chance one practiced question teaches the objective
+P_INIT = 0.2
+P_LEARN = 0.15
+# (slip, guess) by question difficulty: easy questions are rarely missed but easier to guess
+BKT_SLIP_GUESS = {
+    DifficultyLevel.BEGINNER.value: (0.05, 0.25),
+    DifficultyLevel.INTERMEDIATE.value: (0.10, 0.20),
+    DifficultyLevel.ADVANCED.value: (0.15, 0.15),
+}
+DEFAULT_DIFFICULTY = DifficultyLevel.INTERMEDIATE.value
+
+# Below this an objective the learner has practiced is listed in weak_objectives
+MASTERY_THRESHOLD = 0.6
+MASTERED = 0.95
+
+OBJECTIVE_IDS = [o.id for o in OBJECTIVES]
+_OBJECTIVE_INDEX = {objective_id: i for i, objective_id in enumerate(OBJECTIVE_IDS)}
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "for", "is", "are", "vs", "at", "on", "or", "with", "what", "which"}
+
+
+def bkt_update(p, correct, slip, guess):
+    """
+    One BKT step: the posterior after observing the answer, then the chance
+    of learning from the attempt. Works element-wise on NumPy arrays.
+    """
+    right = p * (1 - slip) / (p * (1 - slip) + (1 - p) * guess)
+    wrong = p * slip / (p * slip + (1 - p) * (1 - guess))
+    posterior = np.where(correct, right, wrong)
+    return posterior + (1 - posterior) * P_LEARN
+
+
+def slip_guess(difficulty: str) -> Tuple[float, float]:
+    return BKT_SLIP_GUESS.get(difficulty, BKT_SLIP_GUESS[DEFAULT_DIFFICULTY])
+
+
+def apply_outcomes(progress: UserProgress, outcomes: Iterable[QuestionOutcome]):
+    """
+    Folds outcomes into mastery, weak_objectives and the review schedule
+    incrementally (O(1) per outcome). The outcomes themselves are not kept
+    on progress: backends store them (see ProgressBackend.question_outcomes).
+    """
+    outcomes = list(outcomes)
+    progress.questions_answered += len(outcomes)
+    for outcome in outcomes:
+        if not outcome.objective_id:
+            continue
+        state = progress.mastery.get(outcome.objective_id) or ObjectiveMastery(p=P_INIT)
+        slip, guess = slip_guess(outcome.difficulty)
+        state.p = float(bkt_update(state.p, outcome.correct, slip, guess))
+        state.attempts += 1
+        state.correct += int(outcome.correct)
+        progress.mastery[outcome.objective_id] = state
+    progress.weak_objectives = weak_objectives(progress.mastery)
+    schedule_outcomes(progress, outcomes)
+
+
+def weak_objectives(mastery: Mapping[str, ObjectiveMastery]) -> List[str]:
+    """Practiced objectives below MASTERY_THRESHOLD, weakest first."""
+    weak = [(state.p, objective_id) for objective_id, state in mastery.items()
+            if state.attempts and state.p < MASTERY_THRESHOLD]
+    return [objective_id for _, objective_id in sorted(weak)]
+
+
+def fit_mastery(histories: Mapping[str, Sequence[QuestionOutcome]]) -> Tuple[List[str], np.ndarray]:
+    """
+    Refits every learner's mastery of every objective from their outcome
+    histories in one vectorized pass. Returns the learner ids and a
+    (learners x objectives) matrix of P(mastered), columns in OBJECTIVE_IDS
+    order. Each (learner, objective) pair's answers are applied in order;
+    the k-th answers of all pairs are applied together, so the Python loop
+    runs once per answer of the most-practiced pair, not once per answer.
+    """
+    learner_ids = list(histories)
+    n_objectives = len(OBJECTIVE_IDS)
+    mastery = np.full(len(learner_ids) * n_objectives, P_INIT)
+
+    pairs, correct, slips, guesses = [], [], [], []
+    for row, learner_id in enumerate(learner_ids):
+        for outcome in histories[learner_id]:
+            column = _OBJECTIVE_INDEX.get(outcome.objective_id)
+            if column is None:
+                continue
+            slip, guess = slip_guess(outcome.difficulty)
+            pairs.append(row * n_objectives + column)
+            correct.append(outcome.correct)
+            slips.append(slip)
+            guesses.append(guess)
+    if pairs:
+        pairs = np.asarray(pairs)
+        correct, slips, guesses = np.asarray(correct), np.asarray(slips), np.asarray(guesses)
+        # Rank of each answer within its pair (a stable sort keeps answers in order)
+        order = np.argsort(pairs, kind="stable")
+        sorted_pairs = pairs[order]
+        starts = np.flatnonzero(np.r_[True, sorted_pairs[1:] != sorted_pairs[:-1]])
+        rank = np.empty(len(pairs), dtype=np.int64)
+        rank[order] = np.arange(len(pairs)) - np.repeat(starts, np.diff(np.r_[starts, len(pairs)]))
+        by_rank = np.argsort(rank, kind="stable")
+        bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+        for k in range(rank.max() + 1):
+            step = by_rank[bounds[k]:bounds[k + 1]]
+            cells = pairs[step]
+            mastery[cells] = bkt_update(mastery[cells], correct[step], slips[step], guesses[step])
+    return learner_ids, mastery.reshape(len(learner_ids), n_objectives)
+
+
+def expected_gain(p, difficulty: str = DEFAULT_DIFFICULTY):
+    """
+    Expected rise in P(mastered) from one more practice question: the gain
+    after a right answer weighted by the chance of one, plus the gain after
+    a wrong answer weighted by the chance of that.
+    """
+    p = np.asarray(p, dtype=float)
+    slip, guess = slip_guess(difficulty)
+    p_correct = p * (1 - slip) + (1 - p) * guess
+    return p_correct * (bkt_update(p, True, slip, guess) - p) + (1 - p_correct) * (bkt_update(p, False, slip, guess) - p)
+
+
+# Recommendation order: weak objectives the learner has practiced, then ones not practiced yet,
+# then practiced ones not yet mastered, then mastered ones
+_WEAK, _UNPRACTICED, _IMPROVING, _MASTERED = range(4)
+
+
+def _tier(state: Optional[ObjectiveMastery]) -> int:
+    if state is None or not state.attempts:
+        return _UNPRACTICED
+    if state.p < MASTERY_THRESHOLD:
+        return _WEAK
+    return _MASTERED if state.p >= MASTERED else _IMPROVING
+
+
+def rank_objectives(progress: UserProgress) -> List[Tuple[LearningObjective, float, float]]:
+    """
+    Every objective as (objective, P(mastered), expected gain), in the order
+    to practice them: weak practiced objectives first (evidence says they
+    need work; an untouched objective only sits at the prior), then
+    unpracticed ones, then the rest; largest expected gain first within each
+    group, ties in syllabus order.
+    """
+    states = [progress.mastery.get(o.id) for o in OBJECTIVES]
+    p = np.array([state.p if state is not None else P_INIT for state in states])
+    gains = expected_gain(p)
+    order = sorted(range(len(OBJECTIVES)), key=lambda i: (_tier(states[i]), -gains[i], i))
+    return [(OBJECTIVES[i], float(p[i]), float(gains[i])) for i in order]
+
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def infer_objective(domain: str, text: str) -> Optional[str]:
+    """The domain objective sharing the most words with text, or None when nothing overlaps (or it is a tie)."""
+    words = _terms(text)
+    scored = sorted(((len(words & _terms(f"{o.title} {o.description}")), o.id) for o in get_objectives_by_domain(domain)),
+                    reverse=True)
+    if not scored or scored[0][0] == 0 or (len(scored) > 1 and scored[1][0] == scored[0][0]):
+        return None
+    return scored[0][1]
+
+
+def build_outcomes(quiz: Quiz, graded: List[Dict], known_objectives: Optional[Mapping[str, Optional[str]]] = None) -> List[QuestionOutcome]:
+    """
+    Outcome records for a graded quiz (grade_quiz()["results"], in question
+    order). The objective comes from the question pool, then the quiz, then
+    the question's wording.
+    """
+    known_objectives = known_objectives or {}
+    now = time.time()
+    outcomes = []
+    for question, result in zip(quiz.questions, graded):
+        objective_id = (known_objectives.get(question.id) if question.id else None) or quiz.objective_id \
+            or infer_objective(quiz.domain, " ".join([question.prompt, *question.tags]))
+        outcomes.append(QuestionOutcome(
+            domain=quiz.domain,
+            objective_id=objective_id,
+            difficulty=question.difficulty.value,
+            correct=result["is_correct"],
+            question_id=question.id,
+            answered_at=now
+        ))
+    return outcomes
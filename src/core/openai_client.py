@@ -1,42 +1,356 @@
 import os
 import json
-from typing import Generator, Any, Type, Optional
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generator, Any, Type, Optional
 from openai import OpenAI
 from pydantic import BaseModel
 import streamlit as st
+from src.core.cache import ContentCache, make_cache_key
+from src.core.streaming_json import IncrementalJSONParser, build_partial
+from src.core.client_pool import get_shared_client, in_flight_slot
+from src.core.singleflight import SingleFlight
+from src.core.cancellation import CancelToken, GenerationCancelled
+from src.core.telemetry import CallMetrics, CallTimer, MetricsStore, metrics_store, estimate_tokens
+from src.core.routing import ModelRouter, model_router
+from src.core.hedging import HedgePolicy, hedge_policy
+from src.core.rate_limit import (
+    RateLimiter, ServiceBusyError, rate_limiter, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH,
+    is_retryable, retry_after_seconds, retry_delay, sleep_unless, status_code
+)
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import time
+
+# Shared by every OpenAIClient in the process so identical requests coalesce across sessions
+_coalescer = SingleFlight()
+
+# Output size reserved against the token budget for a task with no history yet
+DEFAULT_COMPLETION_ESTIMATE = 1000
+
+# Markers passed between hedged request threads and the caller
+_DISPATCHED = object()
+_END = object()
+
+
+class StructuredOutputError(ValueError):
+    """The model's response could not be parsed into the requested schema."""
+    def __init__(self, message: str, raw_response: str):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+def parse_structured_response(full_response: str, model_schema: Type[BaseModel]) -> BaseModel:
+    """Parses the accumulated JSON text of a structured generation."""
+    # First, try to load as generic JSON to handle potential trailing characters/markdown formatting
+    # Often models output ```json ... ```
+    cleaned_response = full_response
+    if "```json" in full_response:
+        cleaned_response = full_response.split("```json")[1].split("```")[0]
+    elif "```" in full_response:
+        cleaned_response = full_response.split("```")[1].split("```")[0]
+    
+    data_dict = json.loads(cleaned_response)
+    
+    # Robustness: Unwrap if the model returned a single root key (e.g. {"lesson": {...}})
+    # but we expect the fields directly.
+    if isinstance(data_dict, dict) and len(data_dict) == 1:
+        first_value = list(data_dict.values())[0]
+        if isinstance(first_value, dict):
+            # We assume this is a wrapper and try to use the inner dict
+            data_dict = first_value
+
+    return model_schema(**data_dict)
+
 
 class OpenAIClient:
-    def __init__(self):
-        self._client = None
+    def __init__(
+        self,
+        cache: Optional[ContentCache] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        metrics: Optional[MetricsStore] = None,
+        router: Optional[ModelRouter] = None,
+        limiter: Optional[RateLimiter] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        session_id: Optional[str] = None,
+        hedge: Optional[HedgePolicy] = None
+    ):
+        self.cache = cache if cache is not None else ContentCache()
+        self.metrics = metrics if metrics is not None else metrics_store
+        self.router = router if router is not None else model_router
+        # Org-wide request/token budgets; priority and session decide the place in its queue
+        self.limiter = limiter if limiter is not None else rate_limiter
+        self.priority = priority
+        self.session_id = session_id
+        self.hedge = hedge if hedge is not None else hedge_policy
+        # Explicit key/endpoint (e.g. a local stand-in server); otherwise env / session
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
 
     def _get_client(self) -> Optional[OpenAI]:
-        if self._client:
-            return self._client
-            
-        api_key = os.getenv("OPENAI_API_KEY")
+        # Resolved on every call: the key can differ per session
+        api_key = self.api_key or os.getenv("OPENAI_API_KEY")
         if not api_key:
             api_key = st.session_state.get("openai_api_key")
             
         if api_key:
-            self._client = OpenAI(api_key=api_key)
-            return self._client
+            return get_shared_client(api_key, self.base_url)
         return None
 
     def is_configured(self) -> bool:
         return bool(self._get_client())
 
+    def detached(self, priority: int = PRIORITY_PREFETCH) -> "OpenAIClient":
+        """
+        A client with this session's API key resolved up front, for background
+        threads that outlive the script run (they cannot read session_state).
+        Its requests queue behind interactive ones by default.
+        """
+        api_key = self.api_key or os.getenv("OPENAI_API_KEY") or st.session_state.get("openai_api_key")
+        return OpenAIClient(cache=self.cache, api_key=api_key, base_url=self.base_url,
+                            metrics=self.metrics, router=self.router, limiter=self.limiter,
+                            priority=priority, session_id=self._session_key(), hedge=self.hedge)
+
+    def _session_key(self) -> str:
+        """Whose turn a request counts against in the rate limiter's fair queue."""
+        if self.session_id:
+            return self.session_id
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx is not None else "default"
+
+    @contextmanager
+    def _upstream(
+        self,
+        client: OpenAI,
+        timer: CallTimer,
+        session_id: str,
+        request: dict,
+        should_stop: Optional[Callable[[], bool]] = None,
+        on_queue: Optional[Callable[[int], None]] = None,
+        on_dispatch: Optional[Callable[[], None]] = None,
+        on_open: Optional[Callable[[Any], None]] = None
+    ):
+        """
+        Opens a streaming completion once the rate limiter lets it through.
+        Requests rejected with 429/5xx (or dropped connections) are retried with
+        jittered backoff that honours Retry-After; a 429 also pauses the whole
+        queue. Retrying stops at the first chunk, which the caller may have shown.
+        on_dispatch is called as each attempt is sent, on_open with the opened stream.
+        """
+        expected = self.metrics.expected_completion_tokens(timer.task, timer.model) or DEFAULT_COMPLETION_ESTIMATE
+        estimate = estimate_tokens(timer.prompt_chars) + int(expected)
+        attempt = 0
+        while True:
+            reservation = self.limiter.acquire(session_id, self.priority, estimate, should_stop, on_queue)
+            error = None
+            with in_flight_slot():
+                if should_stop and should_stop():
+                    reservation.settle(0)
+                    raise GenerationCancelled("cancelled before the request was sent")
+                timer.on_dispatch()
+                if on_dispatch:
+                    on_dispatch()
+                try:
+                    stream = client.chat.completions.create(**request)
+                except Exception as e:
+                    error = e
+                if error is None:
+                    try:
+                        if on_open:
+                            on_open(stream)
+                        yield stream
+                    finally:
+                        # Releases the HTTP connection instead of draining the rest of the response
+                        stream.close()
+                        reservation.settle(timer.total_tokens)
+                    return
+
+            reservation.settle(0)  # rejected requests use no tokens
+            delay = retry_delay(error, attempt)
+            if delay is None:
+                if attempt and is_retryable(error):
+                    raise ServiceBusyError(
+                        f"The AI service is busy (HTTP {status_code(error) or 'connection error'}); "
+                        "please try again in a minute."
+                    ) from error
+                raise error
+            if status_code(error) == 429:
+                self.limiter.pause(retry_after_seconds(error) or delay)
+            self.limiter.stats["retries"] += 1
+            attempt += 1
+            if not sleep_unless(delay, should_stop):
+                raise GenerationCancelled("cancelled while waiting to retry")
+
+    def _stream(
+        self,
+        client: OpenAI,
+        task: str,
+        model: str,
+        prompt_chars: int,
+        session_id: str,
+        request: dict,
+        should_stop: Optional[Callable[[], bool]] = None,
+        on_queue: Optional[Callable[[int], None]] = None,
+        hedge: bool = False,
+        on_dispatch: Optional[Callable[[], None]] = None,
+        on_open: Optional[Callable[[Any], None]] = None
+    ) -> Generator[str, None, None]:
+        """Content chunks of one upstream completion, timed and recorded in the metrics store."""
+        timer = CallTimer(task, model, prompt_chars=prompt_chars, hedge=hedge)
+        error = None
+        try:
+            with self._upstream(client, timer, session_id, request, should_stop, on_queue, on_dispatch, on_open) as stream:
+                for chunk in stream:
+                    if should_stop and should_stop():
+                        raise GenerationCancelled("stopped by the caller")
+                    # The usage chunk arrives last, with no choices
+                    timer.on_usage(getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        timer.on_chunk(content)
+                        yield content
+        except BaseException as e:
+            error = e
+            if should_stop and should_stop() and not isinstance(e, (GenerationCancelled, GeneratorExit)):
+                # The stream was closed under us (a hedge that lost the race)
+                error = GenerationCancelled("stopped by the caller")
+                raise error from e
+            raise
+        finally:
+            self._record(timer, error)
+
+    def _hedged_stream(
+        self,
+        client: OpenAI,
+        task: str,
+        model: str,
+        prompt_chars: int,
+        session_id: str,
+        request: dict,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Generator[str, None, None]:
+        """
+        Like _stream, but when the first chunk is later than the hedge policy's
+        deadline (and its budget allows) an identical request is sent as well.
+        Whichever stream produces content first is used; the other is closed.
+        """
+        events: "queue.Queue[tuple]" = queue.Queue()
+        streams: dict = {}
+        winner = None
+        finished = False
+
+        def race(index: int):
+            def lost() -> bool:
+                return finished or (winner is not None and winner != index) or bool(should_stop and should_stop())
+            try:
+                for content in self._stream(client, task, model, prompt_chars, session_id, request, lost,
+                                            hedge=index == 1,
+                                            on_dispatch=lambda: events.put((index, _DISPATCHED)),
+                                            on_open=lambda stream: streams.__setitem__(index, stream)):
+                    events.put((index, content))
+                events.put((index, _END))
+            except BaseException as e:
+                events.put((index, e))
+
+        def start(index: int):
+            threading.Thread(target=race, args=(index,), daemon=True, name=f"hedge-{task}-{index}").start()
+
+        def close_stream(index: int):
+            try:
+                streams[index].close()
+            except Exception:
+                pass
+            # A read already blocked on the socket is not interrupted by close(); that thread
+            # stops (and records the call as cancelled) when its next chunk arrives
+
+        self.hedge.on_call()
+        start(0)
+        racers, deadline, failures = 1, None, {}
+        try:
+            while True:
+                timeout = None
+                if winner is None and racers == 1 and deadline is not None:
+                    timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    index, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    deadline = None  # hedge at most once
+                    if self.hedge.try_fire():
+                        racers += 1
+                        start(1)
+                    continue
+
+                if item is _DISPATCHED:
+                    # The deadline runs from when the request is sent, not from the rate-limit queue
+                    if index == 0 and winner is None and racers == 1:
+                        deadline = time.monotonic() + self.hedge.deadline_ms(self.metrics, task, model) / 1000.0
+                    continue
+                if winner is None:
+                    if isinstance(item, BaseException):
+                        failures[index] = item
+                        if len(failures) == racers:
+                            raise failures[0]
+                        continue
+                    winner = index
+                    if index == 1:
+                        self.hedge.on_hedge_won()
+                    for other in list(streams):
+                        if other != winner:
+                            close_stream(other)
+                if index != winner:
+                    continue
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            finished = True
+            for index in list(streams):
+                if index != winner:
+                    close_stream(index)
+
     def generate_content_stream(
         self, 
         system_prompt: str, 
         user_prompt: str, 
         model_schema: Type[BaseModel],
-        model: str = "gpt-4o", 
-        temperature: float = 0.5
+        model: Optional[str] = None, 
+        temperature: float = 0.5,
+        use_cache: bool = True,
+        yield_partials: bool = False,
+        task: str = "structured",
+        cancel_token: Optional[CancelToken] = None,
+        on_queue: Optional[Callable[[int], None]] = None
     ) -> Generator[str, None, BaseModel]:
         """
         Streams content to the UI, then validates against the schema.
         Yields chunks of text. Returns the parsed object at the end.
+        Identical requests are answered from the on-disk cache unless use_cache is False,
+        and identical requests already in flight share one upstream stream.
+        With yield_partials, a PartialContent is also yielded every time a
+        top-level field or list item of the schema is complete.
+        task names the generation stage (outline, lab, quiz, ...) for model routing
+        and telemetry; an explicit model overrides the routed one.
+        A cancelled cancel_token (or dropping the generator) detaches this caller;
+        the upstream stream is closed once no caller is left reading it.
+        on_queue(position) reports this session's place in the rate-limit queue
+        while the request waits (0 once it is sent).
         """
+        model = model or self.router.resolve(task, self.metrics)
+        cache_key = make_cache_key(system_prompt, user_prompt, model, temperature, model_schema.__name__)
+        if use_cache:
+            lookup_start = time.perf_counter()
+            cached = self.cache.get(cache_key, model_schema)
+            if cached is not None:
+                self.metrics.record(CallMetrics(
+                    task=task, model=model, started_at=time.time(),
+                    duration_ms=(time.perf_counter() - lookup_start) * 1000.0, cache_hit=True
+                ))
+                yield cached
+                return
+
         client = self._get_client()
         if not client:
             st.error("OpenAI API Key not configured.")
@@ -57,58 +371,96 @@ class OpenAIClient:
         # For 'Structured Outputs' strict mode, we typically use client.beta.chat.completions.parse
         # But that doesn't stream token-by-token easily for UI feedback in the same way.
         # Hybrid approach: Stream text (so user sees it), accumulate, then Parse.
-        
-        full_response = ""
-        
-        stream = client.chat.completions.create(
+
+        session_id = self._session_key()
+
+        request = dict(
             model=model,
             messages=messages,
             stream=True,
+            stream_options={"include_usage": True},
             temperature=temperature,
             response_format={"type": "json_object"} # Enforce JSON
         )
+        prompt_chars = len(system_prompt) + len(user_prompt)
+
+        def produce(publish, abandoned):
+            parts = []
+            # Hedging duplicates a request whose first chunk is unusually late
+            stream = self._hedged_stream if self.hedge.enabled else self._stream
+            for content in stream(client, task, model, prompt_chars, session_id, request, abandoned):
+                parts.append(content)
+                publish(content)
+
+            full_response = "".join(parts)
+            try:
+                parsed_obj = parse_structured_response(full_response, model_schema)
+            except Exception as e:
+                raise StructuredOutputError(str(e), full_response) from e
+
+            # Always refresh the cache, even when the caller asked to bypass it
+            try:
+                self.cache.put(cache_key, parsed_obj)
+            except OSError:
+                pass
+            return parsed_obj
+
+        # Every subscriber replays the shared chunks with its own partial parser. Flights are
+        # per pooled client (one per API key), so a request never runs on another session's key
+        flight = _coalescer.join(f"{id(client):x}:{cache_key}", produce)
+        parser = IncrementalJSONParser(root_fields=set(model_schema.model_fields)) if yield_partials else None
+        queue_position = 0
+
+        def poll() -> bool:
+            # Runs while no chunk has arrived yet: the request may be queued by the rate limiter
+            nonlocal queue_position
+            if on_queue:
+                position = self.limiter.position(session_id) or 0
+                if position != queue_position:
+                    queue_position = position
+                    on_queue(position)
+            return bool(cancel_token and cancel_token.cancelled)
 
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                full_response += content
-                yield content
-        
-        # Parse the accumulated JSON
         try:
-            # First, try to load as generic JSON to handle potential trailing characters/markdown formatting
-            # Often models output ```json ... ```
-            cleaned_response = full_response
-            if "```json" in full_response:
-                cleaned_response = full_response.split("```json")[1].split("```")[0]
-            elif "```" in full_response:
-                cleaned_response = full_response.split("```")[1].split("```")[0]
-            
-            data_dict = json.loads(cleaned_response)
-            
-            # Robustness: Unwrap if the model returned a single root key (e.g. {"lesson": {...}})
-            # but we expect the fields directly.
-            if isinstance(data_dict, dict) and len(data_dict) == 1:
-                first_value = list(data_dict.values())[0]
-                if isinstance(first_value, dict):
-                    # We assume this is a wrapper and try to use the inner dict
-                    data_dict = first_value
-
-            parsed_obj = model_schema(**data_dict)
-            yield parsed_obj
-        except (json.JSONDecodeError, Exception) as e:
-            st.error(f"Failed to parse generated content: {e}")
-            st.code(full_response, language="json")
+            for content in flight.replay(poll if cancel_token or on_queue else None):
+                if queue_position:
+                    queue_position = 0
+                    on_queue(0)
+                yield content
+                if parser and parser.feed(content) and not parser.complete:
+                    snapshot = parser.snapshot()
+                    if snapshot:
+                        yield build_partial(model_schema, snapshot)
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+        finally:
+            _coalescer.leave(flight)
+        if cancel_token and not flight.done:
+            cancel_token.raise_if_cancelled()
+
+        if isinstance(flight.error, StructuredOutputError):
+            st.error(f"Failed to parse generated content: {flight.error}")
+            st.code(flight.error.raw_response, language="json")
             return None
+        if flight.error is not None:
+            raise flight.error
+        yield flight.result
 
     def generate_chat_response(
         self,
         system_prompt: str,
         chat_history: list,
-        model: str = "gpt-4o",
-        temperature: float = 0.7
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        task: str = "chat",
+        cancel_token: Optional[CancelToken] = None,
+        on_queue: Optional[Callable[[int], None]] = None
     ) -> Generator[str, None, None]:
-        """Simple chat streaming without schema validation"""
+        """
+        Simple chat streaming without schema validation. Stops (and closes the
+        stream) when cancel_token is cancelled; on_queue as for generate_content_stream.
+        """
+        model = model or self.router.resolve(task, self.metrics)
         client = self._get_client()
         if not client:
             st.error("OpenAI API Key not configured.")
@@ -116,13 +468,20 @@ class OpenAIClient:
             
         messages = [{"role": "system", "content": system_prompt}] + chat_history
         
-        stream = client.chat.completions.create(
+        request = dict(
             model=model,
             messages=messages,
             stream=True,
+            stream_options={"include_usage": True},
             temperature=temperature
         )
+        yield from self._stream(
+            client, task, model, sum(len(str(m.get("content", ""))) for m in messages), self._session_key(), request,
+            (lambda: cancel_token.cancelled) if cancel_token else None, on_queue
+        )
 
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+    def _record(self, timer: CallTimer, error: Optional[BaseException]):
+        expected = None
+        if isinstance(error, (GenerationCancelled, GeneratorExit)):
+            expected = self.metrics.expected_completion_tokens(timer.task, timer.model)
+        self.metrics.record(timer.finish(error, expected))
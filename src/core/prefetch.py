@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+from src.core.analytics import weakest_domain
+from src.core.cancellation import CancelToken, GenerationCancelled
+from src.core.lesson_factory import build_lesson
+from src.core.lesson_index import LessonIndex, normalize_role
+from src.core.objectives import OBJECTIVES, LearningObjective, get_objectives_by_domain
+from src.core.schemas import UserProgress
+
+# Speculative jobs a learner may start per window; wrong guesses cost real API calls
+PREFETCH_BUDGET = 6
+PREFETCH_WINDOW_SECONDS = 60 * 60
+# Background lessons use fewer parallel section writers than interactive ones
+PREFETCH_SECTION_CONCURRENCY = 2
+
+DEFAULT_LESSON_PARAMS = {"level": "Beginner", "duration": 30, "role": "IT Support Specialist"}
+
+
+def predict_next_objective(progress: UserProgress, last_objective_id: Optional[str] = None) -> LearningObjective:
+    """
+    The objective the learner most likely opens next: the one after the last
+    lesson they worked on, else the first open objective of their weakest
+    domain, else the first objective they have not completed.
+    """
+    ids = [obj.id for obj in OBJECTIVES]
+    last = last_objective_id or (progress.completed_lessons[-1] if progress.completed_lessons else None)
+    if last in ids and ids.index(last) + 1 < len(ids):
+        return OBJECTIVES[ids.index(last) + 1]
+
+    candidates = OBJECTIVES
+    weakest = weakest_domain(progress)
+    if weakest:
+        candidates = get_objectives_by_domain(weakest) + candidates
+    for obj in candidates:
+        if obj.id not in progress.completed_lessons:
+            return obj
+    return candidates[0]
+
+
+@dataclass
+class PrefetchTarget:
+    kind: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def lesson(cls, objective: LearningObjective, level: str, duration: int, role: str) -> "PrefetchTarget":
+        return cls("lesson", dict(objective_id=objective.id, domain=objective.domain, objective=objective.title,
+                                  level=level, duration=duration, role=role))
+
+    @property
+    def key(self) -> tuple:
+        p = self.params
+        return (self.kind, p["objective_id"], p["level"], p["duration"], normalize_role(p["role"]))
+
+
+@dataclass
+class _Job:
+    target: PrefetchTarget
+    cancel: CancelToken
+    future: Future
+
+
+class Prefetcher:
+    """
+    Speculatively builds the lesson a learner is predicted to open next, on a
+    single low-priority worker, into the LessonIndex. Each learner has at most
+    one speculative job; a new prediction cancels the previous one, and starts
+    are capped per learner. (Quizzes are warmed by the QuestionPool refiller.)
+    """
+
+    def __init__(self, lesson_index: LessonIndex, budget: int = PREFETCH_BUDGET,
+                 window_seconds: float = PREFETCH_WINDOW_SECONDS):
+        self.lesson_index = lesson_index
+        self.budget = budget
+        self.window_seconds = window_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._jobs: Dict[str, _Job] = {}
+        self._starts: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "cancelled": 0, "completed": 0, "skipped": 0}
+
+    def is_ready(self, target: PrefetchTarget) -> bool:
+        """Whether opening the target would already be served locally."""
+        p = target.params
+        match = self.lesson_index.best_match(p["objective_id"], p["level"], p["duration"], p["role"])
+        return match is not None and match.score >= 1.0
+
+    def _within_budget(self, learner_id: str) -> bool:
+        starts = self._starts.setdefault(learner_id, deque())
+        while starts and starts[0] < time.time() - self.window_seconds:
+            starts.popleft()
+        return len(starts) < self.budget
+
+    def prefetch(self, learner_id: str, client, target: PrefetchTarget) -> bool:
+        """
+        Starts warming target for the learner, cancelling their previous
+        speculative job if it was for something else. client must not depend on
+        the Streamlit session (see OpenAIClient.detached). Returns True if started.
+        """
+        with self._lock:
+            current = self._jobs.get(learner_id)
+            if current and current.target.key == target.key and not current.future.done():
+                return False
+        self.cancel(learner_id, keep=target)
+        if self.is_ready(target):
+            self.stats["skipped"] += 1
+            return False
+
+        with self._lock:
+            if not self._within_budget(learner_id):
+                self.stats["skipped"] += 1
+                return False
+            self._starts[learner_id].append(time.time())
+            cancel = CancelToken()
+            future = self._executor.submit(self._run, client, target, cancel)
+            self._jobs[learner_id] = _Job(target, cancel, future)
+            self.stats["started"] += 1
+        return True
+
+    def cancel(self, learner_id: str, keep: Optional[PrefetchTarget] = None):
+        """Abandons the learner's speculative job unless it is for keep (the prediction was right)."""
+        with self._lock:
+            job = self._jobs.get(learner_id)
+            if job is None or (keep is not None and job.target.key == keep.key):
+                return
+            del self._jobs[learner_id]
+        if not job.future.done():
+            job.cancel.cancel("prediction changed")
+            job.future.cancel()
+            self.stats["cancelled"] += 1
+
+    def pending(self, learner_id: str, target: PrefetchTarget) -> Optional[Future]:
+        """The running job for exactly this target, if any (wait on it instead of starting a duplicate)."""
+        with self._lock:
+            job = self._jobs.get(learner_id)
+        if job and job.target.key == target.key and not job.future.done():
+            return job.future
+        return None
+
+    def _run(self, client, target: PrefetchTarget, cancel: CancelToken):
+        if cancel.cancelled:
+            return
+        p = target.params
+        try:
+            lesson = build_lesson(client, p["domain"], p["objective"], p["level"], p["duration"], p["role"],
+                                  max_concurrency=PREFETCH_SECTION_CONCURRENCY, cancel_token=cancel)
+            if lesson is not None and not cancel.cancelled:
+                self.lesson_index.add(lesson, p["objective_id"], p["level"], p["duration"], p["role"])
+                self.stats["completed"] += 1
+        except GenerationCancelled:
+            pass
+        except Exception:
+            pass  # speculative work; the learner's own request will surface real errors
@@ -0,0 +1,948 @@
+import atexit
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+from pydantic import TypeAdapter
+from src.core.mastery import apply_outcomes
+from src.core.scheduler import outcome_card_keys
+from src.core.schemas import ObjectiveMastery, ProgressSummary, QuestionOutcome, ReviewCard, ScoreStats, UserProgress
+from src.core.storage import DATA_DIR, PROGRESS_FILE
+
+PROGRESS_DB = os.path.join(DATA_DIR, "progress.db")
+PROGRESS_JSON_DIR = os.path.join(DATA_DIR, "progress")
+PROGRESS_LOG_DIR = os.path.join(DATA_DIR, "progress_log")
+
+# Learners read per batch by load_many and load_summaries
+LOAD_MANY_BATCH = 500
+
+SCORE_STATS_COLUMNS = ("count", "total", "total_sq", "min", "max", "ewma", "recent")
+REVIEW_CARD_COLUMNS = ("kind", "item_id", "domain", "objective_id", "easiness", "interval_days", "repetitions",
+                       "lapses", "due_at", "last_reviewed_at")
+
+# Event log durability and compaction
+FSYNC_BATCH = 64            # fsync inline once this many events are unsynced
+FSYNC_INTERVAL_S = 0.2      # otherwise a background flush fsyncs within this long
+COMPACT_EVERY = 1000        # fold the log into the snapshot after this many events
+
+# Progress cache: how often to check the store for writes by other processes,
+# and how long saves may be held back to coalesce them (0 = write through)
+PROGRESS_REVALIDATE_S = float(os.getenv("PROGRESS_REVALIDATE_S", "5"))
+PROGRESS_WRITE_BEHIND_S = float(os.getenv("PROGRESS_WRITE_BEHIND_S", "0"))
+
+
+_PROGRESS_BATCH = TypeAdapter(Dict[str, UserProgress])
+
+
+class ProgressLogCorrupt(ValueError):
+    """The progress log has an unreadable record before its last line, so replay would lose history."""
+
+
+class ProgressBackend:
+    """
+    Where learners' progress is kept, one UserProgress per user id.
+    The record_* methods default to load-modify-save; backends that can
+    append a single row override them.
+
+    Answered questions are folded into UserProgress (mastery, review cards)
+    by record_question_outcomes; the answers themselves, a history that only
+    grows, are kept apart and read through question_outcomes() on request.
+    Saving progress with no answers (a reset) clears that history.
+    """
+
+    def load(self, user_id: str) -> UserProgress:
+        raise NotImplementedError
+
+    def save(self, user_id: str, progress: UserProgress):
+        raise NotImplementedError
+
+    def users(self) -> List[str]:
+        raise NotImplementedError
+
+    def load_many(self, user_ids: Optional[List[str]] = None) -> Iterator[Tuple[str, UserProgress]]:
+        """(user id, progress) for every learner, or for user_ids, in that order; for batch jobs such as cohort reports."""
+        for user_id in (self.users() if user_ids is None else user_ids):
+            yield user_id, self.load(user_id)
+
+    def load_summaries(self, user_ids: Optional[List[str]] = None) -> Iterator[ProgressSummary]:
+        """The aggregates of every learner, or of user_ids, LOAD_MANY_BATCH learners per summary, in that order."""
+        records = self.load_many(user_ids)
+        while True:
+            batch = list(itertools.islice(records, LOAD_MANY_BATCH))
+            if not batch:
+                return
+            yield ProgressSummary.of(batch)
+
+    def version(self, user_id: str) -> Optional[Hashable]:
+        """
+        A cheap marker that changes when user_id's stored progress changes,
+        for caches to notice writes by other processes. None: only this
+        process writes, so there is nothing to check.
+        """
+        return None
+
+    def record_quiz_result(self, user_id: str, domain: str, score_percent: float):
+        progress = self.load(user_id)
+        progress.record_quiz_score(domain, score_percent)
+        self.save(user_id, progress)
+
+    def record_lesson_completed(self, user_id: str, objective_id: str):
+        progress = self.load(user_id)
+        if objective_id not in progress.completed_lessons:
+            progress.completed_lessons.append(objective_id)
+            self.save(user_id, progress)
+
+    def record_lab_completed(self, user_id: str, lab_id: str):
+        progress = self.load(user_id)
+        if lab_id not in progress.completed_labs:
+            progress.completed_labs.append(lab_id)
+            self.save(user_id, progress)
+
+    def record_question_outcomes(self, user_id: str, outcomes: List[QuestionOutcome]):
+        progress = self.load(user_id)
+        apply_outcomes(progress, outcomes)
+        self.save(user_id, progress)
+
+    def question_outcomes(self, user_id: str) -> List[QuestionOutcome]:
+        """Every answer recorded for user_id, oldest first (e.g. to refit mastery with fit_mastery)."""
+        raise NotImplementedError
+
+    def score_history(self, user_id: str) -> Dict[str, List[float]]:
+        """Every quiz score recorded for user_id per domain, oldest first; load() may only give the recent ones."""
+        return self.load(user_id).quiz_scores
+
+
+class JSONProgressBackend(ProgressBackend):
+    """
+    One JSON document per learner, replaced atomically on every save. The
+    learner's answers are appended to a JSON-lines file beside it.
+    """
+
+    def __init__(self, root: str = PROGRESS_JSON_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.root, quote(user_id, safe="") + ".json")
+
+    def _outcomes_path(self, user_id: str) -> str:
+        return os.path.join(self.root, quote(user_id, safe="") + ".outcomes.jsonl")
+
+    def load(self, user_id: str) -> UserProgress:
+        try:
+            with open(self._path(user_id), "r", encoding="utf-8") as f:
+                return UserProgress.model_validate_json(f.read())
+        except FileNotFoundError:
+            return UserProgress()
+
+    def save(self, user_id: str, progress: UserProgress):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(user_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(progress.model_dump_json(indent=2))
+        os.replace(tmp_path, path)
+        if not progress.questions_answered and os.path.exists(self._outcomes_path(user_id)):
+            os.remove(self._outcomes_path(user_id))
+
+    def question_outcomes(self, user_id: str) -> List[QuestionOutcome]:
+        try:
+            with open(self._outcomes_path(user_id), "r", encoding="utf-8") as f:
+                return [QuestionOutcome.model_validate_json(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def version(self, user_id: str) -> Optional[Hashable]:
+        try:
+            stat = os.stat(self._path(user_id))
+        except FileNotFoundError:
+            return 0
+        return stat.st_mtime_ns, stat.st_size
+
+    def users(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name[:-len(".json")]) for name in os.listdir(self.root) if name.endswith(".json"))
+
+    # Read-modify-write must not interleave between sessions of the same process
+    def record_quiz_result(self, user_id: str, domain: str, score_percent: float):
+        with self._lock:
+            super().record_quiz_result(user_id, domain, score_percent)
+
+    def record_lesson_completed(self, user_id: str, objective_id: str):
+        with self._lock:
+            super().record_lesson_completed(user_id, objective_id)
+
+    def record_lab_completed(self, user_id: str, lab_id: str):
+        with self._lock:
+            super().record_lab_completed(user_id, lab_id)
+
+    def record_question_outcomes(self, user_id: str, outcomes: List[QuestionOutcome]):
+        outcomes = list(outcomes)
+        with self._lock:
+            super().record_question_outcomes(user_id, outcomes)
+            with open(self._outcomes_path(user_id), "a", encoding="utf-8") as f:
+                f.writelines(o.model_dump_json() + "\n" for o in outcomes)
+
+
+class SQLiteProgressBackend(ProgressBackend):
+    """
+    Progress in SQLite (WAL): a row per learner plus normalized, indexed
+    tables of quiz attempts, completed lessons and labs, so recording an
+    event is a single insert and concurrent sessions never overwrite each other.
+    Each domain's running score aggregates are a row of score_stats, updated
+    in the same transaction as the attempt; load() reads them and fills
+    quiz_scores with their recent window, so it never reads the attempts
+    (score_history() does).
+    Likewise mastery and review cards are rows updated as answers are
+    recorded; the answers are appended to question_outcomes, which load()
+    never reads.
+    """
+
+    def __init__(self, db_path: str = PROGRESS_DB):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS learners (
+                    user_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    questions_answered INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS quiz_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    taken_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user ON quiz_attempts(user_id, domain, id);
+                CREATE TABLE IF NOT EXISTS score_stats (
+                    user_id TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    total_sq REAL NOT NULL,
+                    min REAL,
+                    max REAL,
+                    ewma REAL,
+                    recent TEXT NOT NULL,
+                    PRIMARY KEY (user_id, domain)
+                );
+                CREATE TABLE IF NOT EXISTS completed_lessons (
+                    user_id TEXT NOT NULL,
+                    objective_id TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, objective_id)
+                );
+                CREATE TABLE IF NOT EXISTS completed_labs (
+                    user_id TEXT NOT NULL,
+                    lab_id TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, lab_id)
+                );
+                CREATE TABLE IF NOT EXISTS question_outcomes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    objective_id TEXT,
+                    difficulty TEXT NOT NULL,
+                    correct INTEGER NOT NULL,
+                    question_id TEXT,
+                    answered_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_question_outcomes_user ON question_outcomes(user_id, id);
+                CREATE TABLE IF NOT EXISTS weak_objectives (
+                    user_id TEXT NOT NULL,
+                    objective_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, objective_id)
+                );
+                CREATE TABLE IF NOT EXISTS objective_mastery (
+                    user_id TEXT NOT NULL,
+                    objective_id TEXT NOT NULL,
+                    p REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    correct INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, objective_id)
+                );
+                CREATE TABLE IF NOT EXISTS review_cards (
+                    user_id TEXT NOT NULL,
+                    card_key TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    objective_id TEXT,
+                    easiness REAL NOT NULL,
+                    interval_days REAL NOT NULL,
+                    repetitions INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    due_at REAL NOT NULL,
+                    last_reviewed_at REAL,
+                    PRIMARY KEY (user_id, card_key)
+                );
+            """)
+        return self._conn
+
+    @staticmethod
+    def _outcome(row) -> QuestionOutcome:
+        return QuestionOutcome(domain=row[0], objective_id=row[1], difficulty=row[2], correct=bool(row[3]),
+                               question_id=row[4], answered_at=row[5])
+
+    @staticmethod
+    def _mastery(conn: sqlite3.Connection, user_id: str) -> Dict[str, ObjectiveMastery]:
+        return {row[0]: ObjectiveMastery(p=row[1], attempts=row[2], correct=row[3]) for row in conn.execute(
+            "SELECT objective_id, p, attempts, correct FROM objective_mastery WHERE user_id = ?", (user_id,))}
+
+    @staticmethod
+    def _review_cards(conn: sqlite3.Connection, user_id: str, keys: Optional[List[str]] = None) -> Dict[str, ReviewCard]:
+        query = f"SELECT card_key, {', '.join(REVIEW_CARD_COLUMNS)} FROM review_cards WHERE user_id = ?"
+        if keys is not None:
+            query += f" AND card_key IN ({','.join('?' * len(keys))})"
+        return {row[0]: ReviewCard(**dict(zip(REVIEW_CARD_COLUMNS, row[1:])))
+                for row in conn.execute(query, [user_id] + list(keys or []))}
+
+    @staticmethod
+    def _put_answers(conn: sqlite3.Connection, user_id: str, progress: UserProgress,
+                     mastery: Dict[str, ObjectiveMastery], cards: Optional[Dict[str, ReviewCard]] = None):
+        """Writes the given mastery and review card rows, and the learner's answer count and weak objectives."""
+        cards = progress.review_cards if cards is None else cards
+        conn.executemany(
+            "INSERT OR REPLACE INTO objective_mastery (user_id, objective_id, p, attempts, correct) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, objective_id, state.p, state.attempts, state.correct) for objective_id, state in mastery.items()]
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO review_cards (user_id, card_key, {', '.join(REVIEW_CARD_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(REVIEW_CARD_COLUMNS))})",
+            [(user_id, key, *(getattr(card, column) for column in REVIEW_CARD_COLUMNS)) for key, card in cards.items()]
+        )
+        conn.execute("UPDATE learners SET questions_answered = ? WHERE user_id = ?", (progress.questions_answered, user_id))
+        conn.execute("DELETE FROM weak_objectives WHERE user_id = ?", (user_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO weak_objectives (user_id, objective_id, position) VALUES (?, ?, ?)",
+            [(user_id, objective_id, i) for i, objective_id in enumerate(progress.weak_objectives)]
+        )
+
+    @staticmethod
+    def _put_score_stats(conn: sqlite3.Connection, user_id: str, domain: str, stats: ScoreStats):
+        conn.execute(
+            "INSERT OR REPLACE INTO score_stats (user_id, domain, count, total, total_sq, min, max, ewma, recent) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, domain, stats.count, stats.total, stats.total_sq, stats.min, stats.max, stats.ewma, json.dumps(stats.recent))
+        )
+
+    @staticmethod
+    def _score_stats(conn: sqlite3.Connection, user_id: str, domain: Optional[str] = None) -> Dict[str, ScoreStats]:
+        query = "SELECT domain, count, total, total_sq, min, max, ewma, recent FROM score_stats WHERE user_id = ?"
+        params = (user_id,) if domain is None else (user_id, domain)
+        return {row[0]: SQLiteProgressBackend._stats_row(row[1:])
+                for row in conn.execute(query + ("" if domain is None else " AND domain = ?"), params)}
+
+    @staticmethod
+    def _stats_row(row) -> ScoreStats:
+        return ScoreStats(count=row[0], total=row[1], total_sq=row[2], min=row[3], max=row[4], ewma=row[5],
+                          recent=json.loads(row[6]))
+
+    def _touch(self, conn: sqlite3.Connection, user_id: str, now: float):
+        """Registers the learner and bumps their version, inside the caller's write transaction."""
+        conn.execute(
+            "INSERT INTO learners (user_id, created_at, updated_at, version) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at, version = learners.version + 1",
+            (user_id, now, now)
+        )
+
+    def load(self, user_id: str) -> UserProgress:
+        with self._lock:
+            return self._load_batch(self._connection(), [user_id])[user_id]
+
+    def load_many(self, user_ids: Optional[List[str]] = None) -> Iterator[Tuple[str, UserProgress]]:
+        """Reads LOAD_MANY_BATCH learners per round of set-based queries, instead of one load() each."""
+        user_ids = self.users() if user_ids is None else user_ids
+        for start in range(0, len(user_ids), LOAD_MANY_BATCH):
+            batch = user_ids[start:start + LOAD_MANY_BATCH]
+            with self._lock:
+                loaded = self._load_batch(self._connection(), batch)
+            for user_id in batch:
+                yield user_id, loaded[user_id]
+
+    def load_summaries(self, user_ids: Optional[List[str]] = None) -> Iterator[ProgressSummary]:
+        """Straight from the aggregate tables, without building a UserProgress per learner."""
+        user_ids = self.users() if user_ids is None else user_ids
+        for start in range(0, len(user_ids), LOAD_MANY_BATCH):
+            batch = user_ids[start:start + LOAD_MANY_BATCH]
+            ids = list(dict.fromkeys(batch))
+            where = f"user_id IN ({','.join('?' * len(ids))})"
+            with self._lock:
+                conn = self._connection()
+                scores = conn.execute(f"SELECT user_id, domain, count, total, ewma FROM score_stats WHERE {where}", ids).fetchall()
+                mastery = conn.execute(
+                    f"SELECT user_id, objective_id, p, attempts FROM objective_mastery WHERE {where}", ids).fetchall()
+                lessons, labs = (dict(conn.execute(f"SELECT user_id, COUNT(*) FROM {table} WHERE {where} GROUP BY user_id", ids))
+                                 for table in ("completed_lessons", "completed_labs"))
+            yield ProgressSummary(batch, scores, mastery, lessons, labs)
+
+    def _load_batch(self, conn: sqlite3.Connection, user_ids: List[str]) -> Dict[str, UserProgress]:
+        """
+        Progress of each of user_ids, a query per table. quiz_scores is each
+        domain's recent window from score_stats; quiz_attempts is not read.
+        Rows are gathered as plain dicts and validated in one call per
+        batch, not one model at a time.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        where = f"user_id IN ({','.join('?' * len(ids))})"
+        fields = {user_id: {"completed_lessons": [], "completed_labs": [], "quiz_scores": {}, "weak_objectives": [],
+                            "score_stats": {}, "questions_answered": 0, "mastery": {}, "review_cards": {}}
+                  for user_id in ids}
+        for user_id, answered in conn.execute(f"SELECT user_id, questions_answered FROM learners WHERE {where}", ids):
+            fields[user_id]["questions_answered"] = answered
+        for table, column, order in (("completed_lessons", "objective_id", "completed_at, rowid"),
+                                     ("completed_labs", "lab_id", "completed_at, rowid"),
+                                     ("weak_objectives", "objective_id", "position")):
+            for user_id, item in conn.execute(f"SELECT user_id, {column} FROM {table} WHERE {where} ORDER BY {order}", ids):
+                fields[user_id][table].append(item)
+        for user_id, domain, *row in conn.execute(
+                f"SELECT user_id, domain, {', '.join(SCORE_STATS_COLUMNS)} FROM score_stats WHERE {where}", ids):
+            stats = dict(zip(SCORE_STATS_COLUMNS, row))
+            stats["recent"] = json.loads(stats["recent"])
+            fields[user_id]["score_stats"][domain] = stats
+            fields[user_id]["quiz_scores"][domain] = stats["recent"]
+        for user_id, objective_id, p, attempts, correct in conn.execute(
+                f"SELECT user_id, objective_id, p, attempts, correct FROM objective_mastery WHERE {where}", ids):
+            fields[user_id]["mastery"][objective_id] = {"p": p, "attempts": attempts, "correct": correct}
+        for user_id, key, *row in conn.execute(
+                f"SELECT user_id, card_key, {', '.join(REVIEW_CARD_COLUMNS)} FROM review_cards WHERE {where}", ids):
+            fields[user_id]["review_cards"][key] = dict(zip(REVIEW_CARD_COLUMNS, row))
+        return _PROGRESS_BATCH.validate_python(fields)
+
+    def save(self, user_id: str, progress: UserProgress):
+        """Brings the stored rows in line with progress, only writing what changed."""
+        now = time.time()
+        with self._lock:
+            current = self.load(user_id)
+            conn = self._connection()
+            with conn:
+                self._touch(conn, user_id, now)
+                for domain in set(current.quiz_scores) | set(progress.quiz_scores):
+                    old = current.quiz_scores.get(domain, [])
+                    new = progress.quiz_scores.get(domain, [])
+                    if new == old:
+                        continue
+                    if new[:len(old)] != old:
+                        # History was rewritten (e.g. reset): replace the domain's attempts
+                        conn.execute("DELETE FROM quiz_attempts WHERE user_id = ? AND domain = ?", (user_id, domain))
+                        old = []
+                    conn.executemany(
+                        "INSERT INTO quiz_attempts (user_id, domain, score, taken_at) VALUES (?, ?, ?, ?)",
+                        [(user_id, domain, score, now) for score in new[len(old):]]
+                    )
+                    if new:
+                        self._put_score_stats(conn, user_id, domain, progress.domain_stats(domain))
+                    else:
+                        conn.execute("DELETE FROM score_stats WHERE user_id = ? AND domain = ?", (user_id, domain))
+                for table, column, old, new in (
+                    ("completed_lessons", "objective_id", current.completed_lessons, progress.completed_lessons),
+                    ("completed_labs", "lab_id", current.completed_labs, progress.completed_labs),
+                ):
+                    conn.executemany(f"DELETE FROM {table} WHERE user_id = ? AND {column} = ?",
+                                     [(user_id, item) for item in set(old) - set(new)])
+                    conn.executemany(f"INSERT OR IGNORE INTO {table} (user_id, {column}, completed_at) VALUES (?, ?, ?)",
+                                     [(user_id, item, now) for item in new if item not in old])
+                for table, column, old, new in (
+                    ("objective_mastery", "objective_id", current.mastery, progress.mastery),
+                    ("review_cards", "card_key", current.review_cards, progress.review_cards),
+                ):
+                    conn.executemany(f"DELETE FROM {table} WHERE user_id = ? AND {column} = ?",
+                                     [(user_id, key) for key in set(old) - set(new)])
+                if not progress.questions_answered:
+                    conn.execute("DELETE FROM question_outcomes WHERE user_id = ?", (user_id,))
+                self._put_answers(
+                    conn, user_id, progress,
+                    {key: state for key, state in progress.mastery.items() if current.mastery.get(key) != state},
+                    {key: card for key, card in progress.review_cards.items() if current.review_cards.get(key) != card})
+
+    def users(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._connection().execute("SELECT user_id FROM learners ORDER BY user_id")]
+
+    def version(self, user_id: str) -> Optional[Hashable]:
+        # Bumped by every write to this learner only (see _touch); a primary-key lookup
+        with self._lock:
+            row = self._connection().execute("SELECT version FROM learners WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def record_quiz_result(self, user_id: str, domain: str, score_percent: float):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._touch(conn, user_id, now)
+                conn.execute("INSERT INTO quiz_attempts (user_id, domain, score, taken_at) VALUES (?, ?, ?, ?)",
+                             (user_id, domain, score_percent, now))
+                stats = self._score_stats(conn, user_id, domain).get(domain)
+                if stats is None:
+                    stats = ScoreStats()
+                stats.add(score_percent)
+                self._put_score_stats(conn, user_id, domain, stats)
+
+    def record_question_outcomes(self, user_id: str, outcomes: List[QuestionOutcome]):
+        """Appends the answers and updates only the mastery and review card rows they touch."""
+        outcomes = list(outcomes)
+        keys = sorted({key for outcome in outcomes for key in outcome_card_keys(outcome)})
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._touch(conn, user_id, time.time())
+                answered = conn.execute("SELECT questions_answered FROM learners WHERE user_id = ?", (user_id,)).fetchone()[0]
+                progress = UserProgress(questions_answered=answered, mastery=self._mastery(conn, user_id),
+                                        review_cards=self._review_cards(conn, user_id, keys))
+                apply_outcomes(progress, outcomes)
+                touched = {outcome.objective_id for outcome in outcomes if outcome.objective_id}
+                self._put_answers(conn, user_id, progress, {key: progress.mastery[key] for key in touched})
+                self._insert_outcomes(conn, user_id, outcomes)
+
+    def question_outcomes(self, user_id: str) -> List[QuestionOutcome]:
+        with self._lock:
+            return [self._outcome(row) for row in self._connection().execute(
+                "SELECT domain, objective_id, difficulty, correct, question_id, answered_at "
+                "FROM question_outcomes WHERE user_id = ? ORDER BY id", (user_id,))]
+
+    def score_history(self, user_id: str) -> Dict[str, List[float]]:
+        scores: Dict[str, List[float]] = {}
+        with self._lock:
+            for domain, score in self._connection().execute(
+                    "SELECT domain, score FROM quiz_attempts WHERE user_id = ? ORDER BY id", (user_id,)):
+                scores.setdefault(domain, []).append(score)
+        return scores
+
+    @staticmethod
+    def _insert_outcomes(conn: sqlite3.Connection, user_id: str, outcomes: List[QuestionOutcome]):
+        conn.executemany(
+            "INSERT INTO question_outcomes (user_id, domain, objective_id, difficulty, correct, question_id, answered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, o.domain, o.objective_id, o.difficulty, int(o.correct), o.question_id, o.answered_at) for o in outcomes]
+        )
+
+    def record_lesson_completed(self, user_id: str, objective_id: str):
+        self._record_completion("completed_lessons", "objective_id", user_id, objective_id)
+
+    def record_lab_completed(self, user_id: str, lab_id: str):
+        self._record_completion("completed_labs", "lab_id", user_id, lab_id)
+
+    def _record_completion(self, table: str, column: str, user_id: str, item: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._touch(conn, user_id, now)
+                conn.execute(f"INSERT OR IGNORE INTO {table} (user_id, {column}, completed_at) VALUES (?, ?, ?)",
+                             (user_id, item, now))
+
+
+class EventLogProgressBackend(ProgressBackend):
+    """
+    Progress as an append-only JSONL event log (quiz_graded, questions_graded,
+    lesson_completed, lab_completed, and progress_saved for whole-document
+    saves) over a snapshot. Recording an event is one appended line; fsyncs are batched
+    (FSYNC_BATCH events or FSYNC_INTERVAL_S, whichever comes first). Every
+    COMPACT_EVERY events the state is written to a new snapshot, which
+    replaces the old one atomically before the log is truncated.
+
+    The state is replayed once, on first use, and then kept in memory. On
+    replay, a torn last line (a crash mid-append) is cut off. A bad record
+    anywhere else raises ProgressLogCorrupt instead of returning empty progress.
+    Only one process may write a log directory at a time.
+    """
+
+    def __init__(self, root: str = PROGRESS_LOG_DIR, fsync_batch: int = FSYNC_BATCH,
+                 fsync_interval_s: float = FSYNC_INTERVAL_S, compact_every: int = COMPACT_EVERY):
+        self.root = root
+        self.log_path = os.path.join(root, "events.jsonl")
+        self.snapshot_path = os.path.join(root, "snapshot.json")
+        self.fsync_batch = fsync_batch
+        self.fsync_interval_s = fsync_interval_s
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._state: Optional[Dict[str, UserProgress]] = None
+        self._outcomes: Dict[str, List[Dict]] = {}  # user_id -> recorded answers, apart from the progress load() copies
+        self._fd = None
+        self._seq = 0
+        self._logged = 0     # events in the log since the snapshot
+        self._unsynced = 0
+        self._flusher = None
+        self.stats = {"appended": 0, "fsyncs": 0, "compactions": 0, "replayed": 0, "torn_bytes": 0}
+        atexit.register(self.close)
+
+    def _open(self) -> Dict[str, UserProgress]:
+        if self._state is not None:
+            return self._state
+        os.makedirs(self.root, exist_ok=True)
+        state: Dict[str, UserProgress] = {}
+        self._outcomes = {}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            # Written whole and swapped in with os.replace, so it is never torn
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot["seq"]
+            state = {user_id: UserProgress(**doc) for user_id, doc in snapshot["users"].items()}
+            self._outcomes = snapshot.get("outcomes", {})
+        self._seq = snapshot_seq
+        self._logged = 0
+
+        good_bytes = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+            while good_bytes < len(data):
+                end = data.find(b"\n", good_bytes)
+                if end == -1:
+                    break  # torn tail: the last append never got its newline
+                line = data[good_bytes:end]
+                if line.strip():
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        if data[end + 1:].strip():
+                            line_number = data.count(b"\n", 0, good_bytes) + 1
+                            raise ProgressLogCorrupt(f"{self.log_path}: line {line_number} is unreadable") from None
+                        break  # garbage only at the very end is a torn write too
+                    if event["seq"] > snapshot_seq:  # else already folded into the snapshot
+                        self._apply(state, event)
+                        self._seq = event["seq"]
+                        self._logged += 1
+                        self.stats["replayed"] += 1
+                good_bytes = end + 1
+            if good_bytes < len(data):
+                self.stats["torn_bytes"] = len(data) - good_bytes
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(good_bytes)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._state = state
+        return state
+
+    def _apply(self, state: Dict[str, UserProgress], event: Dict):
+        progress = state.setdefault(event["user"], UserProgress())
+        kind = event["type"]
+        if kind == "quiz_graded":
+            progress.record_quiz_score(event["domain"], event["score"])
+        elif kind == "lesson_completed":
+            if event["objective_id"] not in progress.completed_lessons:
+                progress.completed_lessons.append(event["objective_id"])
+        elif kind == "lab_completed":
+            if event["lab_id"] not in progress.completed_labs:
+                progress.completed_labs.append(event["lab_id"])
+        elif kind == "questions_graded":
+            apply_outcomes(progress, [QuestionOutcome(**o) for o in event["outcomes"]])
+            self._outcomes.setdefault(event["user"], []).extend(event["outcomes"])
+        elif kind == "progress_saved":
+            state[event["user"]] = UserProgress(**event["progress"])
+            if not state[event["user"]].questions_answered:
+                self._outcomes.pop(event["user"], None)
+        else:
+            raise ProgressLogCorrupt(f"unknown progress event type {kind!r}")
+
+    def _append(self, event: Dict):
+        state = self._open()
+        self._seq += 1
+        event = {"seq": self._seq, "ts": time.time(), **event}
+        line = (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+        os.write(self._fd, line)  # one O_APPEND write per event
+        self._apply(state, event)
+        self.stats["appended"] += 1
+        self._logged += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self._fsync()
+        elif self._flusher is None:
+            self._flusher = threading.Timer(self.fsync_interval_s, self.flush)
+            self._flusher.daemon = True
+            self._flusher.start()
+        if self._logged >= self.compact_every:
+            self.compact()
+
+    def _fsync(self):
+        if self._unsynced and self._fd is not None:
+            os.fsync(self._fd)
+            self.stats["fsyncs"] += 1
+            self._unsynced = 0
+
+    def flush(self):
+        """Makes every recorded event durable now."""
+        with self._lock:
+            self._flusher = None
+            self._fsync()
+
+    def compact(self):
+        """Writes the current state as the snapshot and empties the log."""
+        with self._lock:
+            state = self._open()
+            self._fsync()
+            snapshot = {"seq": self._seq, "users": {user_id: p.model_dump() for user_id, p in state.items()},
+                        "outcomes": self._outcomes}
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Events up to seq are now in the snapshot; replay skips them if the truncate is lost
+            os.ftruncate(self._fd, 0)
+            os.fsync(self._fd)
+            self._logged = 0
+            self.stats["compactions"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._flusher is not None:
+                self._flusher.cancel()
+                self._flusher = None
+            if self._fd is not None:
+                self._fsync()
+                os.close(self._fd)
+                self._fd = None
+                self._state = None
+
+    def load(self, user_id: str) -> UserProgress:
+        with self._lock:
+            return self._open().get(user_id, UserProgress()).model_copy(deep=True)
+
+    def save(self, user_id: str, progress: UserProgress):
+        with self._lock:
+            self._append({"user": user_id, "type": "progress_saved", "progress": progress.model_dump()})
+
+    def users(self) -> List[str]:
+        with self._lock:
+            return sorted(self._open())
+
+    def record_quiz_result(self, user_id: str, domain: str, score_percent: float):
+        with self._lock:
+            self._append({"user": user_id, "type": "quiz_graded", "domain": domain, "score": score_percent})
+
+    def record_lesson_completed(self, user_id: str, objective_id: str):
+        with self._lock:
+            progress = self._open().get(user_id)
+            if progress is None or objective_id not in progress.completed_lessons:
+                self._append({"user": user_id, "type": "lesson_completed", "objective_id": objective_id})
+
+    def record_lab_completed(self, user_id: str, lab_id: str):
+        with self._lock:
+            progress = self._open().get(user_id)
+            if progress is None or lab_id not in progress.completed_labs:
+                self._append({"user": user_id, "type": "lab_completed", "lab_id": lab_id})
+
+    def record_question_outcomes(self, user_id: str, outcomes: List[QuestionOutcome]):
+        with self._lock:
+            self._append({"user": user_id, "type": "questions_graded", "outcomes": [o.model_dump() for o in outcomes]})
+
+    def question_outcomes(self, user_id: str) -> List[QuestionOutcome]:
+        with self._lock:
+            self._open()
+            return [QuestionOutcome(**o) for o in self._outcomes.get(user_id, [])]
+
+
+class CachedProgressBackend(ProgressBackend):
+    """
+    Keeps each learner's UserProgress in memory in front of another backend, so
+    reruns that only read progress (the dashboard on every widget change) do
+    not touch the disk. Writes through this cache update it in place. Writes by
+    other processes are noticed through the backend's version() marker, which
+    is checked at most once per revalidate_s.
+
+    With write_behind_s > 0, writes are queued and handed to the backend
+    together after that delay: consecutive saves of one learner collapse into
+    the last, and recorded events keep their order. flush() (also run at exit)
+    writes anything still queued.
+    """
+
+    def __init__(self, backend: ProgressBackend, revalidate_s: float = PROGRESS_REVALIDATE_S,
+                 write_behind_s: float = PROGRESS_WRITE_BEHIND_S, clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.revalidate_s = revalidate_s
+        self.write_behind_s = write_behind_s
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._entries: Dict[str, list] = {}  # user_id -> [progress, backend version, checked at]
+        self._pending: Dict[str, list] = {}  # user_id -> queued (method name, args)
+        self._timer = None
+        self.stats = {"hits": 0, "misses": 0, "revalidations": 0, "writes": 0, "coalesced": 0}
+        atexit.register(self.flush)
+
+    def _fresh(self, user_id: str) -> Optional[UserProgress]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if user_id in self._pending or self.clock() - entry[2] < self.revalidate_s:
+            return entry[0]
+        self.stats["revalidations"] += 1
+        if self.backend.version(user_id) != entry[1]:
+            del self._entries[user_id]
+            return None
+        entry[2] = self.clock()
+        return entry[0]
+
+    def load(self, user_id: str) -> UserProgress:
+        with self._lock:
+            progress = self._fresh(user_id)
+            if progress is None:
+                if user_id in self._pending:
+                    self.flush()  # not cached but written behind: the backend must see those writes first
+                self.stats["misses"] += 1
+                # Version first: a write landing during the load then shows up as a change, not as this data
+                version = self.backend.version(user_id)
+                progress = self.backend.load(user_id)
+                self._entries[user_id] = [progress, version, self.clock()]
+            else:
+                self.stats["hits"] += 1
+            return progress.model_copy(deep=True)
+
+    def save(self, user_id: str, progress: UserProgress):
+        with self._lock:
+            queued = self._pending.get(user_id)
+            if queued:
+                # A whole-document save supersedes everything queued before it
+                self.stats["coalesced"] += len(queued)
+                queued.clear()
+            self._entries[user_id] = [progress.model_copy(deep=True), None, self.clock()]
+            self._write(user_id, "save", (user_id, progress.model_copy(deep=True)))
+
+    def users(self) -> List[str]:
+        self.flush()
+        return self.backend.users()
+
+    def version(self, user_id: str) -> Optional[Hashable]:
+        return self.backend.version(user_id)
+
+    def load_many(self, user_ids: Optional[List[str]] = None) -> Iterator[Tuple[str, UserProgress]]:
+        """Read straight from the backend (after any queued writes): a batch job must not fill the cache."""
+        self.flush()
+        return self.backend.load_many(user_ids)
+
+    def load_summaries(self, user_ids: Optional[List[str]] = None) -> Iterator[ProgressSummary]:
+        """Like load_many: from the backend, after any queued writes."""
+        self.flush()
+        return self.backend.load_summaries(user_ids)
+
+    def question_outcomes(self, user_id: str) -> List[QuestionOutcome]:
+        """Not cached: the history is read from the backend, after any queued writes."""
+        self.flush()
+        return self.backend.question_outcomes(user_id)
+
+    def score_history(self, user_id: str) -> Dict[str, List[float]]:
+        """Not cached, like question_outcomes."""
+        self.flush()
+        return self.backend.score_history(user_id)
+
+    def record_quiz_result(self, user_id: str, domain: str, score_percent: float):
+        with self._lock:
+            progress = self._fresh(user_id)
+            self._write(user_id, "record_quiz_result", (user_id, domain, score_percent))
+            if progress is not None:
+                progress.record_quiz_score(domain, score_percent)
+
+    def record_lesson_completed(self, user_id: str, objective_id: str):
+        with self._lock:
+            progress = self._fresh(user_id)
+            self._write(user_id, "record_lesson_completed", (user_id, objective_id))
+            if progress is not None and objective_id not in progress.completed_lessons:
+                progress.completed_lessons.append(objective_id)
+
+    def record_lab_completed(self, user_id: str, lab_id: str):
+        with self._lock:
+            progress = self._fresh(user_id)
+            self._write(user_id, "record_lab_completed", (user_id, lab_id))
+            if progress is not None and lab_id not in progress.completed_labs:
+                progress.completed_labs.append(lab_id)
+
+    def record_question_outcomes(self, user_id: str, outcomes: List[QuestionOutcome]):
+        with self._lock:
+            progress = self._fresh(user_id)
+            self._write(user_id, "record_question_outcomes", (user_id, list(outcomes)))
+            if progress is not None:
+                apply_outcomes(progress, outcomes)
+
+    def _write(self, user_id: str, method: str, args: tuple):
+        """Hands the write to the backend now, or queues it when writing behind."""
+        if self.write_behind_s <= 0:
+            getattr(self.backend, method)(*args)
+            self.stats["writes"] += 1
+            if user_id in self._entries:
+                self._entries[user_id][1:] = [self.backend.version(user_id), self.clock()]
+            return
+        self._pending.setdefault(user_id, []).append((method, args))
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_behind_s, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Writes every queued change to the backend."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+            for user_id, writes in pending.items():
+                for method, args in writes:
+                    getattr(self.backend, method)(*args)
+                    self.stats["writes"] += 1
+                if user_id in self._entries:
+                    self._entries[user_id][1:] = [self.backend.version(user_id), self.clock()]
+
+
+PROGRESS_BACKENDS = {"sqlite": SQLiteProgressBackend, "json": JSONProgressBackend, "eventlog": EventLogProgressBackend}
+
+
+def create_backend(name: str) -> ProgressBackend:
+    try:
+        return PROGRESS_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown progress backend {name!r} (choose from {', '.join(PROGRESS_BACKENDS)})") from None
+
+
+def migrate_json_progress(backend: ProgressBackend, user_id: str, json_path: str = PROGRESS_FILE) -> bool:
+    """
+    One-shot import of the legacy single-document progress file into user_id.
+    A marker file next to it records that the import ran; the JSON file itself
+    is left untouched. A learner who already has progress is not overwritten.
+    """
+    marker = json_path + ".migrated"
+    if not os.path.exists(json_path) or os.path.exists(marker):
+        return False
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            legacy = UserProgress(**json.load(f))
+    except (OSError, ValueError):
+        return False  # unreadable: leave it for inspection and try again next start
+
+    imported = backend.load(user_id) == UserProgress()
+    if imported:
+        backend.save(user_id, legacy)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"user_id": user_id, "imported": imported, "migrated_at": time.time()}, f)
+    return imported
+
+
+def migrated_user_id(json_path: str = PROGRESS_FILE) -> Optional[str]:
+    """The learner the legacy progress file was imported into, or None if nothing was imported."""
+    try:
+        with open(json_path + ".migrated", "r", encoding="utf-8") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return marker.get("user_id") if marker.get("imported") else None
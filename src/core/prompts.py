@@ -9,6 +9,13 @@ class PromptBuilder:
     When structured output is requested, you must strictly follow the JSON schema.
     """
 
+    # Short system prompts used by the generation pages (and the content bank CLI)
+    SYSTEM_LESSON = "Instructor"
+    SYSTEM_SECTION = "You are a technical writer."
+    SYSTEM_LAB = "You are an expert lab instructor."
+    SYSTEM_QUIZ = "You are an exam writer."
+    SYSTEM_SCENARIO = "You are a business simulation engine."
+
     @staticmethod
     def lesson_outline_prompt(domain: str, objective: str, level: str, duration: int, role: str) -> str:
         return f"""
@@ -0,0 +1,276 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+from src.core.dedupe import NearDuplicateIndex
+from src.core.objectives import get_objectives_by_domain
+from src.core.prompts import PromptBuilder
+from src.core.schemas import Question, Quiz, ReviewCard
+from src.core.storage import DATA_DIR
+
+QUESTION_POOL_DB = os.path.join(DATA_DIR, "question_pool.db")
+
+# A bucket is topped up when fewer than this many quizzes' worth of unseen questions remain
+LOW_WATERMARK_QUIZZES = 2
+TOP_UP_BATCH = 10
+
+
+def question_id(domain: str, question: Question) -> str:
+    """Stable id from the question content (model-provided ids like "q1" are not unique)."""
+    material = json.dumps([domain, question.prompt.strip().lower(), question.answer], sort_keys=True, default=str)
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()[:20]
+
+
+class QuestionPool:
+    """
+    Persistent pool of generated questions, indexed by domain, objective,
+    type, difficulty and tag, with a per-learner "already seen" set so
+    quizzes can be assembled locally without calling the API. Near-duplicate
+    prompts are rejected at insert time.
+    """
+
+    def __init__(self, db_path: str = QUESTION_POOL_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._index: Optional[NearDuplicateIndex] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    id TEXT PRIMARY KEY,
+                    domain TEXT NOT NULL,
+                    objective_id TEXT,
+                    type TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    minhash BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_questions_bucket ON questions(domain, objective_id, type, difficulty);
+                CREATE TABLE IF NOT EXISTS question_tags (
+                    tag TEXT NOT NULL,
+                    question_id TEXT NOT NULL,
+                    PRIMARY KEY (tag, question_id)
+                );
+                CREATE TABLE IF NOT EXISTS seen (
+                    learner_id TEXT NOT NULL,
+                    question_id TEXT NOT NULL,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (learner_id, question_id)
+                );
+            """)
+        return self._conn
+
+    def _dedupe_index(self) -> NearDuplicateIndex:
+        """MinHash/LSH index over every pooled prompt, loaded on first use. Caller holds the lock."""
+        if self._index is None:
+            index = NearDuplicateIndex()
+            for qid, blob in self._connection().execute("SELECT id, minhash FROM questions"):
+                index.add_signature(qid, np.frombuffer(blob, dtype=np.uint32))
+            self._index = index
+        return self._index
+
+    def _insert(self, conn: sqlite3.Connection, q: Question, domain: str, objective_id: Optional[str], now: float):
+        """Returns (pool id, added). A near-duplicate of a pooled question maps to that question's id."""
+        index = self._dedupe_index()
+        qid = question_id(domain, q)
+        if qid in index:
+            return qid, False
+        signature = index.signature(q.prompt)
+        duplicate = index.find_signature(signature)
+        if duplicate is not None:
+            return duplicate, False
+        q = q.model_copy(update={"id": qid})
+        conn.execute(
+            "INSERT OR IGNORE INTO questions (id, domain, objective_id, type, difficulty, payload, minhash, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (qid, domain, objective_id, q.type.value, q.difficulty.value, q.model_dump_json(), signature.tobytes(), now)
+        )
+        conn.executemany("INSERT OR IGNORE INTO question_tags (tag, question_id) VALUES (?, ?)",
+                         [(tag.lower(), qid) for tag in q.tags])
+        index.add_signature(qid, signature)
+        return qid, True
+
+    def add_questions(self, questions: Iterable[Question], domain: str, objective_id: Optional[str] = None) -> List[Question]:
+        """Inserts new questions, skipping exact and near duplicates. Returns the ones added, with ids set."""
+        added = []
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            for q in questions:
+                qid, is_new = self._insert(conn, q, domain, objective_id, now)
+                if is_new:
+                    added.append(q.model_copy(update={"id": qid}))
+            conn.commit()
+        return added
+
+    def add_quiz(self, quiz: Quiz, learner_id: Optional[str] = None) -> Quiz:
+        """
+        Stores a generated quiz's questions and returns the quiz with pool ids
+        set. A question the pool already holds (exactly or nearly) is served
+        as the pooled question, so seen marks, outcomes and review cards
+        refer to what the learner was actually asked; repeats are dropped.
+        If learner_id is given the questions count as seen.
+        """
+        now = time.time()
+        questions = {}
+        with self._lock:
+            conn = self._connection()
+            for q in quiz.questions:
+                qid, added = self._insert(conn, q, quiz.domain, quiz.objective_id, now)
+                if qid in questions:
+                    continue
+                if added:
+                    questions[qid] = q.model_copy(update={"id": qid})
+                else:
+                    payload = conn.execute("SELECT payload FROM questions WHERE id = ?", (qid,)).fetchone()[0]
+                    questions[qid] = Question.model_validate_json(payload)
+            conn.commit()
+        questions = list(questions.values())
+        if learner_id:
+            self.mark_seen(learner_id, [q.id for q in questions])
+        return quiz.model_copy(update={"questions": questions})
+
+    def _filters(self, domain: str, learner_id: Optional[str], objective_id: Optional[str],
+                 types: Optional[List[str]], difficulty: Optional[str], tags: Optional[List[str]]):
+        clauses, params = ["q.domain = ?"], [domain]
+        if objective_id:
+            clauses.append("q.objective_id = ?")
+            params.append(objective_id)
+        if types:
+            clauses.append(f"q.type IN ({','.join('?' * len(types))})")
+            params.extend(types)
+        if difficulty:
+            clauses.append("q.difficulty = ?")
+            params.append(difficulty)
+        if tags:
+            clauses.append(f"q.id IN (SELECT question_id FROM question_tags WHERE tag IN ({','.join('?' * len(tags))}))")
+            params.extend(t.lower() for t in tags)
+        if learner_id:
+            clauses.append("NOT EXISTS (SELECT 1 FROM seen s WHERE s.learner_id = ? AND s.question_id = q.id)")
+            params.append(learner_id)
+        return " AND ".join(clauses), params
+
+    def count(self, domain: str, learner_id: Optional[str] = None, objective_id: Optional[str] = None,
+              types: Optional[List[str]] = None, difficulty: Optional[str] = None, tags: Optional[List[str]] = None) -> int:
+        """Questions in a bucket (unseen by learner_id, if given)."""
+        where, params = self._filters(domain, learner_id, objective_id, types, difficulty, tags)
+        with self._lock:
+            return self._connection().execute(f"SELECT COUNT(*) FROM questions q WHERE {where}", params).fetchone()[0]
+
+    def sample(self, domain: str, n: int, learner_id: Optional[str] = None, objective_id: Optional[str] = None,
+               types: Optional[List[str]] = None, difficulty: Optional[str] = None, tags: Optional[List[str]] = None) -> List[Question]:
+        where, params = self._filters(domain, learner_id, objective_id, types, difficulty, tags)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT payload FROM questions q WHERE {where} ORDER BY random() LIMIT ?", params + [n]
+            ).fetchall()
+        return [Question.model_validate_json(row[0]) for row in rows]
+
+    def get(self, question_ids: List[str]) -> List[Question]:
+        if not question_ids:
+            return []
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id, payload FROM questions WHERE id IN ({','.join('?' * len(question_ids))})", question_ids
+            ).fetchall()
+        by_id = {qid: Question.model_validate_json(payload) for qid, payload in rows}
+        return [by_id[qid] for qid in question_ids if qid in by_id]
+
+    def objective_ids(self, question_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Pool id -> the objective the question was generated for (None for domain-wide batches)."""
+        if not question_ids:
+            return {}
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id, objective_id FROM questions WHERE id IN ({','.join('?' * len(question_ids))})", question_ids
+            ).fetchall()
+        return dict(rows)
+
+    def mark_seen(self, learner_id: str, question_ids: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR IGNORE INTO seen (learner_id, question_id, seen_at) VALUES (?, ?, ?)",
+                             [(learner_id, qid, now) for qid in question_ids])
+            conn.commit()
+
+    def assemble_quiz(self, domain: str, n: int, learner_id: str, difficulty: Optional[str] = None) -> Optional[Quiz]:
+        """A quiz of n questions this learner has not seen, or None if the bucket is too small."""
+        questions = self.sample(domain, n, learner_id=learner_id, difficulty=difficulty)
+        if len(questions) < n:
+            return None
+        self.mark_seen(learner_id, [q.id for q in questions])
+        return Quiz(domain=domain, questions=questions)
+
+    def assemble_review_quiz(self, domain: str, cards: List[ReviewCard]) -> Optional[Quiz]:
+        """
+        A quiz reviewing due cards: a question card asks that question again,
+        an objective card asks a pooled question on the objective (seen or
+        not). None if none of the cards can be served from the pool.
+        """
+        questions = {q.id: q for q in self.get([c.item_id for c in cards if c.kind == "question"])}
+        for card in cards:
+            if card.kind == "objective":
+                fresh = [q for q in self.sample(domain, 3, objective_id=card.item_id) if q.id not in questions]
+                if fresh:
+                    questions[fresh[0].id] = fresh[0]
+        if not questions:
+            return None
+        return Quiz(domain=domain, questions=list(questions.values()))
+
+    def is_low(self, domain: str, learner_id: str, quiz_size: int) -> bool:
+        return self.count(domain, learner_id=learner_id) < quiz_size * LOW_WATERMARK_QUIZZES
+
+
+class PoolRefiller:
+    """Tops up low pool buckets on a background thread, one generation per domain at a time."""
+
+    def __init__(self, pool: QuestionPool, max_workers: int = 2):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pool-refill")
+        self._in_progress: Set[str] = set()
+        self._lock = threading.Lock()
+        # Rotate through a domain's objectives so each top-up asks for different questions
+        self._objective_cycles: Dict[str, itertools.cycle] = {}
+
+    def request_top_up(self, client, domain: str, batch_size: int = TOP_UP_BATCH) -> bool:
+        """Schedules a top-up unless one is already running for the domain. client must not depend on the Streamlit session."""
+        with self._lock:
+            if domain in self._in_progress:
+                return False
+            self._in_progress.add(domain)
+            cycle = self._objective_cycles.setdefault(domain, itertools.cycle(get_objectives_by_domain(domain) or [None]))
+            objective = next(cycle)
+        self._executor.submit(self._top_up, client, domain, objective, batch_size)
+        return True
+
+    def is_running(self, domain: str) -> bool:
+        return domain in self._in_progress
+
+    def _top_up(self, client, domain: str, objective, batch_size: int):
+        try:
+            objective_text = f"{objective.id}: {objective.title}" if objective else "General Domain Knowledge"
+            prompt = PromptBuilder.quiz_prompt(domain, objective_text, batch_size)
+            for chunk in client.generate_content_stream(PromptBuilder.SYSTEM_QUIZ, prompt, Quiz,
+                                                        use_cache=False, task="quiz"):
+                if isinstance(chunk, Quiz):
+                    objective_id = chunk.objective_id or (objective.id if objective else None)
+                    self.pool.add_questions(chunk.questions, domain, objective_id)
+        except Exception:
+            pass  # a failed top-up just leaves the bucket low; the next request retries
+        finally:
+            with self._lock:
+                self._in_progress.discard(domain)
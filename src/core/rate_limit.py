@@ -0,0 +1,255 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+import openai
+from src.core.cancellation import GenerationCancelled
+
+# Budgets of the organisation key shared by every learner (set to your tier's limits)
+ORG_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+ORG_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "Interactive", PRIORITY_PREFETCH: "Prefetch", PRIORITY_BATCH: "Batch"}
+
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 20.0
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class ServiceBusyError(RuntimeError):
+    """The API kept rejecting a request (429/5xx) after every retry."""
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 units per second up to capacity."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount (capped at capacity, so huge requests still run) is available."""
+        self._refill()
+        deficit = min(amount, self.capacity) - self.level
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def take(self, amount: float):
+        """Removes amount; a negative amount gives back. The level may go below zero (debt)."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass(eq=False)  # queued by identity: one session may wait with identical requests
+class _Waiter:
+    session_id: str
+    priority: int
+    tokens: int
+
+
+class Reservation:
+    """Budget granted to one request; settle() corrects the token estimate once usage is known."""
+
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual_tokens: int):
+        if self.settled:
+            return
+        self.settled = True
+        with self.limiter._cond:
+            self.limiter._tokens.take(actual_tokens - self.tokens)
+            self.limiter._cond.notify_all()
+
+
+class RateLimiter:
+    """
+    Keeps every session of this process under the organisation's request and
+    token budgets. Waiting requests are served by priority class (interactive,
+    then prefetch, then batch), and round-robin across sessions within a class,
+    so one learner's burst of section writers cannot starve another learner.
+    A 429 pauses everyone until its Retry-After has passed.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = ORG_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[float] = ORG_TOKENS_PER_MINUTE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        # No limit configured: an effectively bottomless bucket
+        self._requests = TokenBucket(requests_per_minute or 1e12, clock=clock)
+        self._tokens = TokenBucket(tokens_per_minute or 1e15, clock=clock)
+        self._queues: List["OrderedDict[str, Deque[_Waiter]]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._cond = threading.Condition()
+        self._paused_until = 0.0
+        self.stats = {"granted": 0, "queued": 0, "retries": 0, "rate_limited": 0}
+
+    def _order(self) -> List[_Waiter]:
+        """Waiters in service order: by priority, then each session's oldest request in turn."""
+        order = []
+        for sessions in self._queues:
+            queues = list(sessions.values())
+            for i in range(max((len(q) for q in queues), default=0)):
+                order.extend(q[i] for q in queues if i < len(q))
+        return order
+
+    def _remove(self, waiter: _Waiter, served: bool):
+        sessions = self._queues[waiter.priority]
+        queue = sessions[waiter.session_id]
+        queue.remove(waiter)
+        if not queue:
+            del sessions[waiter.session_id]
+        elif served:
+            sessions.move_to_end(waiter.session_id)  # the other sessions go next
+        self._cond.notify_all()
+
+    def position(self, session_id: str) -> Optional[int]:
+        """1-based queue position of the session's next waiting request, or None if it has none."""
+        with self._cond:
+            for index, waiter in enumerate(self._order()):
+                if waiter.session_id == session_id:
+                    return index + 1
+        return None
+
+    def queue_lengths(self) -> Dict[str, int]:
+        with self._cond:
+            return {name: sum(len(q) for q in self._queues[p].values()) for p, name in PRIORITY_NAMES.items()}
+
+    def pause(self, seconds: float):
+        """Holds every request back for seconds (the API said the org is over its limit)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            self.stats["rate_limited"] += 1
+
+    def acquire(
+        self,
+        session_id: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        tokens: int = 0,
+        should_stop: Optional[Callable[[], bool]] = None,
+        on_wait: Optional[Callable[[int], None]] = None
+    ) -> Reservation:
+        """
+        Blocks until the request may be sent. tokens is the estimated prompt plus
+        completion size. on_wait(position) is called whenever the caller's queue
+        position changes, and with 0 once it is let through after waiting.
+        Raises GenerationCancelled if should_stop() turns True while queued.
+        """
+        waiter = _Waiter(session_id, priority, tokens)
+        reported = None
+        with self._cond:
+            self._queues[priority].setdefault(session_id, deque()).append(waiter)
+        try:
+            while True:
+                with self._cond:
+                    order = self._order()
+                    delay = self._paused_until - self.clock()
+                    if order[0] is waiter and delay <= 0:
+                        delay = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+                        if delay <= 0:
+                            self._requests.take(1)
+                            self._tokens.take(tokens)
+                            self._remove(waiter, served=True)
+                            self.stats["granted"] += 1
+                            break
+                    position = order.index(waiter) + 1
+                if should_stop and should_stop():
+                    raise GenerationCancelled("left the queue")
+                if position != reported:
+                    if reported is None:
+                        self.stats["queued"] += 1
+                    reported = position
+                    if on_wait:
+                        on_wait(position)
+                with self._cond:
+                    self._cond.wait(timeout=min(max(delay, 0.01), 0.1))
+        except BaseException:
+            with self._cond:
+                self._remove(waiter, served=False)
+            raise
+        if reported is not None and on_wait:
+            on_wait(0)
+        return Reservation(self, tokens)
+
+    def status(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "Requests/min": self.requests_per_minute or "unlimited",
+                "Tokens/min": self.tokens_per_minute or "unlimited",
+                "Requests available": int(max(0, self._requests.level)) if self.requests_per_minute else "-",
+                "Tokens available": int(max(0, self._tokens.level)) if self.tokens_per_minute else "-",
+                "Paused (s)": round(max(0.0, self._paused_until - self.clock()), 1),
+            }
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, timeouts, server errors and dropped connections are worth another try."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = status_code(error)
+    return status is not None and (status in RETRYABLE_STATUSES or status >= 500)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The server's Retry-After (or retry-after-ms) hint, if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue  # an HTTP date; fall back to backoff
+    return None
+
+
+def retry_delay(error: BaseException, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retry number attempt + 1, or None if the error should
+    be raised. Full-jitter exponential backoff; a Retry-After hint is the floor,
+    plus a little jitter so waiting sessions do not all return at once.
+    """
+    if attempt >= MAX_RETRIES or not is_retryable(error):
+        return None
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        return retry_after + random.uniform(0, BACKOFF_BASE_S)
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+
+def sleep_unless(seconds: float, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+    """Sleeps for seconds; returns False early if should_stop() turns True."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if should_stop and should_stop():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, 0.1))
+
+
+rate_limiter = RateLimiter()
@@ -1,8 +1,17 @@
 import streamlit as st
 import json
-from src.core.schemas import Lesson, Lab, Quiz, Assignment
+from typing import Optional
+from src.core.schemas import Lesson, Section, Lab, Quiz, Assignment
+from src.core.lesson_factory import SECTION_PENDING, SECTION_WRITING, SECTION_FAILED
+from src.core.streaming_json import PartialContent
 
 def render_lesson(lesson: Lesson):
+    render_lesson_header(lesson)
+    for section in lesson.sections:
+        render_section(section)
+    render_lesson_footer(lesson)
+
+def render_lesson_header(lesson: Lesson):
     st.markdown(f"# {lesson.title}")
     st.caption(f"{lesson.domain} | {lesson.level.value} | {lesson.duration_minutes} min")
     
@@ -14,21 +23,32 @@ def render_lesson(lesson: Lesson):
             st.markdown(f"- {term}")
 
     st.markdown("---")
-    
-    for section in lesson.sections:
-        st.markdown(f"### {section.title}")
-        
-        # Clean content if it mistakenly starts with the title
-        content = section.content
-        if content.lstrip().startswith("#"):
-            # If the first line is a header that resembles the title, strip it (naive check)
-            lines = content.split('\n')
-            if section.title.lower() in lines[0].lower():
-                content = "\n".join(lines[1:])
-        
-        st.markdown(content)
+
+def render_section(section: Section, content: Optional[str] = None, state: Optional[str] = None):
+    """
+    One lesson section. While streaming, content is the text so far and state
+    is the section's generation state (see lesson_factory).
+    """
+    st.markdown(f"### {section.title}")
+    content = section.content if content is None else content
+
+    # Clean content if it mistakenly starts with the title
+    if content.lstrip().startswith("#"):
+        # If the first line is a header that resembles the title, strip it (naive check)
+        lines = content.split('\n')
+        if section.title.lower() in lines[0].lower():
+            content = "\n".join(lines[1:])
+
+    if state == SECTION_PENDING:
+        st.caption("⏳ Waiting for a writer...")
+        return
+    st.markdown(content + (" ▌" if state == SECTION_WRITING else ""))
+    if state == SECTION_FAILED:
+        st.error("This section could not be generated.")
+    elif state != SECTION_WRITING:
         st.info(f"⏱ {section.duration_minutes} min read")
-    
+
+def render_lesson_footer(lesson: Lesson):
     st.markdown("---")
     st.markdown("### Common Misconceptions")
     for m in lesson.misconceptions:
@@ -101,3 +121,28 @@ def render_assignment(assignment: Assignment):
     
     with st.expander("Rubric"):
         st.json(assignment.rubric)
+
+def render_partial_preview(partial: PartialContent):
+    """Renders the fields of a still-streaming object that are already complete."""
+    obj = partial.value
+    if partial.has("title"):
+        st.markdown(f"#### {obj.title}")
+
+    if isinstance(obj, Lesson):
+        if partial.has("overview"):
+            st.caption(obj.overview)
+        for section in obj.sections if partial.has("sections") else []:
+            st.markdown(f"- {section.title}")
+    elif isinstance(obj, Lab):
+        if partial.has("goal"):
+            st.caption(f"Goal: {obj.goal}")
+        for step in obj.steps if partial.has("steps") else []:
+            st.markdown(f"**Step {step.step_number}.** {step.instruction}")
+    elif isinstance(obj, Quiz):
+        for i, q in enumerate(obj.questions if partial.has("questions") else []):
+            st.markdown(f"**{i+1}. [{q.type.value}]** {q.prompt}")
+    elif isinstance(obj, Assignment):
+        if partial.has("scenario"):
+            st.markdown(f"**Scenario:** {obj.scenario}")
+        if partial.has("task"):
+            st.markdown(obj.task)
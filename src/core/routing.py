@@ -0,0 +1,137 @@
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+from src.core.telemetry import MetricsStore, nearest_rank_percentile
+from src.core.storage import load_settings
+
+AVAILABLE_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo"]
+DEFAULT_MODEL = "gpt-4o"
+
+# Placeholder model meaning "whatever the Default model setting is"
+USE_DEFAULT = "default"
+
+# Minimum recent samples before a stage's p95 is trusted, and how far back to look.
+# Samples age out of the window, so a stage that fell back is retried on its primary model later.
+MIN_SAMPLES = 5
+SAMPLE_WINDOW = 50
+WINDOW_SECONDS = 15 * 60
+
+
+@dataclass
+class StageRoute:
+    model: str = USE_DEFAULT
+    fallback_model: str = "gpt-4o-mini"
+    p95_budget_ms: float = 30000.0
+    max_cost_usd: float = 0.05  # average cost per call
+
+
+DEFAULT_ROUTES: Dict[str, StageRoute] = {
+    # Short structured outputs do well on the small model
+    "outline": StageRoute("gpt-4o-mini", "gpt-4o-mini", 15000.0, 0.01),
+    "section": StageRoute(USE_DEFAULT, "gpt-4o-mini", 45000.0, 0.03),
+    "lab": StageRoute(USE_DEFAULT, "gpt-4o-mini", 40000.0, 0.03),
+    "quiz": StageRoute("gpt-4o-mini", "gpt-4o-mini", 30000.0, 0.02),
+    "assignment": StageRoute(USE_DEFAULT, "gpt-4o-mini", 30000.0, 0.02),
+    "grading": StageRoute(USE_DEFAULT, "gpt-4o-mini", 30000.0, 0.02),
+    "chat": StageRoute("gpt-4o-mini", "gpt-4o-mini", 20000.0, 0.01),
+}
+
+
+@dataclass
+class RouteDecision:
+    task: str
+    model: str
+    primary_model: str
+    fell_back: bool = False
+    reason: str = ""
+    observed_p95_ms: Optional[float] = None
+    observed_cost_usd: Optional[float] = None
+
+
+class ModelRouter:
+    """
+    Picks the model for each generation stage. A stage switches to its faster
+    fallback model while the primary's observed p95 latency (or average cost)
+    over the recent window exceeds the stage's budget.
+    """
+
+    def __init__(self, routes: Optional[Dict[str, StageRoute]] = None, default_model: str = DEFAULT_MODEL):
+        self.routes = {task: StageRoute(**asdict(route)) for task, route in (routes or DEFAULT_ROUTES).items()}
+        self.default_model = default_model
+        self._lock = threading.Lock()
+
+    def primary_model(self, task: str) -> str:
+        route = self.routes.get(task)
+        if route is None or route.model == USE_DEFAULT:
+            return self.default_model
+        return route.model
+
+    def decide(self, task: str, metrics: MetricsStore) -> RouteDecision:
+        primary = self.primary_model(task)
+        decision = RouteDecision(task=task, model=primary, primary_model=primary)
+        route = self.routes.get(task)
+        if route is None:
+            return decision
+
+        since = time.time() - WINDOW_SECONDS
+        durations = metrics.upstream_values("duration_ms", task=task, model=primary, since=since, limit=SAMPLE_WINDOW)
+        costs = metrics.upstream_values("cost_usd", task=task, model=primary, since=since, limit=SAMPLE_WINDOW)
+        if len(durations) < MIN_SAMPLES:
+            return decision
+
+        decision.observed_p95_ms = nearest_rank_percentile(durations, 95)
+        decision.observed_cost_usd = sum(costs) / len(costs) if costs else None
+        fallback = route.fallback_model if route.fallback_model != USE_DEFAULT else self.default_model
+        if fallback == primary:
+            return decision
+
+        if decision.observed_p95_ms > route.p95_budget_ms:
+            decision.reason = f"p95 {decision.observed_p95_ms / 1000:.1f}s > budget {route.p95_budget_ms / 1000:.1f}s"
+        elif decision.observed_cost_usd is not None and decision.observed_cost_usd > route.max_cost_usd:
+            decision.reason = f"avg cost ${decision.observed_cost_usd:.4f} > budget ${route.max_cost_usd:.4f}"
+        if decision.reason:
+            decision.model = fallback
+            decision.fell_back = True
+        return decision
+
+    def resolve(self, task: str, metrics: MetricsStore) -> str:
+        return self.decide(task, metrics).model
+
+    def status(self, metrics: MetricsStore) -> List[Dict[str, Any]]:
+        rows = []
+        for task in self.routes:
+            d = self.decide(task, metrics)
+            rows.append({
+                "Stage": task,
+                "Model in use": d.model,
+                "Primary": d.primary_model,
+                "Observed p95 (s)": round(d.observed_p95_ms / 1000, 2) if d.observed_p95_ms is not None else None,
+                "Fallback reason": d.reason or "-",
+            })
+        return rows
+
+    def update(self, settings: Dict[str, Any]):
+        """Applies the routing part of the persisted settings."""
+        with self._lock:
+            self.default_model = settings.get("default_model", DEFAULT_MODEL)
+            stored = settings.get("model_routing", {})
+            for task, defaults in DEFAULT_ROUTES.items():
+                values = {**asdict(defaults), **stored.get(task, {})}
+                self.routes[task] = StageRoute(**{k: values[k] for k in asdict(defaults)})
+
+    def to_settings(self) -> Dict[str, Any]:
+        return {
+            "default_model": self.default_model,
+            "model_routing": {task: asdict(route) for task, route in self.routes.items()}
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "ModelRouter":
+        router = cls()
+        router.update(settings)
+        return router
+
+
+# Process-wide routing config, kept in sync with Settings
+model_router = ModelRouter.from_settings(load_settings())
@@ -0,0 +1,207 @@
+import heapq
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.core.schemas import QuestionOutcome, ReviewCard, UserProgress
+
+DAY_S = 86400.0
+
+# SM-2: answer quality 0-5, easiness never below 1.3, a lapse (quality < 3) starts the card over
+MIN_EASINESS = 1.3
+PASSING_QUALITY = 3
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+FIRST_INTERVALS_DAYS = (1.0, 6.0)
+
+
+def card_key(kind: str, item_id: str) -> str:
+    return f"{kind}:{item_id}"
+
+
+def outcome_card_keys(outcome: QuestionOutcome) -> List[str]:
+    """Keys of the cards an answer reviews: its pooled question's and its objective's."""
+    return [card_key(kind, item_id) for kind, item_id in (("question", outcome.question_id), ("objective", outcome.objective_id))
+            if item_id]
+
+
+def sm2_review(card: ReviewCard, quality: int, reviewed_at: float):
+    """Applies one SM-2 review of the given quality (0-5) to card and sets its next due time."""
+    card.easiness = max(MIN_EASINESS, card.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < PASSING_QUALITY:
+        card.repetitions = 0
+        card.lapses += 1
+        card.interval_days = FIRST_INTERVALS_DAYS[0]
+    else:
+        card.repetitions += 1
+        if card.repetitions <= len(FIRST_INTERVALS_DAYS):
+            card.interval_days = FIRST_INTERVALS_DAYS[card.repetitions - 1]
+        else:
+            card.interval_days = round(card.interval_days * card.easiness, 1)
+    card.last_reviewed_at = reviewed_at
+    card.due_at = reviewed_at + card.interval_days * DAY_S
+
+
+def objective_quality(correct: int, total: int) -> int:
+    """SM-2 quality of one quiz's answers on an objective, from the share answered correctly."""
+    share = correct / total if total else 0.0
+    for threshold, quality in ((0.9, 5), (0.7, 4), (0.5, 3), (0.3, 2)):
+        if share >= threshold:
+            return quality
+    return 1
+
+
+def schedule_outcomes(progress: UserProgress, outcomes: Iterable[QuestionOutcome]) -> List[str]:
+    """
+    Reviews the cards the outcomes touch and returns their keys. Each pooled
+    question is a card, reviewed once per answer; each objective is a card
+    reviewed once per quiz (outcomes sharing answered_at) by its share correct.
+    """
+    changed = []
+    per_objective: Dict[Tuple[float, str], List[QuestionOutcome]] = {}
+    for outcome in outcomes:
+        if outcome.question_id:
+            changed.append(_review(progress, "question", outcome.question_id, outcome,
+                                   QUALITY_CORRECT if outcome.correct else QUALITY_WRONG, outcome.answered_at))
+        if outcome.objective_id:
+            per_objective.setdefault((outcome.answered_at, outcome.objective_id), []).append(outcome)
+    for (answered_at, objective_id), answers in sorted(per_objective.items()):
+        quality = objective_quality(sum(a.correct for a in answers), len(answers))
+        changed.append(_review(progress, "objective", objective_id, answers[0], quality, answered_at))
+    return changed
+
+
+def _review(progress: UserProgress, kind: str, item_id: str, outcome: QuestionOutcome, quality: int, reviewed_at: float) -> str:
+    key = card_key(kind, item_id)
+    card = progress.review_cards.get(key) or ReviewCard(
+        kind=kind, item_id=item_id, domain=outcome.domain, objective_id=outcome.objective_id)
+    sm2_review(card, quality, reviewed_at)
+    progress.review_cards[key] = card
+    return key
+
+
+class ReviewQueue:
+    """
+    Due times of one learner's review cards: a min-heap per domain. A
+    rescheduled card is pushed again and its old entry is skipped (and
+    dropped) when it reaches the top, so updates and taking the next n due
+    cards cost O(log n) each. Once stale entries outnumber live cards the
+    heaps are rebuilt, so they stay under twice the number of cards.
+    """
+
+    def __init__(self, cards: Dict[str, ReviewCard]):
+        self._due: Dict[str, float] = {key: card.due_at for key, card in cards.items()}
+        self._domains: Dict[str, str] = {key: card.domain for key, card in cards.items()}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heaps: Dict[str, List[Tuple[float, str]]] = {}
+        for key, due_at in self._due.items():
+            self._heaps.setdefault(self._domains[key], []).append((due_at, key))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def push(self, key: str, card: ReviewCard):
+        if self._due.get(key) == card.due_at:
+            return  # already queued at that time
+        if key in self._due:
+            self._stale += 1
+        self._due[key] = card.due_at
+        self._domains[key] = card.domain
+        heapq.heappush(self._heaps.setdefault(card.domain, []), (card.due_at, key))
+        if self._stale > len(self._due):
+            self._rebuild()
+
+    def _take(self, heap: List[Tuple[float, str]], now: float, n: int) -> List[Tuple[float, str]]:
+        """Up to n live entries due by now, earliest first; the heap is left as it was, minus stale entries."""
+        taken = []
+        while heap and len(taken) < n and heap[0][0] <= now:
+            due_at, key = heapq.heappop(heap)
+            # A card rescheduled back to an earlier due time has two identical entries: keep one
+            if self._due.get(key) == due_at and (not taken or taken[-1] != (due_at, key)):
+                taken.append((due_at, key))
+            else:
+                self._stale = max(0, self._stale - 1)
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return taken
+
+    def due(self, now: float, n: int, domain: Optional[str] = None) -> List[str]:
+        """Keys of the (at most n) cards due by now, most overdue first."""
+        domains = [domain] if domain else list(self._heaps)
+        entries = [entry for d in domains for entry in self._take(self._heaps.get(d, []), now, n)]
+        return [key for _, key in sorted(entries)[:n]]
+
+    def count_due(self, now: float, domain: Optional[str] = None) -> int:
+        """
+        Cards due by now. Only the heap entries due by now are visited (a
+        node later than now has no earlier descendants), not every card.
+        """
+        due = set()
+        for d in ([domain] if domain else list(self._heaps)):
+            heap = self._heaps.get(d, [])
+            stack = [0] if heap else []
+            while stack:
+                i = stack.pop()
+                due_at, key = heap[i]
+                if due_at > now:
+                    continue
+                if self._due.get(key) == due_at:
+                    due.add(key)
+                stack.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(heap))
+        return len(due)
+
+
+class ReviewScheduler:
+    """
+    Each learner's ReviewQueue, kept across reruns. A queue is built from the
+    learner's cards once; recorded answers push the cards they reviewed
+    (O(log n) each). It is rebuilt only when the cards changed some other
+    way: progress reset, or answers recorded by another process.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, Tuple[ReviewQueue, int]] = {}
+        self._lock = threading.Lock()
+
+    def queue(self, learner_id: str, progress: UserProgress) -> ReviewQueue:
+        with self._lock:
+            entry = self._queues.get(learner_id)
+            if entry is None or entry[1] != progress.questions_answered:
+                entry = (ReviewQueue(progress.review_cards), progress.questions_answered)
+                self._queues[learner_id] = entry
+            return entry[0]
+
+    def record(self, learner_id: str, progress: UserProgress, outcomes: List[QuestionOutcome]):
+        """
+        Pushes the cards outcomes reviewed into the learner's queue. progress
+        is the learner's progress with outcomes applied; if the queue was not
+        built from the progress just before them, it is rebuilt on next use.
+        """
+        with self._lock:
+            entry = self._queues.get(learner_id)
+            if entry is None or entry[1] + len(outcomes) != progress.questions_answered:
+                return
+            queue = entry[0]
+            for key in {key for outcome in outcomes for key in outcome_card_keys(outcome)}:
+                if key in progress.review_cards:
+                    queue.push(key, progress.review_cards[key])
+            self._queues[learner_id] = (queue, progress.questions_answered)
+
+    def due(self, learner_id: str, progress: UserProgress, n: int, domain: Optional[str] = None,
+            now: Optional[float] = None) -> List[ReviewCard]:
+        """The learner's next n due cards (in domain, if given), most overdue first."""
+        keys = self.queue(learner_id, progress).due(time.time() if now is None else now, n, domain)
+        # A queue can outlive its cards (progress reset elsewhere, then as many answers recorded again)
+        return [progress.review_cards[key] for key in keys if key in progress.review_cards]
+
+    def count_due(self, learner_id: str, progress: UserProgress, domain: Optional[str] = None,
+                  now: Optional[float] = None) -> int:
+        return self.queue(learner_id, progress).count_due(time.time() if now is None else now, domain)
+
+
+# Process-wide review queues, one per learner
+review_scheduler = ReviewScheduler()
@@ -1,6 +1,6 @@
 import enum
-from typing import List, Optional, Union, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, NamedTuple, Optional, Tuple, Union, Dict, Any
+from pydantic import BaseModel, Field, model_validator
 
 # --- Enums ---
 
@@ -93,8 +93,151 @@ class Assignment(BaseModel):
 
 # --- Progress Models ---
 
+SCORE_EWMA_ALPHA = 0.3  # weight of the newest score in the moving average
+SCORE_WINDOW = 10       # recent scores kept for the trend
+
+class ScoreStats(BaseModel):
+    """Running aggregates of one domain's quiz scores, updated in O(1) per result."""
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    ewma: Optional[float] = None
+    recent: List[float] = Field(default_factory=list) # Last SCORE_WINDOW scores, oldest first
+
+    def add(self, score: float):
+        self.count += 1
+        self.total += score
+        self.total_sq += score * score
+        self.min = score if self.min is None else min(self.min, score)
+        self.max = score if self.max is None else max(self.max, score)
+        self.ewma = score if self.ewma is None else SCORE_EWMA_ALPHA * score + (1 - SCORE_EWMA_ALPHA) * self.ewma
+        self.recent = (self.recent + [score])[-SCORE_WINDOW:]
+
+    @classmethod
+    def of(cls, scores: List[float]) -> "ScoreStats":
+        stats = cls()
+        for score in scores:
+            stats.add(score)
+        return stats
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Population variance (clamped: rounding can make the sum-of-squares form slightly negative)."""
+        if not self.count:
+            return 0.0
+        return max(0.0, self.total_sq / self.count - self.mean ** 2)
+
+    @property
+    def stddev(self) -> float:
+        return self.variance ** 0.5
+
+    @property
+    def trend(self) -> float:
+        """Least-squares slope of the recent window, in points per quiz (0 with fewer than two scores)."""
+        n = len(self.recent)
+        if n < 2:
+            return 0.0
+        x_mean = (n - 1) / 2
+        y_mean = sum(self.recent) / n
+        covariance = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(self.recent))
+        return covariance / sum((x - x_mean) ** 2 for x in range(n))
+
+class QuestionOutcome(BaseModel):
+    """One answered question, the evidence the mastery model learns from."""
+    domain: str
+    objective_id: Optional[str] = None # None when the question could not be tied to an objective
+    difficulty: str
+    correct: bool
+    question_id: Optional[str] = None
+    answered_at: float = 0.0
+
+class ObjectiveMastery(BaseModel):
+    p: float # Estimated probability the objective is mastered (Bayesian knowledge tracing)
+    attempts: int = 0
+    correct: int = 0
+
+class ReviewCard(BaseModel):
+    """Spaced-repetition state (SM-2) of one objective or question."""
+    kind: str # "objective" or "question"
+    item_id: str
+    domain: str
+    objective_id: Optional[str] = None
+    easiness: float = 2.5
+    interval_days: float = 0.0
+    repetitions: int = 0
+    lapses: int = 0
+    due_at: float = 0.0
+    last_reviewed_at: Optional[float] = None
+
 class UserProgress(BaseModel):
     completed_lessons: List[str] = Field(default_factory=list) # List of Objective IDs
     completed_labs: List[str] = Field(default_factory=list)
-    quiz_scores: Dict[str, List[float]] = Field(default_factory=dict) # Domain -> List of scores
+    quiz_scores: Dict[str, List[float]] = Field(default_factory=dict) # Domain -> List of scores (may be only the last SCORE_WINDOW; see domain_stats)
     weak_objectives: List[str] = Field(default_factory=list) # IDs needing remediation
+    score_stats: Dict[str, ScoreStats] = Field(default_factory=dict) # Domain -> running aggregates of quiz_scores
+    questions_answered: int = 0 # Answers folded into mastery and review_cards; the backend keeps the answers themselves
+    mastery: Dict[str, ObjectiveMastery] = Field(default_factory=dict) # Objective ID -> state after those answers
+    review_cards: Dict[str, ReviewCard] = Field(default_factory=dict) # "kind:item_id" -> review schedule
+
+    @model_validator(mode="after")
+    def _sync_score_stats(self):
+        # Stored progress may predate the aggregates, or come from a backend that only keeps the scores
+        for domain in set(self.score_stats) - set(self.quiz_scores):
+            del self.score_stats[domain]
+        for domain in self.quiz_scores:
+            self.domain_stats(domain)
+        return self
+
+    def record_quiz_score(self, domain: str, score_percent: float):
+        """Appends a result and folds it into the domain's aggregates."""
+        stats = self.domain_stats(domain)
+        self.quiz_scores.setdefault(domain, []).append(score_percent)
+        stats.add(score_percent)
+        self.score_stats[domain] = stats
+
+    def domain_stats(self, domain: str) -> ScoreStats:
+        """
+        The domain's aggregates; rebuilt from quiz_scores only if they were
+        changed directly. Backends that keep the score history apart load
+        just the recent window into quiz_scores, which matches the
+        aggregates of the whole history.
+        """
+        scores = self.quiz_scores.get(domain, [])
+        stats = self.score_stats.get(domain)
+        if stats is None or stats.count < len(scores) or stats.recent != scores[-SCORE_WINDOW:]:
+            stats = ScoreStats.of(scores)
+            if scores:
+                self.score_stats[domain] = stats
+            else:
+                self.score_stats.pop(domain, None)
+        return stats
+
+
+class ProgressSummary(NamedTuple):
+    """
+    Some learners' aggregates as flat rows, for batch jobs (cohort reports)
+    that only need these and not a UserProgress per learner.
+    """
+    user_ids: List[str]
+    scores: List[Tuple[str, str, int, float, Optional[float]]] # (user id, domain, count, total, ewma)
+    mastery: List[Tuple[str, str, float, int]]                 # (user id, objective id, p, attempts)
+    lessons: Dict[str, int]                                    # user id -> completed lessons
+    labs: Dict[str, int]                                       # user id -> completed labs
+
+    @classmethod
+    def of(cls, records: List[Tuple[str, UserProgress]]) -> "ProgressSummary":
+        return cls(
+            user_ids=[user_id for user_id, _ in records],
+            scores=[(user_id, domain, stats.count, stats.total, stats.ewma)
+                    for user_id, progress in records for domain, stats in progress.score_stats.items()],
+            mastery=[(user_id, objective_id, state.p, state.attempts)
+                     for user_id, progress in records for objective_id, state in progress.mastery.items()],
+            lessons={user_id: len(progress.completed_lessons) for user_id, progress in records},
+            labs={user_id: len(progress.completed_labs) for user_id, progress in records},
+        )
@@ -0,0 +1,112 @@
+import threading
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+
+class Flight:
+    """
+    One upstream generation shared by any number of subscribers.
+    Chunks are kept for the lifetime of the flight so late subscribers can
+    replay the prefix they missed before following the live tail.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        # Set when every subscriber left before the end; the producer should stop
+        self.abandoned = threading.Event()
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None):
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def replay(self, should_stop: Optional[Callable[[], bool]] = None) -> Generator[str, None, None]:
+        """
+        Yields every chunk from the start, blocking for new ones until the
+        flight ends (or should_stop returns True, checked while waiting).
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    if should_stop and should_stop():
+                        return
+                    self._cond.wait(timeout=0.1 if should_stop else None)
+                new_chunks = self.chunks[index:]
+                finished = self.done
+            for chunk in new_chunks:
+                yield chunk
+            index += len(new_chunks)
+            if finished and index >= len(self.chunks):
+                return
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests: the first caller for a key
+    starts the producer on a background thread (so a subscriber that stops
+    reading never stalls the others); everyone else attaches to it.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str, producer: Callable[[Callable[[str], None], Callable[[], bool]], Any]) -> Flight:
+        """
+        Returns the in-flight Flight for key, starting producer(publish, abandoned)
+        if there is none. The producer's return value becomes flight.result;
+        abandoned() turns True once every subscriber has left, and the producer
+        should then stop consuming its upstream.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight(key)
+                self._flights[key] = flight
+            flight.subscribers += 1
+
+        if leader:
+            thread = threading.Thread(target=self._run, args=(flight, producer), daemon=True,
+                                      name=f"singleflight-{key[:8]}")
+            thread.start()
+        return flight
+
+    def leave(self, flight: Flight):
+        """A subscriber stops reading. The last one out before the end abandons the flight."""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+            # New identical requests must not attach to a flight that is shutting down
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.abandoned.set()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _run(self, flight: Flight, producer: Callable[[Callable[[str], None], Callable[[], bool]], Any]):
+        try:
+            result = producer(flight.publish, flight.abandoned.is_set)
+            error = None
+        except BaseException as e:
+            result, error = None, e
+        # Later identical requests should start fresh (or hit the cache)
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(result, error)
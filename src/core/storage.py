@@ -1,7 +1,9 @@
 import json
 import os
+import threading
 from typing import Dict, Any, Optional
 from src.core.schemas import UserProgress
+from src.core.scheduler import review_scheduler
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 PROGRESS_FILE = os.path.join(DATA_DIR, "user_progress.json")
@@ -11,22 +13,60 @@ def ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-def save_progress(progress: UserProgress):
-    ensure_data_dir()
-    with open(PROGRESS_FILE, "w") as f:
-        f.write(progress.model_dump_json(indent=2))
+# "sqlite" (default), "json" or "eventlog"; see src/core/progress_store.py
+PROGRESS_BACKEND = os.getenv("PROGRESS_BACKEND", "sqlite")
+DEFAULT_USER_ID = "local"
 
-def load_progress() -> UserProgress:
-    ensure_data_dir()
-    if not os.path.exists(PROGRESS_FILE):
-        return UserProgress()
-    
-    try:
-        with open(PROGRESS_FILE, "r") as f:
-            data = json.load(f)
-            return UserProgress(**data)
-    except Exception:
-        return UserProgress()
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_progress_backend():
+    """
+    The process-wide ProgressBackend, created (and fed the legacy JSON file) on
+    first use. It sits behind an in-memory cache, so rereading progress on a
+    rerun costs no disk I/O.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                from src.core.progress_store import CachedProgressBackend, create_backend, migrate_json_progress
+                backend = CachedProgressBackend(create_backend(PROGRESS_BACKEND))
+                migrate_json_progress(backend, DEFAULT_USER_ID)
+                _backend = backend
+    return _backend
+
+def migrated_user_id() -> Optional[str]:
+    """The learner the legacy user_progress.json was imported into on upgrade, or None."""
+    get_progress_backend()  # runs the one-shot import
+    from src.core.progress_store import migrated_user_id as read_marker
+    return read_marker(PROGRESS_FILE)
+
+def set_progress_backend(backend):
+    """Swaps the backend (tests, or a deployment-specific store)."""
+    global _backend
+    _backend = backend
+
+def save_progress(progress: UserProgress, user_id: str = DEFAULT_USER_ID):
+    get_progress_backend().save(user_id, progress)
+
+def load_progress(user_id: str = DEFAULT_USER_ID) -> UserProgress:
+    return get_progress_backend().load(user_id)
+
+def record_quiz_result(user_id: str, domain: str, score_percent: float):
+    get_progress_backend().record_quiz_result(user_id, domain, score_percent)
+
+def record_lesson_completed(user_id: str, objective_id: str):
+    get_progress_backend().record_lesson_completed(user_id, objective_id)
+
+def record_lab_completed(user_id: str, lab_id: str):
+    get_progress_backend().record_lab_completed(user_id, lab_id)
+
+def record_question_outcomes(user_id: str, outcomes):
+    """Per-question results of a graded quiz (QuestionOutcome list), which drive the mastery model and review queue."""
+    outcomes = list(outcomes)
+    get_progress_backend().record_question_outcomes(user_id, outcomes)
+    review_scheduler.record(user_id, load_progress(user_id), outcomes)
 
 def save_settings(settings: Dict[str, Any]):
     ensure_data_dir()
@@ -0,0 +1,174 @@
+import json
+import typing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Type
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """
+    Consumes a JSON document delta by delta and tracks the last point at which
+    a value at a shallow depth (a top-level field, or an element of a top-level
+    array) was complete. Every character is scanned exactly once; the buffer is
+    a list of deltas that is only joined when a snapshot is requested.
+
+    Leading text before the first '{' (e.g. a ```json fence) is skipped.
+    If root_fields is given and the first key of the document is not one of
+    them, the document is treated as a wrapper ({"lesson": {...}}) and
+    snapshots return the inner object.
+    """
+
+    def __init__(self, snapshot_depth: int = 2, root_fields: Optional[Set[str]] = None):
+        self.snapshot_depth = snapshot_depth
+        self.root_fields = root_fields
+        self.unwrap = False
+        self.complete = False
+
+        self._chunks: List[str] = []
+        self._length = 0
+        self._stack: List[str] = []
+        self._started = False
+        self._offset = 0  # absolute index of the root '{'
+        self._in_string = False
+        self._escape = False
+        self._last_significant = 0
+        self._boundary = None  # (end index, closers)
+        self._snapshot_boundary = None
+        self._first_key: Optional[List[str]] = None
+
+    def feed(self, delta: str) -> bool:
+        """Appends a delta. Returns True if a new snapshot is available."""
+        before = self._boundary
+        base = self._length
+        self._chunks.append(delta)
+        self._length += len(delta)
+        if self.complete:
+            return False
+
+        for i, ch in enumerate(delta):
+            pos = base + i
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._offset = pos
+                    self._stack.append(ch)
+                    self._first_key = []
+                    self._last_significant = pos + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._first_key is not None:
+                        self._resolve_wrapper("".join(self._first_key))
+                        self._first_key = None
+                    self._last_significant = pos + 1
+                    continue
+                if self._first_key is not None:
+                    self._first_key.append(ch)
+                continue
+
+            if ch in " \t\r\n":
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                depth = len(self._stack)
+                if depth == 0:
+                    self._boundary = (pos + 1, "")
+                    self.complete = True
+                    self._last_significant = pos + 1
+                    break
+                if depth <= self.snapshot_depth:
+                    self._boundary = (pos + 1, self._closers())
+            elif ch == ",":
+                if len(self._stack) <= self.snapshot_depth:
+                    end = self._last_significant
+                    if not self._boundary or self._boundary[0] != end:
+                        self._boundary = (end, self._closers())
+                continue
+            self._last_significant = pos + 1
+
+        return self._boundary != before
+
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Parses the document up to the last complete value, closing open containers."""
+        if not self._boundary or self._boundary == self._snapshot_boundary:
+            return None
+        self._snapshot_boundary = self._boundary
+        end, closers = self._boundary
+        try:
+            data = json.loads(self.text()[self._offset:end] + closers)
+        except json.JSONDecodeError:
+            return None
+        if self.unwrap and isinstance(data, dict) and data:
+            inner = next(iter(data.values()))
+            return inner if isinstance(inner, dict) else None
+        return data if isinstance(data, dict) else None
+
+    def _closers(self) -> str:
+        return "".join(_CLOSERS[c] for c in reversed(self._stack))
+
+    def _resolve_wrapper(self, first_key: str):
+        if self.root_fields is not None and first_key not in self.root_fields:
+            self.unwrap = True
+            self.snapshot_depth += 1
+
+
+@dataclass
+class PartialContent:
+    """A not-yet-complete schema object. Only the names in `fields` are set on `value`."""
+    value: BaseModel
+    fields: List[str] = field(default_factory=list)
+
+    def has(self, name: str) -> bool:
+        return name in self.fields
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def build_partial(model_schema: Type[BaseModel], data: Dict[str, Any]) -> PartialContent:
+    """
+    Validates each present field on its own and builds an unvalidated model
+    instance from the ones that pass. Lists keep their longest valid prefix,
+    so quiz questions and lab steps appear one by one.
+    """
+    values = {}
+    for name, model_field in model_schema.model_fields.items():
+        if name not in data:
+            continue
+        raw = data[name]
+        try:
+            values[name] = _adapter(model_field.annotation).validate_python(raw)
+            continue
+        except ValidationError:
+            pass
+        if isinstance(raw, list) and typing.get_origin(model_field.annotation) in (list, List):
+            item_adapter = _adapter(typing.get_args(model_field.annotation)[0])
+            items = []
+            for item in raw:
+                try:
+                    items.append(item_adapter.validate_python(item))
+                except ValidationError:
+                    break
+            values[name] = items
+    return PartialContent(value=model_schema.model_construct(**values), fields=list(values))
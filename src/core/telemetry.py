@@ -0,0 +1,295 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+from src.core.cancellation import GenerationCancelled
+from src.core.storage import DATA_DIR
+
+METRICS_DB = os.path.join(DATA_DIR, "metrics.db")
+RING_BUFFER_SIZE = 2000
+
+# Upper bounds (ms) of the inter-chunk gap histogram; the last bucket is open-ended
+GAP_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Generation task -> page it is attributed to on the telemetry panel
+TASK_PAGES = {
+    "outline": "Lesson Generator",
+    "section": "Lesson Generator",
+    "lab": "Labs",
+    "quiz": "Quiz Engine",
+    "assignment": "Scenarios",
+    "grading": "Submission & Grading",
+    "chat": "Other",
+}
+
+
+def estimate_tokens(text_length: int) -> int:
+    """Rough token count when the API did not report usage (~4 chars per token)."""
+    return max(1, text_length // 4) if text_length else 0
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4o"])
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+@dataclass
+class CallMetrics:
+    task: str
+    model: str
+    started_at: float
+    duration_ms: float
+    ttft_ms: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    chunks: int = 0
+    gap_histogram: List[int] = field(default_factory=lambda: [0] * (len(GAP_BUCKETS_MS) + 1))
+    cache_hit: bool = False
+    usage_reported: bool = False
+    error: Optional[str] = None
+    cancelled: bool = False
+    tokens_saved: int = 0  # estimated completion tokens not generated because of cancellation
+    hedge: bool = False  # the duplicate request of a hedged call
+
+    @property
+    def page(self) -> str:
+        return TASK_PAGES.get(self.task, "Other")
+
+
+class CallTimer:
+    """Collects timing and usage for one streaming call; finish() returns the CallMetrics."""
+
+    def __init__(self, task: str, model: str, prompt_chars: int = 0, hedge: bool = False):
+        self.task = task
+        self.model = model
+        self.prompt_chars = prompt_chars
+        self.hedge = hedge
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._last = None
+        self.ttft_ms = None
+        self.chunks = 0
+        self.completion_chars = 0
+        self.gaps = [0] * (len(GAP_BUCKETS_MS) + 1)
+        self.usage = None
+
+    def on_dispatch(self):
+        """The request leaves the rate-limit queue: latency is measured from here."""
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+    @property
+    def total_tokens(self) -> int:
+        if self.usage is not None:
+            return self.usage.prompt_tokens + self.usage.completion_tokens
+        return estimate_tokens(self.prompt_chars) + estimate_tokens(self.completion_chars)
+
+    def on_chunk(self, text: str):
+        now = time.perf_counter()
+        if self._last is None:
+            self.ttft_ms = (now - self._start) * 1000.0
+        else:
+            self.gaps[bisect.bisect_left(GAP_BUCKETS_MS, (now - self._last) * 1000.0)] += 1
+        self._last = now
+        self.chunks += 1
+        self.completion_chars += len(text)
+
+    def on_usage(self, usage):
+        if usage is not None:
+            self.usage = usage
+
+    def finish(self, error: Optional[BaseException] = None, expected_completion_tokens: Optional[float] = None) -> CallMetrics:
+        """expected_completion_tokens (typical output of this task) prices what a cancelled call saved."""
+        if self.usage is not None:
+            prompt_tokens = self.usage.prompt_tokens
+            completion_tokens = self.usage.completion_tokens
+        else:
+            prompt_tokens = estimate_tokens(self.prompt_chars)
+            completion_tokens = estimate_tokens(self.completion_chars)
+        # GeneratorExit: the consumer dropped the stream (e.g. Streamlit stopped the script)
+        cancelled = isinstance(error, (GenerationCancelled, GeneratorExit))
+        tokens_saved = 0
+        if cancelled and expected_completion_tokens:
+            tokens_saved = max(0, int(expected_completion_tokens) - completion_tokens)
+        return CallMetrics(
+            task=self.task,
+            model=self.model,
+            started_at=self.started_at,
+            duration_ms=(time.perf_counter() - self._start) * 1000.0,
+            ttft_ms=self.ttft_ms,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=estimate_cost(self.model, prompt_tokens, completion_tokens),
+            chunks=self.chunks,
+            gap_histogram=self.gaps,
+            usage_reported=self.usage is not None,
+            error=type(error).__name__ if error else None,
+            cancelled=cancelled,
+            tokens_saved=tokens_saved,
+            hedge=self.hedge
+        )
+
+
+def nearest_rank_percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round((len(ordered) - 1) * pct / 100.0))))
+    return ordered[index]
+
+
+class MetricsStore:
+    """
+    Recent calls in an in-memory ring buffer (for cheap live percentiles) plus a
+    SQLite table for history. db_path=None keeps everything in memory.
+    """
+
+    def __init__(self, db_path: Optional[str] = METRICS_DB, capacity: int = RING_BUFFER_SIZE):
+        self.db_path = db_path
+        self._ring: Deque[CallMetrics] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.db_path:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at REAL NOT NULL,
+                    task TEXT NOT NULL,
+                    page TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    duration_ms REAL NOT NULL,
+                    ttft_ms REAL,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    cost_usd REAL,
+                    chunks INTEGER,
+                    gap_histogram TEXT,
+                    cache_hit INTEGER,
+                    error TEXT,
+                    cancelled INTEGER DEFAULT 0,
+                    tokens_saved INTEGER DEFAULT 0,
+                    hedge INTEGER DEFAULT 0
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_page_time ON llm_calls(page, started_at)")
+        return self._conn
+
+    def record(self, metrics: CallMetrics):
+        with self._lock:
+            self._ring.append(metrics)
+            try:
+                conn = self._connection()
+                if conn is not None:
+                    conn.execute(
+                        "INSERT INTO llm_calls (started_at, task, page, model, duration_ms, ttft_ms, prompt_tokens, "
+                        "completion_tokens, cost_usd, chunks, gap_histogram, cache_hit, error, cancelled, tokens_saved, hedge) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (metrics.started_at, metrics.task, metrics.page, metrics.model, metrics.duration_ms,
+                         metrics.ttft_ms, metrics.prompt_tokens, metrics.completion_tokens, metrics.cost_usd,
+                         metrics.chunks, json.dumps(metrics.gap_histogram), int(metrics.cache_hit), metrics.error,
+                         int(metrics.cancelled), metrics.tokens_saved, int(metrics.hedge))
+                    )
+                    conn.commit()
+            except sqlite3.Error:
+                pass  # telemetry must never break generation
+
+    def recent(self, task: Optional[str] = None, model: Optional[str] = None, limit: Optional[int] = None) -> List[CallMetrics]:
+        with self._lock:
+            calls = [m for m in self._ring
+                     if (task is None or m.task == task) and (model is None or m.model == model)]
+        return calls[-limit:] if limit else calls
+
+    def upstream_values(self, field_name: str, task: Optional[str] = None, model: Optional[str] = None,
+                        since: Optional[float] = None, limit: Optional[int] = None) -> List[float]:
+        """A field of recent upstream (non-cached, successful) calls, oldest first."""
+        calls = [m for m in self.recent(task, model)
+                 if not m.cache_hit and m.error is None and (since is None or m.started_at >= since)]
+        if limit:
+            calls = calls[-limit:]
+        return [getattr(m, field_name) for m in calls if getattr(m, field_name) is not None]
+
+    def percentile(self, field_name: str, pct: float, task: Optional[str] = None, model: Optional[str] = None,
+                   since: Optional[float] = None, limit: Optional[int] = None) -> Optional[float]:
+        """Percentile of a field over recent upstream calls."""
+        return nearest_rank_percentile(self.upstream_values(field_name, task, model, since, limit), pct)
+
+    def expected_completion_tokens(self, task: str, model: Optional[str] = None) -> Optional[float]:
+        """Median output size of recent completed calls for the task (what a cancelled call would have cost)."""
+        return nearest_rank_percentile(self.upstream_values("completion_tokens", task=task, model=model, limit=50), 50)
+
+    def summary_by_page(self, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Per-page aggregates for the telemetry panel (from SQLite when available)."""
+        rows = self._history(since)
+        pages: Dict[str, List[tuple]] = {}
+        for row in rows:
+            pages.setdefault(row[0], []).append(row)
+
+        summary = []
+        for page, page_rows in sorted(pages.items()):
+            upstream = [r for r in page_rows if not r[6] and not r[8]]
+            durations = [r[1] for r in upstream]
+            ttfts = [r[2] for r in upstream if r[2] is not None]
+            summary.append({
+                "Page": page,
+                "Calls": len(page_rows),
+                "Cache hits": sum(1 for r in page_rows if r[6]),
+                "Errors": sum(1 for r in page_rows if r[7] and not r[8]),
+                "Cancelled": sum(1 for r in page_rows if r[8]),
+                "Tokens saved": sum(r[9] or 0 for r in page_rows),
+                # A hedge that was not cancelled beat the original request
+                "Hedges": sum(1 for r in page_rows if r[10]),
+                "Hedge wins": sum(1 for r in page_rows if r[10] and not r[8] and not r[7]),
+                "p50 (s)": round((nearest_rank_percentile(durations, 50) or 0) / 1000, 2),
+                "p95 (s)": round((nearest_rank_percentile(durations, 95) or 0) / 1000, 2),
+                "TTFT p50 (s)": round((nearest_rank_percentile(ttfts, 50) or 0) / 1000, 2),
+                "Tokens/s": round(sum(r[4] for r in upstream) / max(sum(durations) / 1000, 1e-9), 1) if upstream else 0.0,
+                "Tokens": sum(r[3] + r[4] for r in page_rows),
+                "Cost ($)": round(sum(r[5] for r in page_rows), 4),
+            })
+        return summary
+
+    def gap_histogram(self, page: Optional[str] = None) -> Dict[str, int]:
+        totals = [0] * (len(GAP_BUCKETS_MS) + 1)
+        for m in self.recent():
+            if page is None or m.page == page:
+                totals = [a + b for a, b in zip(totals, m.gap_histogram)]
+        labels = [f"<= {b} ms" for b in GAP_BUCKETS_MS] + [f"> {GAP_BUCKETS_MS[-1]} ms"]
+        return dict(zip(labels, totals))
+
+    def _history(self, since: Optional[float]) -> List[tuple]:
+        """(page, duration_ms, ttft_ms, prompt_tokens, completion_tokens, cost_usd, cache_hit, error, cancelled, tokens_saved, hedge) rows."""
+        with self._lock:
+            conn = None
+            try:
+                conn = self._connection()
+            except sqlite3.Error:
+                pass
+            if conn is not None:
+                return conn.execute(
+                    "SELECT page, duration_ms, ttft_ms, prompt_tokens, completion_tokens, cost_usd, cache_hit, error, "
+                    "cancelled, tokens_saved, hedge "
+                    "FROM llm_calls WHERE started_at >= ?", (since or 0,)
+                ).fetchall()
+            return [(m.page, m.duration_ms, m.ttft_ms, m.prompt_tokens, m.completion_tokens, m.cost_usd,
+                     m.cache_hit, m.error, m.cancelled, m.tokens_saved, m.hedge) for m in self._ring if m.started_at >= (since or 0)]
+
+
+metrics_store = MetricsStore()
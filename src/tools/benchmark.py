@@ -0,0 +1,237 @@
+"""
+End-to-end latency benchmark of the generation flows.
+
+Drives OpenAIClient through the same PromptBuilder calls the pages make
+(Lesson Generator, Labs, Quiz Engine, Scenarios, Submission & Grading)
+against the local mock server, reports p50/p95/p99 latency and throughput,
+and appends the results to data/benchmarks/history.jsonl. Each run is
+compared with the previous run of the same configuration so regressions
+show up between commits.
+
+    python -m src.tools.benchmark --iterations 20 --concurrency 4
+    python -m src.tools.benchmark --flows quiz lab --ttft-ms 800 --fail-on-regression
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional
+from src.core.cache import ContentCache
+from src.core.lesson_factory import build_lesson
+from src.core.openai_client import OpenAIClient
+from src.core.rate_limit import RateLimiter
+from src.core.hedging import HedgePolicy
+from src.core.prompts import PromptBuilder
+from src.core.schemas import Lab, Quiz, Assignment
+from src.core.storage import DATA_DIR
+from src.core.telemetry import MetricsStore
+from src.tools.mock_server import MockLLMConfig, start_mock_server, add_config_arguments, config_from_args
+
+BENCHMARK_DIR = os.path.join(DATA_DIR, "benchmarks")
+HISTORY_FILE = os.path.join(BENCHMARK_DIR, "history.jsonl")
+DEFAULT_REGRESSION_THRESHOLD = 0.15  # relative p95 increase that counts as a regression
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _consume(stream) -> object:
+    final = None
+    for chunk in stream:
+        if not isinstance(chunk, str):
+            final = chunk
+    return final
+
+
+def _flows(client: OpenAIClient) -> Dict[str, Callable[[int], object]]:
+    """One callable per page flow. The iteration number makes every request unique so nothing coalesces."""
+    def lesson(i):
+        return build_lesson(client, "AI Fundamentals", "Define AI & Terminology", "Beginner", 30,
+                            f"IT Support Specialist {i}", use_cache=False)
+
+    def lab(i):
+        prompt = PromptBuilder.lab_prompt("AI Fundamentals", f"1.{i}: Define AI & Terminology", [])
+        return _consume(client.generate_content_stream(PromptBuilder.SYSTEM_LAB, prompt, Lab, use_cache=False, task="lab"))
+
+    def quiz(i):
+        prompt = PromptBuilder.quiz_prompt("AI Fundamentals", f"General Domain Knowledge {i}", 5)
+        return _consume(client.generate_content_stream(PromptBuilder.SYSTEM_QUIZ, prompt, Quiz, use_cache=False, task="quiz"))
+
+    def assignment(i):
+        prompt = PromptBuilder.scenario_prompt("Ethics & Security", f"IT Manager {i}")
+        return _consume(client.generate_content_stream(PromptBuilder.SYSTEM_SCENARIO, prompt, Assignment, use_cache=False, task="assignment"))
+
+    def grading(i):
+        history = [{"role": "user", "content": f"Submission {i}: our AI policy...\n\nRubric Context: "}]
+        return "".join(client.generate_chat_response("You are a strict grader.", history, task="grading"))
+
+    return {"lesson": lesson, "lab": lab, "quiz": quiz, "assignment": assignment, "grading": grading}
+
+
+FLOW_NAMES = list(_flows(None))
+
+
+def run_flow(fn: Callable[[int], object], iterations: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+
+    def timed(i):
+        start = time.perf_counter()
+        result = fn(i)
+        elapsed = time.perf_counter() - start
+        return elapsed, result is not None
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for future in [pool.submit(timed, i) for i in range(iterations)]:
+            try:
+                elapsed, ok = future.result()
+                latencies.append(elapsed * 1000.0)
+                errors += 0 if ok else 1
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall > 0 else 0.0
+    }
+
+
+def run_benchmark(
+    flows: List[str],
+    iterations: int,
+    concurrency: int,
+    mock_config: Optional[MockLLMConfig] = None,
+    base_url: Optional[str] = None,
+    api_key: str = "mock",
+    hedge: bool = False
+) -> Dict[str, Dict[str, float]]:
+    """Runs the selected flows against base_url, or a freshly started mock server (optionally with hedged requests)."""
+    server = None
+    if base_url is None:
+        server = start_mock_server(mock_config)
+        base_url = server.base_url
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # The org budgets only apply to the real API; the mock server is measured unthrottled
+            client = OpenAIClient(cache=ContentCache(cache_dir), api_key=api_key, base_url=base_url,
+                                  metrics=MetricsStore(db_path=None),
+                                  limiter=RateLimiter(None, None) if server else None,
+                                  hedge=HedgePolicy(enabled=hedge))
+            available = _flows(client)
+            return {name: run_flow(available[name], iterations, concurrency) for name in flows}
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: str = HISTORY_FILE) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def find_regressions(current: dict, previous: Optional[dict], threshold: float) -> List[str]:
+    """Flows whose p95 grew by more than threshold relative to the previous comparable run."""
+    if not previous:
+        return []
+    regressions = []
+    for flow, stats in current["results"].items():
+        before = previous["results"].get(flow)
+        if before and before["p95_ms"] > 0 and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{flow}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return regressions
+
+
+def record_run(record: dict, path: str = HISTORY_FILE) -> Optional[dict]:
+    """Appends a run and returns the previous run with the same configuration, if any."""
+    previous = None
+    for past in load_history(path):
+        if past.get("config") == record["config"]:
+            previous = past
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    return previous
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark generation flows against the mock LLM server.")
+    parser.add_argument("--flows", nargs="+", default=FLOW_NAMES, choices=FLOW_NAMES)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--base-url", default=None, help="Benchmark an existing endpoint instead of the built-in mock")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--hedge", action="store_true", help="Hedge structured calls whose first chunk is late")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    mock_config = config_from_args(args)
+    results = run_benchmark(args.flows, args.iterations, args.concurrency, mock_config, args.base_url, hedge=args.hedge)
+
+    print(f"{'flow':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'errors':>8}")
+    for flow, stats in results.items():
+        print(f"{flow:<12}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['throughput_per_s']:>10}{stats['errors']:>8}")
+
+    record = {
+        "timestamp": time.time(),
+        "commit": _git_commit(),
+        "config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "base_url": args.base_url,
+            "hedge": args.hedge,
+            "mock": asdict(mock_config) if args.base_url is None else None
+        },
+        "results": results
+    }
+    previous = record_run(record, args.history)
+    regressions = find_regressions(record, previous, args.threshold)
+    if previous:
+        print(f"Compared with {previous.get('commit') or 'previous run'}: "
+              f"{'; '.join(regressions) if regressions else 'no regressions'}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
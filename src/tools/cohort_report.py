@@ -0,0 +1,122 @@
+"""
+Cohort analytics over every learner's progress.
+
+Loads all learners from the configured progress backend into columns, then
+prints the cohort summary and at-risk learners and exports the learner,
+domain and objective tables (CSV, or columnar .npz):
+
+    python -m src.tools.cohort_report --out data/reports/cohort --format csv
+    python -m src.tools.cohort_report --benchmark 100000 --max-seconds 10
+    python -m src.tools.cohort_report --benchmark 100000 --backend sqlite --max-seconds 60
+
+--benchmark builds a synthetic cohort of that many learners instead and
+times the column build and the analysis separately. By default the records
+are handed over in memory, which measures the analytics alone; with
+--backend sqlite they are first saved to a scratch SQLite progress database
+(not timed) and the column build loads them back through
+SQLiteProgressBackend, as a real report does.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+import numpy as np
+from src.core.cohort import PASS_MARK, analyze, build_columns, export_report, load_columns
+from src.core.mastery import OBJECTIVE_IDS
+from src.core.objectives import ALL_DOMAINS
+from src.core.progress_store import SQLiteProgressBackend
+from src.core.schemas import ObjectiveMastery, ScoreStats, UserProgress
+from src.core.storage import DATA_DIR, get_progress_backend
+
+REPORT_DIR = os.path.join(DATA_DIR, "reports", "cohort")
+
+
+def synthetic_cohort(n: int, seed: int = 0):
+    """
+    Yields n (learner id, progress) records with plausible aggregates and
+    mastery. Built with model_construct: this measures the analytics, not
+    pydantic validation.
+    """
+    rng = np.random.default_rng(seed)
+    ability = rng.beta(8, 2, size=n)
+    for i in range(n):
+        started = rng.random(len(ALL_DOMAINS)) < 0.8
+        quiz_scores, score_stats = {}, {}
+        for domain, is_started in zip(ALL_DOMAINS, started):
+            if is_started:
+                mean = np.clip(rng.normal(100 * ability[i], 12), 0, 100)
+                scores = np.round(np.clip(rng.normal(mean, 8, size=int(rng.integers(1, 12))), 0, 100), 1).tolist()
+                quiz_scores[domain] = scores
+                score_stats[domain] = ScoreStats.of(scores)
+        practiced = rng.random(len(OBJECTIVE_IDS)) < 0.9
+        p = np.clip(rng.normal(ability[i], 0.2, size=len(OBJECTIVE_IDS)), 0.01, 0.99)
+        mastery = {objective_id: ObjectiveMastery.model_construct(p=float(p[j]), attempts=5, correct=3)
+                   for j, objective_id in enumerate(OBJECTIVE_IDS) if practiced[j]}
+        yield f"learner-{i:06d}", UserProgress.model_construct(
+            completed_lessons=[], completed_labs=[], quiz_scores=quiz_scores, weak_objectives=[],
+            score_stats=score_stats, questions_answered=0, mastery=mastery)
+
+
+def run_benchmark(n: int, seed: int = 0, backend: Optional[str] = None) -> dict:
+    """Times the column build and analysis of n synthetic learners, held in memory or (backend="sqlite") stored."""
+    records = list(synthetic_cohort(n, seed))
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_s = None
+        if backend == "sqlite":
+            store = SQLiteProgressBackend(os.path.join(tmp, "progress.db"))
+            start = time.perf_counter()
+            for learner_id, progress in records:
+                store.save(learner_id, progress)
+            seed_s = round(time.perf_counter() - start, 3)
+            del records
+        start = time.perf_counter()
+        columns = load_columns(store) if backend == "sqlite" else build_columns(records, size_hint=n)
+        built = time.perf_counter()
+        report = analyze(columns)
+        done = time.perf_counter()
+    return {
+        "learners": n,
+        "backend": backend or "memory",
+        "seed_s": seed_s,
+        "build_s": round(built - start, 3),
+        "analyze_s": round(done - built, 3),
+        "total_s": round(done - start, 3),
+        "at_risk": report.summary["at_risk"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cohort analytics over all learners' progress.")
+    parser.add_argument("--out", default=REPORT_DIR, help="Directory for the exported tables")
+    parser.add_argument("--format", choices=["csv", "npz"], default="csv")
+    parser.add_argument("--pass-mark", type=float, default=PASS_MARK)
+    parser.add_argument("--at-risk", type=int, default=20, help="How many at-risk learners to print")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Time a synthetic cohort of N learners instead")
+    parser.add_argument("--backend", choices=["sqlite"], help="With --benchmark: load the cohort through this progress backend")
+    parser.add_argument("--max-seconds", type=float, help="With --benchmark: exit 1 if the run takes longer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        result = run_benchmark(args.benchmark, args.seed, args.backend)
+        if result["seed_s"] is not None:
+            print(f"saved {result['learners']} learners to {result['backend']} in {result['seed_s']}s (not timed)")
+        print(f"{result['learners']} learners ({result['backend']}): columns {result['build_s']}s, "
+              f"analysis {result['analyze_s']}s, total {result['total_s']}s ({result['at_risk']} at risk)")
+        return 1 if args.max_seconds is not None and result["total_s"] > args.max_seconds else 0
+
+    report = analyze(load_columns(get_progress_backend()), pass_mark=args.pass_mark)
+    for name, value in report.summary.items():
+        print(f"{name:<20}{value}")
+    for learner in report.at_risk(args.at_risk):
+        print(f"  at risk: {learner['learner_id']:<24} pass probability {learner['pass_probability']:.0%}, "
+              f"weakest {learner['weakest_objective']} ({learner['weakest_domain']})")
+    for path in export_report(report, args.out, args.format):
+        print(f"wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Deterministic local stand-in for the OpenAI Chat Completions API.
+
+Streams schema-valid JSON for Lesson, Lab, Quiz and Assignment requests (and
+markdown for section/chat requests) with configurable time-to-first-token,
+tokens/sec, jitter and error injection. Responses depend only on the request
+and the seed, so benchmark runs are comparable between commits.
+
+    python -m src.tools.mock_server --port 8000 --ttft-ms 400 --tokens-per-sec 80
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from src.core.schemas import DifficultyLevel, QuestionType
+
+WORDS = (
+    "model data training inference feature label pipeline governance risk prompt "
+    "accuracy bias privacy latency cost workflow automation evaluation policy audit "
+    "cloud api dataset validation monitoring security scenario outcome metric review"
+).split()
+
+
+@dataclass
+class MockLLMConfig:
+    ttft_ms: float = 300.0
+    tokens_per_sec: float = 200.0
+    jitter_ms: float = 0.0        # uniform +/- jitter added to every token gap and the TTFT
+    error_rate: float = 0.0       # fraction of requests answered with error_status
+    error_status: int = 500
+    retry_after_s: float = 1.0    # sent with 429 responses
+    stall_rate: float = 0.0       # fraction of streamed requests whose first token is delayed by stall_ms
+    stall_ms: float = 10000.0
+    chars_per_token: int = 4
+    seed: int = 0
+
+
+def _rng(config: MockLLMConfig, material: str) -> random.Random:
+    digest = hashlib.sha256(f"{config.seed}:{material}".encode("utf-8")).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _sentence(rng: random.Random, n: int = 8) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _field(prompt: str, name: str, default: str) -> str:
+    match = re.search(rf'"{name}":\s*"([^"]*)"', prompt)
+    return match.group(1) if match else default
+
+
+def detect_kind(prompt: str) -> str:
+    """Which schema the prompt asks for (see PromptBuilder)."""
+    if "Plan a comprehensive lesson curriculum" in prompt:
+        return "lesson"
+    if "hands-on lab activity" in prompt:
+        return "lab"
+    if re.search(r"Generate a \d+-question quiz", prompt):
+        return "quiz"
+    if "scenario assignment" in prompt:
+        return "assignment"
+    return "text"
+
+
+def fake_content(kind: str, prompt: str, rng: random.Random) -> str:
+    domain = _field(prompt, "domain", "AI Fundamentals")
+    level = _field(prompt, "level", DifficultyLevel.BEGINNER.value)
+    if kind == "lesson":
+        payload = {
+            "title": _sentence(rng, 4).rstrip("."),
+            "domain": domain,
+            "objective_id": "1.1",
+            "level": level,
+            "duration_minutes": 30,
+            "overview": _sentence(rng, 20),
+            "sections": [{"title": _sentence(rng, 3).rstrip("."), "content": "", "duration_minutes": 5}
+                         for _ in range(rng.randint(3, 5))],
+            "key_terms": [rng.choice(WORDS) for _ in range(4)],
+            "misconceptions": [_sentence(rng) for _ in range(2)],
+            "checks": [{"question": _sentence(rng, 6).rstrip(".") + "?", "answer": _sentence(rng)} for _ in range(3)]
+        }
+    elif kind == "lab":
+        payload = {
+            "title": _sentence(rng, 4).rstrip("."),
+            "domain": domain,
+            "objective_id": "1.1",
+            "goal": _sentence(rng, 12),
+            "prerequisites": [_sentence(rng, 4)],
+            "tools": ["Python"],
+            "steps": [{"step_number": i + 1, "instruction": _sentence(rng, 14), "expected_result": _sentence(rng)}
+                      for i in range(rng.randint(4, 7))],
+            "artifacts": [{"name": "Screenshot", "description": _sentence(rng)}],
+            "rubric": {"Completed steps": 5, "Correct configuration": 5},
+            "hints": [_sentence(rng)]
+        }
+    elif kind == "quiz":
+        count = int(re.search(r"Generate a (\d+)-question quiz", prompt).group(1))
+        questions = []
+        for i in range(count):
+            options = [_sentence(rng, 4) for _ in range(4)]
+            questions.append({
+                "id": f"q{i + 1}",
+                "type": QuestionType.SINGLE_CHOICE.value,
+                "prompt": f"Question {i + 1}: " + _sentence(rng, 12).rstrip(".") + "?",
+                "options": options,
+                "answer": options[rng.randrange(4)],
+                "rationale": _sentence(rng, 16),
+                "difficulty": rng.choice([l.value for l in DifficultyLevel]),
+                "tags": [rng.choice(WORDS)]
+            })
+        payload = {"domain": domain, "objective_id": "1.1", "questions": questions}
+    elif kind == "assignment":
+        payload = {
+            "title": _sentence(rng, 4).rstrip("."),
+            "domain": domain,
+            "scenario": " ".join(_sentence(rng, 14) for _ in range(3)),
+            "task": _sentence(rng, 16),
+            "deliverables": [_sentence(rng, 5) for _ in range(3)],
+            "submission_requirements": _sentence(rng, 10),
+            "rubric": {"Analysis": 10, "Recommendation": 10},
+            "self_check": [_sentence(rng, 6).rstrip(".") + "?"]
+        }
+    else:
+        paragraphs = [" ".join(_sentence(rng, 12) for _ in range(4)) for _ in range(4)]
+        return "### " + _sentence(rng, 3).rstrip(".") + "\n\n" + "\n\n".join(paragraphs)
+    return json.dumps(payload, indent=1)
+
+
+def tokenize(text: str, chars_per_token: int) -> List[str]:
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockLLMConfig):
+        super().__init__(address, MockLLMHandler)
+        self.config = config
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def next_request_number(self) -> int:
+        with self._count_lock:
+            self.request_count += 1
+            return self.request_count
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockLLMServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+        number = self.server.next_request_number()
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        rng = _rng(config, prompt)
+
+        # Error injection uses its own stream so it doesn't change the content
+        if config.error_rate > 0 and _rng(config, f"error:{number}").random() < config.error_rate:
+            headers = {"Retry-After": str(config.retry_after_s)} if config.error_status == 429 else {}
+            return self._send_json(config.error_status,
+                                   {"error": {"message": "injected error", "type": "server_error"}}, headers)
+
+        kind = "text"
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            kind = detect_kind(prompt)
+        content = fake_content(kind, prompt, rng)
+        tokens = tokenize(content, config.chars_per_token)
+        model = body.get("model", "mock")
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // config.chars_per_token),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // config.chars_per_token) + len(tokens)
+        }
+
+        if not body.get("stream"):
+            self._sleep(config.ttft_ms + len(tokens) * 1000.0 / config.tokens_per_sec, rng)
+            return self._send_json(200, {
+                "id": f"chatcmpl-mock-{number}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage
+            })
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "keep-alive")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None, with_usage: bool = False):
+            payload = {
+                "id": f"chatcmpl-mock-{number}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if with_usage else [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            if include_usage:
+                payload["usage"] = usage if with_usage else None
+            self._write_event(json.dumps(payload))
+
+        # Stall injection also has its own stream; a stalled request still streams normally afterwards
+        stalled = config.stall_rate > 0 and _rng(config, f"stall:{number}").random() < config.stall_rate
+        try:
+            self._sleep(config.ttft_ms + (config.stall_ms if stalled else 0.0), rng)
+            chunk({"role": "assistant", "content": ""})
+            gap_ms = 1000.0 / config.tokens_per_sec
+            for token in tokens:
+                self._sleep(gap_ms, rng)
+                chunk({"content": token})
+            chunk({}, finish="stop")
+            if include_usage:
+                chunk({}, with_usage=True)
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away (e.g. cancelled stream)
+
+    def _sleep(self, ms: float, rng: random.Random):
+        jitter = self.server.config.jitter_ms
+        if jitter:
+            ms += rng.uniform(-jitter, jitter)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def _write_event(self, data: str):
+        payload = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_mock_server(config: Optional[MockLLMConfig] = None, host: str = "127.0.0.1", port: int = 0) -> MockLLMServer:
+    """Starts the server on a daemon thread. Use server.base_url; call server.shutdown() to stop."""
+    server = MockLLMServer((host, port), config or MockLLMConfig())
+    thread = threading.Thread(target=server.serve_forever, daemon=True, name="mock-llm-server")
+    thread.start()
+    return server
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = MockLLMConfig()
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms)
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--stall-rate", type=float, default=defaults.stall_rate)
+    parser.add_argument("--stall-ms", type=float, default=defaults.stall_ms)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> MockLLMConfig:
+    return MockLLMConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        seed=args.seed
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = config_from_args(args)
+    server = MockLLMServer((args.host, args.port), config)
+    print(f"Mock LLM listening on {server.base_url} ({json.dumps(asdict(config))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Offline pre-generation of the content bank.
+
+Walks OBJECTIVES x DifficultyLevel x roles and generates lessons, labs,
+quizzes and assignments through PromptBuilder, in parallel. Completed jobs are
+recorded in a checkpoint file so an interrupted run resumes where it stopped.
+
+    python -m src.tools.pregenerate --roles "IT Support Specialist" "IT Manager"
+    python -m src.tools.pregenerate --base-url http://127.0.0.1:8000/v1 --api-key test
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from src.core.content_bank import ContentBank, BANK_SCHEMAS, bank_key, CONTENT_BANK_VERSION
+from src.core.lesson_factory import build_lesson
+from src.core.objectives import OBJECTIVES, ALL_DOMAINS
+from src.core.openai_client import OpenAIClient
+from src.core.rate_limit import PRIORITY_BATCH
+from src.core.prompts import PromptBuilder
+from src.core.schemas import DifficultyLevel
+
+DEFAULT_ROLES = ["IT Support Specialist", "IT Manager"]
+DEFAULT_KINDS = list(BANK_SCHEMAS)
+
+
+@dataclass
+class Job:
+    kind: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{bank_key(self.kind, **self.params)}"
+
+
+def build_jobs(
+    roles: List[str],
+    levels: List[str],
+    kinds: List[str],
+    durations: List[int],
+    quiz_sizes: List[int]
+) -> List[Job]:
+    """Enumerates jobs with exactly the parameters the pages look up."""
+    jobs = []
+    if "lesson" in kinds:
+        for obj in OBJECTIVES:
+            for level in levels:
+                for role in roles:
+                    for duration in durations:
+                        jobs.append(Job("lesson", dict(domain=obj.domain, objective=obj.title, level=level, duration=duration, role=role)))
+    if "lab" in kinds:
+        for obj in OBJECTIVES:
+            jobs.append(Job("lab", dict(domain=obj.domain, objective=f"{obj.id}: {obj.title}", tools=[])))
+    if "quiz" in kinds:
+        for domain in ALL_DOMAINS:
+            for num_questions in quiz_sizes:
+                jobs.append(Job("quiz", dict(domain=domain, objective="General Domain Knowledge", num_questions=num_questions)))
+    if "assignment" in kinds:
+        for domain in ALL_DOMAINS:
+            for role in roles:
+                jobs.append(Job("assignment", dict(domain=domain, role=role)))
+    return jobs
+
+
+def _generate_structured(client, system_prompt: str, prompt: str, schema, task: str):
+    result = None
+    for chunk in client.generate_content_stream(system_prompt, prompt, schema, task=task):
+        if isinstance(chunk, schema):
+            result = chunk
+    return result
+
+
+def run_job(client, job: Job, section_concurrency: int = 2):
+    p = job.params
+    if job.kind == "lesson":
+        return build_lesson(client, p["domain"], p["objective"], p["level"], p["duration"], p["role"],
+                            max_concurrency=section_concurrency)
+    if job.kind == "lab":
+        prompt = PromptBuilder.lab_prompt(p["domain"], p["objective"], p["tools"])
+        return _generate_structured(client, PromptBuilder.SYSTEM_LAB, prompt, BANK_SCHEMAS["lab"], "lab")
+    if job.kind == "quiz":
+        prompt = PromptBuilder.quiz_prompt(p["domain"], p["objective"], p["num_questions"])
+        return _generate_structured(client, PromptBuilder.SYSTEM_QUIZ, prompt, BANK_SCHEMAS["quiz"], "quiz")
+    if job.kind == "assignment":
+        prompt = PromptBuilder.scenario_prompt(p["domain"], p["role"])
+        return _generate_structured(client, PromptBuilder.SYSTEM_SCENARIO, prompt, BANK_SCHEMAS["assignment"], "assignment")
+    raise ValueError(f"Unknown job kind: {job.kind}")
+
+
+class Checkpoint:
+    """JSON record of finished/failed jobs, rewritten atomically after every job."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}
+
+    def is_done(self, job: Job) -> bool:
+        return self.state.get(job.key, {}).get("status") == "done"
+
+    def record(self, job: Job, status: str, error: Optional[str] = None):
+        with self._lock:
+            entry = self.state.setdefault(job.key, {"attempts": 0})
+            entry.update(status=status, attempts=entry["attempts"] + 1, updated_at=time.time())
+            if error:
+                entry["error"] = error
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+
+
+def run_pregeneration(
+    client,
+    jobs: List[Job],
+    bank: ContentBank,
+    workers: int = 4,
+    section_concurrency: int = 2,
+    log=print
+) -> Dict[str, int]:
+    """Runs every job not already in the bank/checkpoint. Returns counts by outcome."""
+    checkpoint = Checkpoint(os.path.join(bank.version_dir, "checkpoint.json"))
+    todo = [job for job in jobs if not (checkpoint.is_done(job) and bank.has(job.kind, **job.params))]
+    stats = {"skipped": len(jobs) - len(todo), "done": 0, "failed": 0}
+    log(f"{len(jobs)} jobs, {stats['skipped']} already in bank {bank.version}, {len(todo)} to generate")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_job, client, job, section_concurrency): job for job in todo}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                obj = future.result()
+                if obj is None:
+                    raise ValueError("no valid object generated")
+                bank.put(job.kind, obj, **job.params)
+                checkpoint.record(job, "done")
+                stats["done"] += 1
+            except Exception as e:
+                checkpoint.record(job, "failed", str(e))
+                stats["failed"] += 1
+                log(f"  failed {job.kind} {job.params}: {e}")
+            finished = stats["done"] + stats["failed"]
+            if finished % 10 == 0 or finished == len(todo):
+                log(f"  {finished}/{len(todo)} ({stats['failed']} failed)")
+
+    bank.write_manifest({"last_run": stats})
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate the AI Essentials content bank.")
+    parser.add_argument("--roles", nargs="+", default=DEFAULT_ROLES)
+    parser.add_argument("--levels", nargs="+", default=[l.value for l in DifficultyLevel],
+                        choices=[l.value for l in DifficultyLevel])
+    parser.add_argument("--kinds", nargs="+", default=DEFAULT_KINDS, choices=DEFAULT_KINDS)
+    parser.add_argument("--durations", nargs="+", type=int, default=[30], help="Lesson durations (minutes)")
+    parser.add_argument("--quiz-sizes", nargs="+", type=int, default=[5], help="Questions per quiz")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs generated in parallel")
+    parser.add_argument("--section-concurrency", type=int, default=2, help="Parallel sections per lesson")
+    parser.add_argument("--bank-version", default=CONTENT_BANK_VERSION)
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (e.g. a local stand-in)")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N jobs")
+    parser.add_argument("--dry-run", action="store_true", help="List jobs without generating")
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(args.roles, args.levels, args.kinds, args.durations, args.quiz_sizes)
+    if args.limit is not None:
+        jobs = jobs[:args.limit]
+
+    if args.dry_run:
+        for job in jobs:
+            print(job.kind, json.dumps(job.params))
+        print(f"{len(jobs)} jobs")
+        return 0
+
+    client = OpenAIClient(api_key=args.api_key, base_url=args.base_url,
+                          priority=PRIORITY_BATCH, session_id="pregenerate")
+    if not client.is_configured():
+        print("OPENAI_API_KEY is not set (or pass --api-key).", file=sys.stderr)
+        return 2
+
+    stats = run_pregeneration(client, jobs, ContentBank(version=args.bank_version),
+                              workers=args.workers, section_concurrency=args.section_concurrency)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
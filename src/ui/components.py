@@ -1,5 +1,10 @@
 import streamlit as st
 import os
+import threading
+import uuid
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from src.core.cancellation import CancelToken, cancel_registry
+from src.core.storage import migrated_user_id
 
 def render_sidebar():
     with st.sidebar:
@@ -17,6 +22,7 @@ def render_sidebar():
             "Quiz Engine",
             "Scenarios",
             "Submission & Grading",
+            "Library",
             "Settings"
         ]
         
@@ -67,3 +73,62 @@ def render_privacy_notice():
 def display_streaming_content(placeholder, content: str):
     """Updates a placeholder with accumulated content"""
     placeholder.markdown(content)
+
+def script_context_initializer():
+    """Returns a thread-pool initializer that attaches the current Streamlit
+    script context to worker threads (so they can read st.session_state)."""
+    ctx = get_script_run_ctx()
+
+    def _attach():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+    return _attach
+
+# URL parameter naming the session's learner (?learner=alice)
+LEARNER_PARAM = "learner"
+
+def get_learner_id() -> str:
+    """
+    Identifies this session's learner: the key for progress and per-learner
+    state such as the question pool's seen set. It comes from the URL; a
+    session without one continues the progress imported from the legacy
+    single-user file if there was any, else gets a fresh anonymous ID. Either
+    is written to the URL so a reload or bookmark keeps it. It is never
+    shared through settings, so two sessions only share progress if they
+    name the same learner.
+    """
+    if "learner_id" not in st.session_state:
+        st.session_state.learner_id = (st.query_params.get(LEARNER_PARAM, "").strip() or migrated_user_id()
+                                       or f"learner-{uuid.uuid4().hex[:8]}")
+    if st.query_params.get(LEARNER_PARAM) != st.session_state.learner_id:
+        st.query_params[LEARNER_PARAM] = st.session_state.learner_id
+    return st.session_state.learner_id
+
+def set_learner_id(learner_id: str):
+    """Switches this session to another learner (Settings), keeping the URL in step."""
+    st.session_state.learner_id = learner_id
+    st.query_params[LEARNER_PARAM] = learner_id
+
+def begin_script_run():
+    """Starts this session's run: generations still streaming for its previous run are cancelled."""
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        cancel_registry.new_run(ctx.session_id)
+
+def current_cancel_token() -> CancelToken:
+    """The cancel token of this session's current run, for passing to the OpenAIClient."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return CancelToken()
+    return cancel_registry.current(ctx.session_id)
+
+def queue_notice():
+    """An on_queue callback showing the learner's place in the shared rate-limit queue."""
+    placeholder = st.empty()
+
+    def on_queue(position: int):
+        if position:
+            placeholder.caption(f"⏳ Lots of learners are generating right now - you are #{position} in the queue.")
+        else:
+            placeholder.empty()
+    return on_queue
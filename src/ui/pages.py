@@ -4,26 +4,76 @@ from src.core.schemas import Lesson, Lab, Quiz, Assignment, UserProgress, Diffic
 from src.core.objectives import ALL_DOMAINS, get_objectives_by_domain, get_objective_by_id
 from src.core.openai_client import OpenAIClient
 from src.core.prompts import PromptBuilder
-from src.core.storage import save_progress, load_progress, save_settings, load_settings
-from src.core.analytics import calculate_domain_scores, recommend_next_step
+from src.core.storage import save_progress, load_progress, record_quiz_result, record_question_outcomes, record_lesson_completed, record_lab_completed, save_settings, load_settings, migrated_user_id
+from src.core.analytics import calculate_domain_scores, domain_score_summary, recommend_next_step, weakest_domain
 from src.core.grading import grade_quiz
-from src.core.renderer import render_lesson, render_lab, render_quiz_results, render_assignment
-from src.ui.components import display_streaming_content
+from src.core.mastery import build_outcomes
+from src.core.scheduler import DAY_S, review_scheduler
+from src.core.renderer import render_lesson, render_lesson_header, render_section, render_lesson_footer, render_lab, render_quiz_results, render_assignment, render_partial_preview
+from src.core.streaming_json import PartialContent
+from src.core.content_bank import ContentBank
+from src.core.routing import model_router, AVAILABLE_MODELS, USE_DEFAULT
+from src.core.question_pool import QuestionPool, PoolRefiller
+from src.core.lesson_index import LessonIndex
+from src.core.library import ArtifactLibrary, ARTIFACT_KINDS
+from src.core.prefetch import Prefetcher, PrefetchTarget, predict_next_objective, DEFAULT_LESSON_PARAMS
+from src.core.cancellation import GenerationCancelled
+from src.core.rate_limit import ServiceBusyError, rate_limiter
+from src.core.hedging import hedge_policy
+from src.core.lesson_factory import expand_sections, DEFAULT_SECTION_CONCURRENCY, MAX_SECTION_CONCURRENCY, SECTION_PENDING, SECTION_DONE, SECTION_WRITING, SECTION_FAILED
+from src.ui.components import display_streaming_content, script_context_initializer, get_learner_id, set_learner_id, current_cancel_token, queue_notice
 
 client = OpenAIClient()
+content_bank = ContentBank()
+question_pool = QuestionPool()
+pool_refiller = PoolRefiller(question_pool)
+lesson_index = LessonIndex()
+prefetcher = Prefetcher(lesson_index)
+artifact_library = ArtifactLibrary()
+
+def use_content_cache() -> bool:
+    """False when the learner asked for fresh content on every generation."""
+    if "fresh_content" not in st.session_state:
+        st.session_state.fresh_content = load_settings().get("fresh_content", False)
+    return not st.session_state.fresh_content
+
+def from_content_bank(kind: str, **params):
+    """Pre-generated content for these page inputs, or None (then call the API)."""
+    if not use_content_cache():
+        return None
+    return content_bank.get(kind, **params)
+
+def lesson_preferences() -> dict:
+    """Level/duration/role of the learner's last lesson; prefetched lessons use the same."""
+    return {**DEFAULT_LESSON_PARAMS, **st.session_state.get("lesson_prefs", {})}
+
+def prefetch_next_lesson(progress: UserProgress):
+    """Starts building the lesson the learner will most likely open next."""
+    if not use_content_cache() or not client.is_configured():
+        return
+    objective = predict_next_objective(progress, st.session_state.get("last_lesson_objective"))
+    target = PrefetchTarget.lesson(objective, **lesson_preferences())
+    prefetcher.prefetch(get_learner_id(), client.detached(), target)
 
 def render_dashboard():
     st.header("Dashboard")
-    progress = load_progress()
+    progress = load_progress(get_learner_id())
     
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Your Progress")
         scores = calculate_domain_scores(progress)
+        summary = domain_score_summary(progress)
         for domain, score in scores.items():
             st.write(f"**{domain}**")
             st.progress(score / 100)
-            st.caption(f"Average Score: {score}%")
+            stats = summary.get(domain)
+            if stats:
+                arrow = "↑" if stats["trend"] > 0 else "↓" if stats["trend"] < 0 else "→"
+                st.caption(f"Average Score: {score}% ± {stats['stddev']} over {stats['attempts']} quizzes · "
+                           f"Recent form: {stats['recent']}% · Trend: {arrow} {stats['trend']:+} pts/quiz")
+            else:
+                st.caption(f"Average Score: {score}%")
             
     with col2:
         st.subheader("Recommended Actions")
@@ -33,101 +83,224 @@ def render_dashboard():
         st.markdown("### Stats")
         st.metric("Completed Lessons", len(progress.completed_lessons))
         st.metric("Labs Finished", len(progress.completed_labs))
+        if progress.weak_objectives:
+            st.caption("Objectives needing work: " + ", ".join(progress.weak_objectives))
+
+        st.markdown("### Due for Review")
+        learner_id = get_learner_id()
+        due_count = review_scheduler.count_due(learner_id, progress)
+        if due_count:
+            now = time.time()
+            for card in review_scheduler.due(learner_id, progress, 5, now=now):
+                st.write(f"- {review_card_label(card)} · {overdue_label(now - card.due_at)}")
+            st.caption(f"{due_count} item{'s' if due_count != 1 else ''} due. Review them in the Quiz Engine (mode: Review due items).")
+        else:
+            st.caption("Nothing due for review.")
+
+def review_card_label(card) -> str:
+    objective = get_objective_by_id(card.objective_id) if card.objective_id else None
+    title = f"{objective.id} {objective.title}" if objective else card.domain
+    return title if card.kind == "objective" else f"Question from {title}"
+
+def overdue_label(seconds: float) -> str:
+    days = int(seconds // DAY_S)
+    if days:
+        return f"overdue {days} day{'s' if days > 1 else ''}"
+    return "due today"
 
 def render_learning_path():
     st.header("Learning Path")
     
     domain = st.selectbox("Select Domain", ALL_DOMAINS)
     objectives = get_objectives_by_domain(domain)
+    prefetch_next_lesson(load_progress(get_learner_id()))
     
     for obj in objectives:
         with st.expander(f"{obj.id}: {obj.title}"):
             st.write(obj.description)
             if st.button(f"Start Lesson {obj.id}", key=f"start_{obj.id}"):
                 st.session_state.selected_objective = obj
+                st.session_state.auto_start_lesson = True
                 st.session_state.current_page = "Lesson Generator"
                 st.rerun()
 
 def render_lesson_generator():
     st.header("Lesson Generator")
     
+    # Preselect the objective chosen on the Learning Path
+    chosen = st.session_state.get("selected_objective")
+    prefs = lesson_preferences()
+    levels = [l.value for l in DifficultyLevel]
     col1, col2 = st.columns(2)
     with col1:
-        domain = st.selectbox("Domain", ALL_DOMAINS)
+        domain = st.selectbox("Domain", ALL_DOMAINS, index=ALL_DOMAINS.index(chosen.domain) if chosen else 0)
         objectives = get_objectives_by_domain(domain)
         obj_options = {f"{o.id}: {o.title}": o for o in objectives}
-        selected_obj_key = st.selectbox("Objective", list(obj_options.keys()))
+        obj_keys = list(obj_options.keys())
+        chosen_key = f"{chosen.id}: {chosen.title}" if chosen else None
+        selected_obj_key = st.selectbox("Objective", obj_keys, index=obj_keys.index(chosen_key) if chosen_key in obj_keys else 0)
         selected_obj = obj_options[selected_obj_key]
         
     with col2:
-        level = st.selectbox("Level", [l.value for l in DifficultyLevel])
-        duration = st.slider("Duration (mins)", 15, 60, 30)
-        role = st.text_input("Target Audience Role", "IT Support Specialist")
+        level = st.selectbox("Level", levels, index=levels.index(prefs["level"]) if prefs["level"] in levels else 0)
+        duration = st.slider("Duration (mins)", 15, 60, prefs["duration"])
+        role = st.text_input("Target Audience Role", prefs["role"])
 
-    if st.button("Generate Lesson", type="primary"):
-        # Container for live updates
-        main_status = st.status("Initializing Lesson Factory...", expanded=True)
-        
-        try:
-            # Step 1: Generate Structure
-            main_status.write("🏗 Drafting Lesson Outline...")
-            outline_prompt = PromptBuilder.lesson_outline_prompt(domain, selected_obj.title, level, duration, role)
-            
-            # Use generate_content_stream but we primarily want the obj
-            # We can silence the stream or just show it briefly
-            placeholder = st.empty()
-            lesson_obj = None
-            
-            # Simple stream loop to keep connection alive/show activity
-            for chunk in client.generate_content_stream("Instructor", outline_prompt, Lesson):
-                if not isinstance(chunk, str):
-                    lesson_obj = chunk
-            
-            if not lesson_obj:
-                main_status.update(label="Failed to generate outline", state="error")
+    learner_id = get_learner_id()
+    target = PrefetchTarget.lesson(selected_obj, level, duration, role)
+    # Arriving from "Start Lesson": open straight away if the lesson was prefetched
+    auto_start = st.session_state.pop("auto_start_lesson", False) and (
+        prefetcher.is_ready(target) or prefetcher.pending(learner_id, target) is not None)
+
+    generate = False
+    request = (selected_obj.id, level, duration, role.strip())
+    if st.button("Generate Lesson", type="primary") or auto_start:
+        st.session_state.lesson_prefs = {"level": level, "duration": duration, "role": role.strip()}
+        st.session_state.last_lesson_objective = selected_obj.id
+        prefetcher.cancel(learner_id, keep=target)  # a prefetch for anything else guessed wrong
+        running = prefetcher.pending(learner_id, target)
+        if running:
+            with st.spinner("Finishing the lesson prepared in the background..."):
+                try:
+                    running.result(timeout=300)
+                except Exception:
+                    pass
+
+        banked = from_content_bank("lesson", domain=domain, objective=selected_obj.title, level=level, duration=duration, role=role)
+        if banked:
+            render_lesson(banked)
+            st.session_state.current_lesson = banked
+            artifact_library.add(banked, objective_id=selected_obj.id, level=level, role=role)
+            completion_button("Mark lesson as completed", record_lesson_completed, selected_obj.id, key="complete_lesson")
+            st.success("Lesson loaded from the content bank.")
+            return
+
+        match = lesson_index.best_match(*request) if use_content_cache() else None
+        if match and match.score >= 1.0:
+            cached = lesson_index.load(match.lesson_id)
+            if cached:
+                render_lesson(cached)
+                st.session_state.current_lesson = cached
+                artifact_library.add(cached, objective_id=selected_obj.id, level=level, role=role)
+                completion_button("Mark lesson as completed", record_lesson_completed, selected_obj.id, key="complete_lesson")
+                st.success("Lesson ready.")
                 return
+        if match:
+            st.session_state.lesson_offer = (request, match)
+        else:
+            generate = True
 
-            main_status.write(f"✅ Outline created: {lesson_obj.title} ({len(lesson_obj.sections)} sections)")
-            placeholder.empty()
-            
-            # Step 2: Expand Sections meaning fully
-            progress_bar = main_status.progress(0)
-            total_sections = len(lesson_obj.sections)
-            
-            for i, section in enumerate(lesson_obj.sections):
-                main_status.write(f"✍️ Writing Section {i+1}: {section.title}...")
-                
-                content_prompt = PromptBuilder.section_content_prompt(
-                    section.title, lesson_obj.domain, role, lesson_obj.overview
-                )
-                
-                # Stream the markdown content directly
-                section_content = ""
-                section_placeholder = st.empty()
-                section_placeholder.markdown(f"**Writing: {section.title}**...\n\n")
-                
-                # Use scalar chat stream for content
-                stream = client.generate_chat_response("You are a technical writer.", [{"role": "user", "content": content_prompt}])
-                
-                for text_chunk in stream:
-                    section_content += text_chunk
-                    # Optional: live preview of current section? 
-                    # It might be too jumping. Let's just show a spinner or raw text.
-                    # section_placeholder.markdown(section_content + "▌")
-                
-                section.content = section_content
-                section_placeholder.empty() # Clear the streaming text
-                progress_bar.progress((i + 1) / total_sections)
-            
-            main_status.update(label="Lesson Ready!", state="complete", expanded=False)
-            
+    # A lesson for a near-identical role exists: offer it instead of a full rebuild
+    offer = st.session_state.get("lesson_offer")
+    if offer and offer[0] == request:
+        match = offer[1]
+        st.info(f"A lesson for the similar role \"{match.role}\" ({match.score:.0%} match) was already generated.")
+        col_use, col_new = st.columns(2)
+        if col_use.button("Use cached lesson"):
+            del st.session_state.lesson_offer
+            cached = lesson_index.load(match.lesson_id)
+            if cached:
+                render_lesson(cached)
+                st.session_state.current_lesson = cached
+                artifact_library.add(cached, objective_id=selected_obj.id, level=level, role=role)
+                completion_button("Mark lesson as completed", record_lesson_completed, selected_obj.id, key="complete_lesson")
+                st.success("Lesson loaded from previously generated lessons.")
+                return
+            generate = True
+        if col_new.button("Generate a new lesson"):
+            del st.session_state.lesson_offer
+            generate = True
+
+    if generate:
+        generate_lesson(domain, selected_obj, level, duration, role)
+
+def generate_lesson(domain, selected_obj, level, duration, role):
+    # Container for live updates
+    main_status = st.status("Initializing Lesson Factory...", expanded=True)
+    
+    try:
+        # Step 1: Generate Structure
+        main_status.write("🏗 Drafting Lesson Outline...")
+        outline_prompt = PromptBuilder.lesson_outline_prompt(domain, selected_obj.title, level, duration, role)
+        
+        # Use generate_content_stream but we primarily want the obj
+        # We can silence the stream or just show it briefly
+        placeholder = st.empty()
+        lesson_obj = None
+        
+        # Show the outline as its fields arrive
+        for chunk in client.generate_content_stream(PromptBuilder.SYSTEM_LESSON, outline_prompt, Lesson, use_cache=use_content_cache(), yield_partials=True, task="outline", cancel_token=current_cancel_token(), on_queue=queue_notice()):
+            if isinstance(chunk, PartialContent):
+                with placeholder.container():
+                    render_partial_preview(chunk)
+            elif not isinstance(chunk, str):
+                lesson_obj = chunk
+        
+        if not lesson_obj:
+            main_status.update(label="Failed to generate outline", state="error")
+            return
+
+        main_status.write(f"✅ Outline created: {lesson_obj.title} ({len(lesson_obj.sections)} sections)")
+        placeholder.empty()
+        
+        # Step 2: Expand all sections concurrently
+        total_sections = len(lesson_obj.sections)
+        concurrency = load_settings().get("section_concurrency", DEFAULT_SECTION_CONCURRENCY)
+        main_status.write(f"✍️ Writing {total_sections} sections ({min(concurrency, total_sections)} at a time)...")
+        progress_bar = main_status.progress(0)
+        section_status = main_status.empty()
+        icons = {SECTION_DONE: "✅", SECTION_WRITING: "✍️", SECTION_FAILED: "❌"}
+
+        def on_progress(states):
+            done = sum(1 for s in states if s == SECTION_DONE)
+            progress_bar.progress(done / total_sections)
+            section_status.markdown("\n".join(
+                f"- {icons.get(state, '⏳')} {section.title}"
+                for section, state in zip(lesson_obj.sections, states)
+            ))
+
+        # Streaming mode: the lesson is laid out now and each section fills in as it is written
+        on_section_update = None
+        if load_settings().get("stream_sections", True):
+            render_lesson_header(lesson_obj)
+            section_slots = [st.empty() for _ in lesson_obj.sections]
+            for slot, section in zip(section_slots, lesson_obj.sections):
+                with slot.container():
+                    render_section(section, "", SECTION_PENDING)
+
+            def on_section_update(index, text, state):
+                with section_slots[index].container():
+                    render_section(lesson_obj.sections[index], text, state)
+
+        expand_sections(
+            client, lesson_obj, role,
+            max_concurrency=concurrency,
+            on_progress=on_progress,
+            thread_initializer=script_context_initializer(),
+            on_section_update=on_section_update,
+            cancel_token=current_cancel_token()
+        )
+        
+        main_status.update(label="Lesson Ready!", state="complete", expanded=False)
+        
+        if on_section_update:
+            render_lesson_footer(lesson_obj)
+        else:
             render_lesson(lesson_obj)
-            st.session_state.current_lesson = lesson_obj
-            st.success("Lesson Generated Successfully!")
-            
-        except Exception as e:
-            main_status.update(label="Error", state="error")
-            st.error(f"Generation failed: {e}")
+        st.session_state.current_lesson = lesson_obj
+        artifact_library.add(lesson_obj, objective_id=selected_obj.id, level=level, role=role)
+        completion_button("Mark lesson as completed", record_lesson_completed, selected_obj.id, key="complete_lesson")
+        lesson_index.add(lesson_obj, selected_obj.id, level, duration, role)
+        st.success("Lesson Generated Successfully!")
+        
+    except GenerationCancelled:
+        main_status.update(label="Cancelled", state="error", expanded=False)
+    except ServiceBusyError as e:
+        main_status.update(label="Service busy", state="error")
+        st.warning(str(e))
+    except Exception as e:
+        main_status.update(label="Error", state="error")
+        st.error(f"Generation failed: {e}")
 
 def render_labs():
     st.header("Hands-on Labs")
@@ -139,18 +312,28 @@ def render_labs():
     tools = st.multiselect("Allowed Tools", ["Python", "Azure Portal", "AWS Console", "ChatGPT", "Excel", "Local IDE"])
     
     if st.button("Generate Lab"):
+        banked = from_content_bank("lab", domain=domain, objective=selected_obj_key, tools=sorted(tools))
+        if banked:
+            render_lab(banked)
+            st.session_state.current_lab = banked
+            artifact_library.add(banked, objective_id=obj_options[selected_obj_key].id)
+            completion_button("Mark lab as completed", record_lab_completed, obj_options[selected_obj_key].id, key="complete_lab")
+            return
+
         with st.spinner("Designing lab..."):
             prompt = PromptBuilder.lab_prompt(domain, selected_obj_key, tools)
             placeholder = st.empty()
-            text_buffer = ""
             final_obj = None
             
-            stream = client.generate_content_stream("You are an expert lab instructor.", prompt, Lab)
+            stream = client.generate_content_stream(PromptBuilder.SYSTEM_LAB, prompt, Lab, use_cache=use_content_cache(), yield_partials=True, task="lab", cancel_token=current_cancel_token(), on_queue=queue_notice())
             
             for chunk in stream:
                 if isinstance(chunk, str):
                     # Hide raw output as requested
                     pass
+                elif isinstance(chunk, PartialContent):
+                    with placeholder.container():
+                        render_partial_preview(chunk)
                 else:
                     final_obj = chunk
             
@@ -158,35 +341,76 @@ def render_labs():
                 placeholder.empty()
                 render_lab(final_obj)
                 st.session_state.current_lab = final_obj
+                artifact_library.add(final_obj, objective_id=obj_options[selected_obj_key].id)
+                completion_button("Mark lab as completed", record_lab_completed, obj_options[selected_obj_key].id, key="complete_lab")
 
 def render_quiz_engine():
     st.header("Quiz Engine")
     
     domain = st.selectbox("Topic", ALL_DOMAINS, key="quiz_domain")
     num_q = st.slider("Number of Questions", 3, 20, 5)
-    
-    if st.button("Start Quiz"):
+    difficulty = st.selectbox("Difficulty", ["Any"] + [l.value for l in DifficultyLevel], key="quiz_difficulty")
+    difficulty = None if difficulty == "Any" else difficulty
+    learner_id = get_learner_id()
+
+    def start_quiz(quiz):
+        artifact_library.add(quiz, level=difficulty)
+        st.session_state.current_quiz = quiz
+        st.session_state.quiz_answers = {}
+        st.session_state.quiz_submitted = False
+        st.session_state.quiz_result_saved = False
+        st.rerun()
+
+    mode = st.radio("Mode", ["New quiz", "Review due items"], horizontal=True, key="quiz_mode")
+    if mode == "Review due items":
+        progress = load_progress(learner_id)
+        due_count = review_scheduler.count_due(learner_id, progress, domain=domain)
+        st.caption(f"{due_count} item{'s' if due_count != 1 else ''} due for review in {domain}")
+        if not due_count:
+            st.info("Nothing is due for review in this topic. Take a new quiz, or come back later.")
+        elif st.button("Start Review"):
+            review = question_pool.assemble_review_quiz(domain, review_scheduler.due(learner_id, progress, num_q, domain=domain))
+            if review:
+                start_quiz(review)
+            st.warning("The due items have no questions in the local pool. Take a new quiz on this topic instead.")
+    else:
+        # Keep enough unseen questions in the pool that the next quiz is assembled locally
+        if question_pool.is_low(domain, learner_id, num_q) and client.is_configured():
+            pool_refiller.request_top_up(client.detached(), domain)
+        available = question_pool.count(domain, learner_id=learner_id, difficulty=difficulty)
+        st.caption(f"{available} unseen questions ready in the local pool"
+                   + (" (topping up in the background)" if pool_refiller.is_running(domain) else ""))
+
+    if mode == "New quiz" and st.button("Start Quiz"):
+        if use_content_cache():
+            pooled = question_pool.assemble_quiz(domain, num_q, learner_id, difficulty=difficulty)
+            if pooled:
+                start_quiz(pooled)
+
+        banked = from_content_bank("quiz", domain=domain, objective="General Domain Knowledge", num_questions=num_q)
+        if banked:
+            start_quiz(question_pool.add_quiz(banked, learner_id))
+
         with st.spinner("Crafting mixed-type questions (PBL, Scenarios)..."):
             prompt = PromptBuilder.quiz_prompt(domain, "General Domain Knowledge", num_q)
-            stream = client.generate_content_stream("You are an exam writer.", prompt, Quiz)
+            stream = client.generate_content_stream(PromptBuilder.SYSTEM_QUIZ, prompt, Quiz, use_cache=use_content_cache(), yield_partials=True, task="quiz", cancel_token=current_cancel_token(), on_queue=queue_notice())
             
             placeholder = st.empty()
-            text_buffer = ""
             final_obj = None
             
             for chunk in stream:
                 if isinstance(chunk, str):
                     # Hide raw output as requested
                     pass
+                elif isinstance(chunk, PartialContent):
+                    with placeholder.container():
+                        render_partial_preview(chunk)
                 else:
                     final_obj = chunk
                     
             if final_obj:
                 placeholder.empty()
-                st.session_state.current_quiz = final_obj
-                st.session_state.quiz_answers = {}
-                st.session_state.quiz_submitted = False
-                st.rerun()
+                start_quiz(question_pool.add_quiz(final_obj, learner_id))
 
     if "current_quiz" in st.session_state:
         quiz = st.session_state.current_quiz
@@ -233,42 +457,56 @@ def render_quiz_engine():
         if st.session_state.get("quiz_submitted"):
             results = grade_quiz(quiz, st.session_state.quiz_answers)
             render_quiz_results(results)
-            # ... saving logic remains same ...
-            
-            # Save score if not local mode
+            # Save score if not local mode; once per submission, not on every rerun of the results
             if not st.session_state.get("local_only_mode", False):
-                progress = load_progress()
-                if quiz.domain not in progress.quiz_scores:
-                    progress.quiz_scores[quiz.domain] = []
-                progress.quiz_scores[quiz.domain].append(results['score_percent'])
-                save_progress(progress)
+                if not st.session_state.get("quiz_result_saved"):
+                    record_quiz_result(learner_id, quiz.domain, results['score_percent'])
+                    known = question_pool.objective_ids([q.id for q in quiz.questions if q.id])
+                    record_question_outcomes(learner_id, build_outcomes(quiz, results['results'], known))
+                    st.session_state.quiz_result_saved = True
                 st.success("Results saved!")
             else:
                 st.info("Results not saved (Local-only mode)")
 
+            # Warm what the learner is likely to open next
+            progress = load_progress(learner_id)
+            weakest = weakest_domain(progress)
+            if weakest and question_pool.is_low(weakest, learner_id, num_q) and client.is_configured():
+                pool_refiller.request_top_up(client.detached(), weakest)
+            prefetch_next_lesson(progress)
+
 def render_scenarios():
     st.header("Scenarios & Assignments")
     role = st.text_input("Your Role", "IT Manager")
     domain = st.selectbox("Focus Area", ALL_DOMAINS, key="scenario_domain")
     
     if st.button("Generate Assignment"):
+        banked = from_content_bank("assignment", domain=domain, role=role)
+        if banked:
+            render_assignment(banked)
+            artifact_library.add(banked, role=role)
+            return
+
         prompt = PromptBuilder.scenario_prompt(domain, role)
-        stream = client.generate_content_stream("You are a business simulation engine.", prompt, Assignment)
+        stream = client.generate_content_stream(PromptBuilder.SYSTEM_SCENARIO, prompt, Assignment, use_cache=use_content_cache(), yield_partials=True, task="assignment", cancel_token=current_cancel_token(), on_queue=queue_notice())
         
         placeholder = st.empty()
-        text_buffer = ""
         final_obj = None
         
         for chunk in stream:
             if isinstance(chunk, str):
                 # Hide raw output as requested
                 pass
+            elif isinstance(chunk, PartialContent):
+                with placeholder.container():
+                    render_partial_preview(chunk)
             else:
                 final_obj = chunk
         
         if final_obj:
             placeholder.empty()
             render_assignment(final_obj)
+            artifact_library.add(final_obj, role=role)
 
 def render_submission():
     st.header("Submission & Grading")
@@ -288,9 +526,64 @@ def render_submission():
             sys_prompt = "You are a strict grader. Evaluate the submission against the rubric/standards. Provide score and constructive feedback."
             usr_prompt = f"Submission: {assignment_text}\n\nRubric Context: {rubric_text}"
             
-            stream = client.generate_chat_response(sys_prompt, [{"role": "user", "content": usr_prompt}])
+            stream = client.generate_chat_response(sys_prompt, [{"role": "user", "content": usr_prompt}], task="grading", cancel_token=current_cancel_token(), on_queue=queue_notice())
             st.write_stream(stream)
 
+def render_library():
+    st.header("Library")
+    st.caption(f"{artifact_library.count()} saved lessons, labs, quizzes and assignments. Opening one makes no API calls.")
+
+    query = st.text_input("Search", placeholder="e.g. bias mitigation rubric")
+    col1, col2, col3 = st.columns(3)
+    kind = col1.selectbox("Type", ["Any"] + list(ARTIFACT_KINDS), format_func=str.title, key="library_kind")
+    domain = col2.selectbox("Domain", ["Any"] + ALL_DOMAINS, key="library_domain")
+    level = col3.selectbox("Level", ["Any"] + [l.value for l in DifficultyLevel], key="library_level")
+    role = st.text_input("Role", key="library_role")
+
+    entries = artifact_library.search(
+        query,
+        kind=None if kind == "Any" else kind,
+        domain=None if domain == "Any" else domain,
+        level=None if level == "Any" else level,
+        role=role or None
+    )
+    if not entries:
+        st.info("Nothing saved matches yet. Generated content is added here automatically.")
+        return
+
+    for entry in entries:
+        details = " · ".join(x for x in (entry.kind.title(), entry.objective_id, entry.level, entry.role) if x)
+        col_text, col_open = st.columns([5, 1])
+        col_text.markdown(f"**{entry.title}**  \n{details}" + (f"  \n{entry.snippet}" if entry.snippet else ""))
+        if col_open.button("Open", key=f"open_{entry.artifact_id}"):
+            st.session_state.library_open = entry.artifact_id
+
+    opened = st.session_state.get("library_open")
+    artifact = artifact_library.load(opened) if opened else None
+    if artifact is None:
+        return
+    st.markdown("---")
+    if isinstance(artifact, Lesson):
+        render_lesson(artifact)
+        st.session_state.current_lesson = artifact
+        completion_button("Mark lesson as completed", record_lesson_completed, artifact.objective_id, key="complete_lesson")
+    elif isinstance(artifact, Lab):
+        render_lab(artifact)
+        st.session_state.current_lab = artifact
+        completion_button("Mark lab as completed", record_lab_completed, artifact.objective_id, key="complete_lab")
+    elif isinstance(artifact, Assignment):
+        render_assignment(artifact)
+    elif isinstance(artifact, Quiz):
+        st.subheader(f"{artifact.domain} quiz")
+        st.write(f"{len(artifact.questions)} questions")
+        if st.button("Take this quiz", type="primary"):
+            st.session_state.current_quiz = artifact
+            st.session_state.quiz_answers = {}
+            st.session_state.quiz_submitted = False
+            st.session_state.quiz_result_saved = False
+            st.session_state.current_page = "Quiz Engine"
+            st.rerun()
+
 def render_settings():
     st.header("Settings")
     
@@ -303,20 +596,150 @@ def render_settings():
     
     st.markdown("---")
     st.subheader("Model Config")
-    st.selectbox("Model", ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"], index=0)
+    settings = load_settings()
+    default_model = st.selectbox(
+        "Default Model", AVAILABLE_MODELS,
+        index=AVAILABLE_MODELS.index(model_router.default_model) if model_router.default_model in AVAILABLE_MODELS else 0
+    )
     st.slider("Temperature", 0.0, 1.0, 0.7)
+    routing = render_model_routing()
+    routing_settings = {"default_model": default_model, "model_routing": routing}
+    if routing_settings != model_router.to_settings():
+        settings.update(routing_settings)
+        save_settings(settings)
+        model_router.update(settings)
+    hedge_col1, hedge_col2 = st.columns([2, 1])
+    hedge_requests = hedge_col1.toggle(
+        "Hedge slow requests", value=hedge_policy.enabled,
+        help="Send a second copy of a lesson outline, lab, quiz or scenario request whose first output is later "
+             "than usual, and keep whichever answers first. Costs at most ~10% extra requests."
+    )
+    hedge_percentile = hedge_col2.selectbox(
+        "Hedge after TTFT percentile", [90, 95, 99],
+        index=[90, 95, 99].index(int(hedge_policy.percentile)) if int(hedge_policy.percentile) in (90, 95, 99) else 1,
+        disabled=not hedge_requests
+    )
+    hedge_settings = {"hedge_requests": hedge_requests, "hedge_percentile": float(hedge_percentile)}
+    if hedge_settings != hedge_policy.to_settings():
+        settings.update(hedge_settings)
+        save_settings(settings)
+        hedge_policy.update(settings)
+    concurrency = st.slider(
+        "Parallel section writers",
+        1, MAX_SECTION_CONCURRENCY,
+        settings.get("section_concurrency", DEFAULT_SECTION_CONCURRENCY),
+        help="How many lesson sections are written at the same time."
+    )
+    if concurrency != settings.get("section_concurrency"):
+        settings["section_concurrency"] = concurrency
+        save_settings(settings)
+
+    stream_sections = st.toggle(
+        "Stream lesson sections as they are written",
+        value=settings.get("stream_sections", True),
+        help="Show each section while it is generated instead of the whole lesson at the end."
+    )
+    if stream_sections != settings.get("stream_sections", True):
+        settings["stream_sections"] = stream_sections
+        save_settings(settings)
+
+    fresh = st.toggle(
+        "Always generate fresh content",
+        value=settings.get("fresh_content", False),
+        help="Skip the local content cache and call the API on every generation."
+    )
+    st.session_state.fresh_content = fresh
+    if fresh != settings.get("fresh_content", False):
+        settings["fresh_content"] = fresh
+        save_settings(settings)
+
+    if st.button("Clear Content Cache"):
+        client.cache.clear()
+        st.success("Content cache cleared.")
     
+    st.markdown("---")
+    st.subheader("Generation Telemetry")
+    render_telemetry_panel()
+
     st.markdown("---")
     st.subheader("Privacy & Storage")
+    learner_id = st.text_input("Learner ID", value=get_learner_id(),
+                               help="Your progress is stored under this ID, which is also kept in the page URL "
+                                    "(?learner=...). Enter the same ID on another device to continue there.").strip()
+    if learner_id and learner_id != get_learner_id():
+        set_learner_id(learner_id)
+    imported_as = migrated_user_id()
+    if imported_as:
+        st.caption(f"Progress saved before per-learner storage was imported as learner `{imported_as}`. "
+                   "Sessions opened without a learner in the URL continue it; enter another ID to start fresh.")
+        if get_learner_id() != imported_as and st.button(f"Switch to `{imported_as}`"):
+            set_learner_id(imported_as)
+            st.rerun()
     local_mode = st.toggle("Local-only mode (Do not save progress)", value=st.session_state.get("local_only_mode", False))
     st.session_state.local_only_mode = local_mode
     
     if st.button("Clear Local Progress"):
-        save_progress(UserProgress())
+        save_progress(UserProgress(), get_learner_id())
         st.success("Progress reset.")
 
+def render_model_routing() -> dict:
+    """Per-stage model, fallback and budget inputs. Returns the routing settings."""
+    routing = {}
+    stage_models = [USE_DEFAULT] + AVAILABLE_MODELS
+    with st.expander("Model routing per stage"):
+        st.caption("A stage switches to its fallback model while its observed p95 latency or average cost is over budget.")
+        for task, route in model_router.routes.items():
+            col1, col2, col3, col4 = st.columns(4)
+            model = col1.selectbox(task.title(), stage_models, key=f"route_model_{task}",
+                                   index=stage_models.index(route.model) if route.model in stage_models else 0)
+            fallback = col2.selectbox("Fallback", AVAILABLE_MODELS, key=f"route_fallback_{task}",
+                                      index=AVAILABLE_MODELS.index(route.fallback_model) if route.fallback_model in AVAILABLE_MODELS else 0)
+            budget_s = col3.number_input("p95 budget (s)", min_value=1.0, value=route.p95_budget_ms / 1000,
+                                         step=1.0, key=f"route_budget_{task}")
+            max_cost = col4.number_input("Max $/call", min_value=0.0, value=route.max_cost_usd,
+                                         step=0.005, format="%.3f", key=f"route_cost_{task}")
+            routing[task] = {"model": model, "fallback_model": fallback,
+                             "p95_budget_ms": budget_s * 1000, "max_cost_usd": max_cost}
+        st.dataframe(model_router.status(client.metrics), hide_index=True, use_container_width=True)
+    return routing
+
+def render_telemetry_panel():
+    """Per-page latency, token and cost aggregates of recorded LLM calls."""
+    window = st.selectbox("Window", ["Last 24 hours", "Last 7 days", "All time"], key="telemetry_window")
+    since = {"Last 24 hours": time.time() - 86400, "Last 7 days": time.time() - 7 * 86400}.get(window)
+    summary = client.metrics.summary_by_page(since)
+    if not summary:
+        st.caption("No generation calls recorded yet.")
+        return
+
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Estimated Spend", f"${sum(row['Cost ($)'] for row in summary):.4f}")
+    col2.metric("Tokens", f"{sum(row['Tokens'] for row in summary):,}")
+    col3.metric("Saved by Cancelling", f"{sum(row['Tokens saved'] for row in summary):,} tokens")
+
+    with st.expander("Shared rate limits"):
+        st.caption("Org-wide budgets (OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT) shared by every learner; "
+                   "interactive requests are served before prefetch and batch ones.")
+        st.dataframe([{**rate_limiter.status(), **{f"Queued: {name}": count for name, count in rate_limiter.queue_lengths().items()},
+                       "Retries": rate_limiter.stats["retries"], "429s": rate_limiter.stats["rate_limited"]}],
+                     hide_index=True, use_container_width=True)
+
+    with st.expander("Request hedging"):
+        st.dataframe([hedge_policy.status()], hide_index=True, use_container_width=True)
+
+    with st.expander("Inter-chunk gap histogram (recent calls)"):
+        histogram = client.metrics.gap_histogram()
+        st.bar_chart({"Gap": list(histogram), "Chunks": list(histogram.values())}, x="Gap", y="Chunks")
+
+def completion_button(label: str, record, item_id: str, key: str):
+    """Records the completion in the click callback, so it lands even though the content is gone after the rerun."""
+    local_only = st.session_state.get("local_only_mode", False)
+    st.button(label, key=key, on_click=record, args=(get_learner_id(), item_id), disabled=local_only,
+              help="Progress is not saved in Local-only mode" if local_only else None)
+
 def save_progress_safe(progress: UserProgress):
     if st.session_state.get("local_only_mode", False):
         return
-    save_progress(progress)
+    save_progress(progress, get_learner_id())
 
@@ -1,6 +1,21 @@
+import csv
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
 import unittest
-from src.core.schemas import Lesson, Quiz, Question, DifficultyLevel, QuestionType
+import numpy as np
+from src.core.schemas import Lesson, Lab, LabStep, Quiz, Question, Assignment, Section, DifficultyLevel, QuestionType, QuestionOutcome, ReviewCard, ScoreStats, UserProgress
 from src.core.grading import grade_quiz
+from src.core.analytics import calculate_domain_scores, domain_score_summary, recommend_next_step
+from src.core.mastery import OBJECTIVE_IDS, P_INIT, apply_outcomes, build_outcomes, expected_gain, fit_mastery, infer_objective, rank_objectives
+from src.core.scheduler import DAY_S, ReviewQueue, ReviewScheduler, card_key, schedule_outcomes, sm2_review
+from src.core.library import ArtifactLibrary, fts_query
+from src.core.cohort import analyze, build_columns, export_report, load_columns
+from src.tools.cohort_report import run_benchmark
+from src.core.progress_store import SQLiteProgressBackend, JSONProgressBackend, EventLogProgressBackend, CachedProgressBackend, ProgressLogCorrupt, migrate_json_progress, migrated_user_id
 
 class TestSchemas(unittest.TestCase):
     def test_lesson_creation(self):
@@ -56,5 +71,584 @@ class TestGrading(unittest.TestCase):
         result = grade_quiz(q, user_answers)
         self.assertEqual(result['score_percent'], 0.0)
 
+class TestScoreAggregates(unittest.TestCase):
+    def test_running_aggregates_match_history(self):
+        scores = [40.0, 55.0, 62.5, 80.0, 71.0, 90.0, 85.0, 95.0, 60.0, 88.0, 92.0, 99.0]
+        progress = UserProgress()
+        for score in scores:
+            progress.record_quiz_score("AI Fundamentals", score)
+        stats = progress.domain_stats("AI Fundamentals")
+        self.assertEqual(stats.count, len(scores))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(scores))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(scores))
+        self.assertEqual((stats.min, stats.max), (40.0, 99.0))
+        self.assertEqual(stats.recent, scores[-10:])
+        self.assertGreater(stats.trend, 0)
+        self.assertEqual(calculate_domain_scores(progress)["AI Fundamentals"], round(statistics.fmean(scores), 1))
+
+    def test_aggregates_rebuilt_for_stored_or_edited_scores(self):
+        legacy = UserProgress(**{"quiz_scores": {"AI Fundamentals": [50.0, 70.0]}})
+        self.assertEqual(legacy.score_stats["AI Fundamentals"].count, 2)
+        legacy.quiz_scores["AI Fundamentals"].append(90.0)  # edited without record_quiz_score
+        self.assertEqual(legacy.domain_stats("AI Fundamentals").mean, 70.0)
+        reloaded = UserProgress.model_validate_json(legacy.model_dump_json())
+        self.assertEqual(reloaded, legacy)
+
+    def test_sqlite_stores_aggregates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteProgressBackend(os.path.join(tmp, "progress.db"))
+            for score in (50.0, 70.0, 90.0):
+                backend.record_quiz_result("alice", "AI Fundamentals", score)
+            stored = backend.load("alice").score_stats["AI Fundamentals"]
+            self.assertEqual(stored, ScoreStats.of([50.0, 70.0, 90.0]))
+            backend.save("alice", UserProgress())
+            self.assertEqual(backend.load("alice").score_stats, {})
+
+    def test_sqlite_load_skips_the_score_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteProgressBackend(os.path.join(tmp, "progress.db"))
+            scores = [float(i) for i in range(25)]
+            for score in scores:
+                backend.record_quiz_result("alice", "AI Fundamentals", score)
+            progress = backend.load("alice")
+            self.assertEqual(progress.quiz_scores, {"AI Fundamentals": scores[-10:]})
+            self.assertEqual(progress.domain_stats("AI Fundamentals"), ScoreStats.of(scores))
+            progress.record_quiz_score("AI Fundamentals", 99.0)
+            progress.completed_lessons.append("1.1")
+            backend.save("alice", progress)  # appends to the history, does not cut it to the window
+            self.assertEqual(backend.score_history("alice"), {"AI Fundamentals": scores + [99.0]})
+            self.assertEqual(backend.load("alice").score_stats["AI Fundamentals"], ScoreStats.of(scores + [99.0]))
+
+    def test_summary_only_lists_started_domains(self):
+        progress = UserProgress()
+        for score in (90.0, 70.0, 50.0):
+            progress.record_quiz_score("AI Fundamentals", score)
+        summary = domain_score_summary(progress)
+        self.assertEqual(list(summary), ["AI Fundamentals"])
+        self.assertEqual(summary["AI Fundamentals"]["trend"], -20.0)
+        self.assertEqual(summary["AI Fundamentals"]["recent"], round(0.3 * 50 + 0.7 * (0.3 * 70 + 0.7 * 90), 1))
+
+
+def outcome(objective_id, correct, difficulty="Intermediate"):
+    return QuestionOutcome(domain="AI Fundamentals", objective_id=objective_id, difficulty=difficulty, correct=correct)
+
+
+class TestMastery(unittest.TestCase):
+    def test_answers_move_mastery_and_weak_objectives(self):
+        progress = UserProgress()
+        apply_outcomes(progress, [outcome("1.1", True)] * 4 + [outcome("1.3", False)] * 3)
+        self.assertGreater(progress.mastery["1.1"].p, 0.9)
+        self.assertLess(progress.mastery["1.3"].p, P_INIT)
+        self.assertEqual((progress.mastery["1.3"].attempts, progress.mastery["1.3"].correct), (3, 0))
+        self.assertEqual(progress.weak_objectives, ["1.3"])
+
+        ranked = rank_objectives(progress)
+        self.assertEqual(ranked[0][0].id, "1.3")
+        self.assertEqual(ranked[-1][0].id, "1.1")
+        self.assertIn("1.3", recommend_next_step(progress))
+
+    def test_practiced_weak_objectives_rank_before_untouched_ones(self):
+        progress = UserProgress()
+        apply_outcomes(progress, [outcome("2.3", False), outcome("2.3", True)])
+        apply_outcomes(progress, [outcome("1.2", True)] * 3)
+        self.assertGreater(progress.mastery["2.3"].p, P_INIT)  # stronger than the prior, but still weak
+        self.assertEqual(progress.weak_objectives, ["2.3"])
+
+        ranked = [objective.id for objective, _, _ in rank_objectives(progress)]
+        untouched = [o for o in OBJECTIVE_IDS if o not in ("2.3", "1.2")]
+        self.assertEqual(ranked, ["2.3"] + untouched + ["1.2"])
+        self.assertIn("2.3", recommend_next_step(progress))
+
+        apply_outcomes(progress, [outcome("2.3", True)] * 3)  # no longer weak: the syllabus comes next
+        self.assertEqual(rank_objectives(progress)[0][0].id, untouched[0])
+        self.assertIn(f"Start {untouched[0]}", recommend_next_step(progress))
+
+    def test_expected_gain_weighs_both_answers(self):
+        p = np.array([0.1, 0.5, 0.9])
+        self.assertTrue(np.all(expected_gain(p) > 0))
+        self.assertTrue(np.all(np.diff(expected_gain(p)) < 0))  # less left to learn
+        np.testing.assert_allclose(expected_gain(p, "Advanced"), (1 - p) * 0.15)  # the posterior is unbiased
+
+    def test_vectorized_refit_matches_incremental_updates(self):
+        rng = np.random.default_rng(7)
+        histories, expected = {}, {}
+        for learner in range(200):
+            outcomes = [outcome(OBJECTIVE_IDS[rng.integers(len(OBJECTIVE_IDS))], bool(rng.random() < 0.6),
+                                ["Beginner", "Intermediate", "Advanced"][rng.integers(3)])
+                        for _ in range(rng.integers(0, 60))]
+            histories[f"learner-{learner}"] = outcomes
+            progress = UserProgress()
+            apply_outcomes(progress, outcomes)
+            expected[f"learner-{learner}"] = progress
+
+        learner_ids, matrix = fit_mastery(histories)
+        self.assertEqual(matrix.shape, (200, len(OBJECTIVE_IDS)))
+        for row, learner_id in enumerate(learner_ids):
+            incremental = [expected[learner_id].mastery[o].p if o in expected[learner_id].mastery else P_INIT
+                           for o in OBJECTIVE_IDS]
+            np.testing.assert_allclose(matrix[row], incremental)
+
+    def test_outcomes_are_tagged_with_an_objective(self):
+        questions = [
+            Question(id="pooled", type=QuestionType.TRUE_FALSE, prompt="Q1", options=["True", "False"], answer="True",
+                     rationale="", difficulty=DifficultyLevel.ADVANCED),
+            Question(type=QuestionType.SINGLE_CHOICE, prompt="Which is reinforcement learning, supervised or unsupervised?",
+                     options=["a", "b"], answer="a", rationale="", difficulty=DifficultyLevel.BEGINNER),
+        ]
+        quiz = Quiz(domain="AI Fundamentals", questions=questions)
+        graded = grade_quiz(quiz, {"Q1": "True", questions[1].prompt: "b"})["results"]
+        outcomes = build_outcomes(quiz, graded, {"pooled": "1.4"})
+        self.assertEqual([(o.objective_id, o.difficulty, o.correct) for o in outcomes],
+                         [("1.4", "Advanced", True), ("1.3", "Beginner", False)])
+        self.assertIsNone(infer_objective("AI Fundamentals", "completely unrelated words"))
+
+
+class TestReviewScheduler(unittest.TestCase):
+    def test_sm2_intervals(self):
+        card = ReviewCard(kind="objective", item_id="1.1", domain="AI Fundamentals")
+        intervals = []
+        for day in range(4):
+            sm2_review(card, 4, day * DAY_S)
+            intervals.append(card.interval_days)
+        self.assertEqual(intervals[:2], [1.0, 6.0])
+        self.assertEqual(intervals[2:], [15.0, 37.5])  # x easiness (2.5 stays 2.5 at quality 4)
+        sm2_review(card, 1, 10 * DAY_S)
+        self.assertEqual((card.interval_days, card.repetitions, card.lapses), (1.0, 0, 1))
+        self.assertEqual(card.due_at, 11 * DAY_S)
+        self.assertLess(card.easiness, 2.5)
+
+    def test_outcomes_review_questions_and_objectives(self):
+        progress = UserProgress()
+        answers = [QuestionOutcome(domain="AI Fundamentals", objective_id="1.1", difficulty="Beginner",
+                                   correct=i < 3, question_id=f"q{i}", answered_at=100.0) for i in range(4)]
+        changed = schedule_outcomes(progress, answers)
+        self.assertEqual(len(changed), 5)
+        self.assertEqual(progress.review_cards["question:q0"].repetitions, 1)
+        self.assertEqual(progress.review_cards["question:q3"].lapses, 1)
+        objective = progress.review_cards["objective:1.1"]  # one review for the quiz: 3 of 4 right
+        self.assertEqual((objective.repetitions, objective.due_at), (1, 100.0 + DAY_S))
+
+    def test_queue_returns_most_overdue_per_domain(self):
+        cards = {card_key("question", str(i)): ReviewCard(kind="question", item_id=str(i),
+                                                         domain="A" if i % 2 else "B", due_at=float(i))
+                 for i in range(1000)}
+        queue = ReviewQueue(cards)
+        self.assertEqual(queue.due(now=10.5, n=3), ["question:0", "question:1", "question:2"])
+        self.assertEqual(queue.due(now=10.5, n=3, domain="A"), ["question:1", "question:3", "question:5"])
+        self.assertEqual(queue.due(now=2.0, n=10), ["question:0", "question:1", "question:2"])
+        self.assertEqual(queue.count_due(10.5, domain="B"), 6)
+
+        cards["question:1"].due_at = 5000.0  # reviewed: the old heap entry goes stale
+        queue.push("question:1", cards["question:1"])
+        self.assertEqual(queue.due(now=10.5, n=3, domain="A"), ["question:3", "question:5", "question:7"])
+        self.assertEqual(queue.due(now=10.5, n=3, domain="A"), ["question:3", "question:5", "question:7"])
+        self.assertEqual(len(queue), 1000)
+
+    def test_incremental_queue_matches_rebuild(self):
+        rng = np.random.default_rng(3)
+        scheduler, progress = ReviewScheduler(), UserProgress()
+        for quiz in range(30):
+            outcomes = [QuestionOutcome(domain="AI Fundamentals", objective_id=OBJECTIVE_IDS[rng.integers(4)], difficulty="Intermediate",
+                                        correct=bool(rng.random() < 0.6), question_id=f"q{rng.integers(20)}", answered_at=quiz * DAY_S)
+                        for _ in range(5)]
+            apply_outcomes(progress, outcomes)
+            scheduler.record("alice", progress, outcomes)
+            if quiz == 0:
+                queue = scheduler.queue("alice", progress)
+            self.assertIs(scheduler.queue("alice", progress), queue)  # pushed into, not rebuilt
+            now = (quiz + 1) * DAY_S
+            self.assertEqual(scheduler.due("alice", progress, 10, now=now),
+                             ReviewScheduler().due("alice", progress, 10, now=now))
+            self.assertEqual(scheduler.count_due("alice", progress, now=now),
+                             ReviewScheduler().count_due("alice", progress, now=now))
+        self.assertEqual(scheduler.due("alice", UserProgress(), 10), [])  # progress reset
+
+    def test_count_due_tracks_reschedules_and_compacts(self):
+        cards = {card_key("question", str(i)): ReviewCard(kind="question", item_id=str(i), domain="A", due_at=float(i))
+                 for i in range(100)}
+        queue = ReviewQueue(cards)
+        for round_ in range(5):
+            for i in range(0, 100, 2):
+                cards[f"question:{i}"].due_at = float(1000 * (round_ + 1) + i)
+                queue.push(f"question:{i}", cards[f"question:{i}"])
+        self.assertEqual(queue.count_due(49.5), 25)  # the odd cards left
+        self.assertEqual(queue.count_due(6000.0), 100)
+        self.assertLessEqual(sum(len(heap) for heap in queue._heaps.values()), 200)
+
+    def test_stale_queue_skips_missing_cards(self):
+        scheduler, progress = ReviewScheduler(), UserProgress()
+        apply_outcomes(progress, [outcome("1.1", True)])
+        scheduler.due("alice", progress, 10, now=10 * DAY_S)
+        # Reset in another process, then the same number of answers on another objective
+        progress = UserProgress()
+        apply_outcomes(progress, [outcome("1.2", True)])
+        cards = scheduler.due("alice", progress, 10, now=10 * DAY_S)
+        self.assertTrue(all(card.objective_id != "1.1" for card in cards))
+
+
+class TestCohortAnalytics(unittest.TestCase):
+    def cohort(self):
+        strong, weak, idle = UserProgress(), UserProgress(), UserProgress()
+        apply_outcomes(strong, [outcome(objective_id, True) for objective_id in OBJECTIVE_IDS for _ in range(4)])
+        for score in (85.0, 95.0):
+            strong.record_quiz_score("AI Fundamentals", score)
+        apply_outcomes(weak, [outcome("1.1", False)] * 3)
+        weak.record_quiz_score("AI Fundamentals", 30.0)
+        return [("strong", strong), ("weak", weak), ("idle", idle)]
+
+    def test_forecasts_and_at_risk(self):
+        report = analyze(build_columns(self.cohort(), size_hint=1))  # grows past the hint
+        learners = dict(zip(report.learners["learner_id"], report.learners["pass_probability"]))
+        self.assertGreater(learners["strong"], 0.9)
+        self.assertLess(learners["weak"], 0.1)
+        self.assertEqual([r["learner_id"] for r in report.at_risk()], ["weak"])  # idle has no activity to judge
+        self.assertEqual(report.at_risk()[0]["weakest_objective"], "1.1")
+        self.assertEqual(report.summary["active_learners"], 2)
+
+        fundamentals = list(report.domains["domain"]).index("AI Fundamentals")
+        self.assertEqual(report.domains["learners_started"][fundamentals], 2)
+        self.assertEqual(report.domains["mean_score"][fundamentals], round((90.0 + 30.0) / 2, 1))
+        self.assertEqual(report.domains["p50"][fundamentals], 60.0)
+        self.assertEqual(report.domains["pass_rate"][fundamentals], 0.5)
+        self.assertTrue(np.isnan(report.domains["mean_score"][1]))  # nobody started it
+
+    def test_exports_and_backend_loading(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        backend = JSONProgressBackend(os.path.join(tmp.name, "progress"))
+        for learner_id, progress in self.cohort():
+            backend.save(learner_id, progress)
+        cached = CachedProgressBackend(backend)
+        report = analyze(load_columns(cached))
+        self.assertEqual(sorted(report.learners["learner_id"]), ["idle", "strong", "weak"])
+        self.assertEqual(cached.stats["misses"], 0)  # the batch read bypasses the cache
+
+        csv_paths = export_report(report, os.path.join(tmp.name, "csv"))
+        with open(csv_paths[0], newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 3)
+        npz_paths = export_report(report, os.path.join(tmp.name, "npz"), fmt="npz")
+        with np.load(npz_paths[2]) as objectives:
+            self.assertEqual(list(objectives["objective_id"]), OBJECTIVE_IDS)
+
+
+    def test_sqlite_batch_reads_match_per_learner_loads(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        backend = SQLiteProgressBackend(os.path.join(tmp.name, "progress.db"))
+        cohort = self.cohort()
+        for learner_id, progress in cohort:
+            backend.save(learner_id, progress)
+        backend.record_lesson_completed("weak", "1.1")
+        backend.record_lab_completed("weak", "lab-a")
+        self.assertEqual(list(backend.load_many()), [(learner_id, backend.load(learner_id)) for learner_id in backend.users()])
+
+        stored = load_columns(backend, ["weak", "idle", "strong"])
+        expected = build_columns((learner_id, backend.load(learner_id)) for learner_id in ["weak", "idle", "strong"])
+        self.assertEqual(stored.learner_ids, expected.learner_ids)
+        for name in ("quiz_count", "quiz_mean", "quiz_recent", "mastery", "attempts", "lessons_completed", "labs_completed"):
+            np.testing.assert_array_equal(getattr(stored, name), getattr(expected, name))
+        self.assertEqual((stored.lessons_completed[0], stored.labs_completed[0]), (1, 1))
+
+    def test_benchmark_through_sqlite_matches_memory(self):
+        stored, in_memory = run_benchmark(50, backend="sqlite"), run_benchmark(50)
+        self.assertEqual((stored["backend"], in_memory["backend"]), ("sqlite", "memory"))
+        self.assertEqual(stored["at_risk"], in_memory["at_risk"])
+        self.assertIsNotNone(stored["seed_s"])
+
+
+class TestProgressBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.backends = [SQLiteProgressBackend(os.path.join(self.tmp.name, "progress.db")),
+                         JSONProgressBackend(os.path.join(self.tmp.name, "progress")),
+                         EventLogProgressBackend(os.path.join(self.tmp.name, "progress_log"))]
+        self.addCleanup(self.backends[2].close)
+
+    def test_round_trip_per_user(self):
+        for backend in self.backends:
+            progress = UserProgress(completed_lessons=["1.2", "1.1"], completed_labs=["lab-a"],
+                                    quiz_scores={"AI Fundamentals": [40.0, 80.0]}, weak_objectives=["2.1"])
+            backend.save("alice", progress)
+            backend.record_quiz_result("bob", "AI Fundamentals", 100.0)
+            self.assertEqual(backend.load("alice"), progress)
+            self.assertEqual(backend.load("bob").quiz_scores, {"AI Fundamentals": [100.0]})
+            self.assertEqual(backend.load("carol"), UserProgress())
+            self.assertEqual(backend.users(), ["alice", "bob"])
+
+            backend.record_lesson_completed("alice", "1.3")
+            backend.record_lesson_completed("alice", "1.1")  # already done: no duplicate
+            self.assertEqual(backend.load("alice").completed_lessons, ["1.2", "1.1", "1.3"])
+            backend.record_question_outcomes("alice", [outcome("1.3", False), outcome("1.3", False)])
+            backend.record_question_outcomes("alice", [outcome("1.1", True)])
+            loaded = backend.load("alice")
+            self.assertEqual(loaded.weak_objectives, ["1.3", "1.1"])
+            self.assertEqual(loaded.mastery["1.3"].attempts, 2)
+            self.assertEqual(loaded.review_cards["objective:1.3"].lapses, 1)
+            self.assertEqual(loaded.questions_answered, 3)
+            self.assertEqual([o.objective_id for o in backend.question_outcomes("alice")], ["1.3", "1.3", "1.1"])
+            backend.save("bob", loaded)
+            self.assertEqual(backend.load("bob"), loaded)
+            backend.save("alice", UserProgress())
+            self.assertEqual(backend.load("alice"), UserProgress())
+            self.assertEqual(backend.question_outcomes("alice"), [])
+
+    def test_concurrent_sessions_do_not_clobber(self):
+        backend = self.backends[0]
+
+        def take_quizzes(user):
+            for i in range(20):
+                backend.record_quiz_result(user, "AI Fundamentals", float(i))
+
+        threads = [threading.Thread(target=take_quizzes, args=(user,)) for user in ("alice", "bob", "alice")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(backend.score_history("alice")["AI Fundamentals"]), 40)
+        self.assertEqual(backend.load("bob").score_stats["AI Fundamentals"].count, 20)
+
+    def test_json_file_is_migrated_once(self):
+        legacy_path = os.path.join(self.tmp.name, "user_progress.json")
+        with open(legacy_path, "w") as f:
+            json.dump({"completed_lessons": ["1.1"], "quiz_scores": {"AI Fundamentals": [42.9]}}, f)
+        backend = self.backends[0]
+        self.assertIsNone(migrated_user_id(legacy_path))
+        self.assertTrue(migrate_json_progress(backend, "local", legacy_path))
+        self.assertFalse(migrate_json_progress(backend, "local", legacy_path))
+        self.assertEqual(migrated_user_id(legacy_path), "local")  # new sessions default to it
+        progress = backend.load("local")
+        self.assertEqual(progress.completed_lessons, ["1.1"])
+        self.assertEqual(progress.quiz_scores, {"AI Fundamentals": [42.9]})
+        self.assertTrue(os.path.exists(legacy_path))
+
+
+class TestEventLogProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def event_log(self, **kwargs):
+        backend = EventLogProgressBackend(os.path.join(self.tmp.name, "progress_log"), **kwargs)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_replays_after_restart(self):
+        backend = self.event_log(compact_every=5)
+        backend.record_question_outcomes("alice", [outcome("1.2", True)] * 3)  # folded into the first snapshot
+        for i in range(12):
+            backend.record_quiz_result("alice", "AI Fundamentals", float(i))
+        backend.record_lab_completed("alice", "lab-a")
+        backend.close()
+        self.assertGreaterEqual(backend.stats["compactions"], 2)
+
+        reopened = self.event_log()
+        progress = reopened.load("alice")
+        self.assertEqual(progress.quiz_scores["AI Fundamentals"], [float(i) for i in range(12)])
+        self.assertEqual(progress.completed_labs, ["lab-a"])
+        self.assertEqual(progress.mastery["1.2"].attempts, 3)
+        self.assertEqual(len(reopened.question_outcomes("alice")), 3)
+        self.assertLess(reopened.stats["replayed"], 5)  # the rest came from the snapshot
+
+    def test_torn_tail_is_dropped(self):
+        backend = self.event_log()
+        backend.record_quiz_result("alice", "AI Fundamentals", 50.0)
+        backend.close()
+        with open(backend.log_path, "ab") as f:
+            f.write(b'{"seq": 2, "user": "alice", "type": "quiz_gra')
+
+        reopened = self.event_log()
+        self.assertEqual(reopened.load("alice").quiz_scores, {"AI Fundamentals": [50.0]})
+        self.assertGreater(reopened.stats["torn_bytes"], 0)
+        reopened.record_quiz_result("alice", "AI Fundamentals", 70.0)
+        reopened.close()
+        self.assertEqual(self.event_log().load("alice").quiz_scores, {"AI Fundamentals": [50.0, 70.0]})
+
+    def test_corrupt_record_is_not_read_as_empty(self):
+        backend = self.event_log()
+        backend.record_quiz_result("alice", "AI Fundamentals", 50.0)
+        backend.close()
+        with open(backend.log_path, "ab") as f:
+            f.write(b"not json\n")
+            f.write(b'{"seq": 3, "ts": 0, "user": "alice", "type": "quiz_graded", "domain": "AI Fundamentals", "score": 1.0}\n')
+        with self.assertRaises(ProgressLogCorrupt):
+            self.event_log().load("alice")
+
+    def test_snapshot_without_truncate_is_not_applied_twice(self):
+        backend = self.event_log()
+        backend.record_quiz_result("alice", "AI Fundamentals", 50.0)
+        backend.flush()
+        with open(backend.log_path, "rb") as f:
+            logged = f.read()
+        backend.compact()
+        backend.close()
+        with open(backend.log_path, "wb") as f:
+            f.write(logged)  # as if the process died before the log was truncated
+        self.assertEqual(self.event_log().load("alice").quiz_scores, {"AI Fundamentals": [50.0]})
+
+
+class CountingBackend(JSONProgressBackend):
+    """Records the calls it receives from outside (not the load/save inside record_quiz_result)."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.calls = []
+        self._inner = False
+
+    def _count(self, name):
+        if not self._inner:
+            self.calls.append(name)
+
+    def load(self, user_id):
+        self._count("load")
+        return super().load(user_id)
+
+    def save(self, user_id, progress):
+        self._count("save")
+        super().save(user_id, progress)
+
+    def record_quiz_result(self, user_id, domain, score_percent):
+        self._count("record_quiz_result")
+        self._inner = True
+        try:
+            super().record_quiz_result(user_id, domain, score_percent)
+        finally:
+            self._inner = False
+
+    def version(self, user_id):
+        self._count("version")
+        return super().version(user_id)
+
+
+class TestProgressCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = 0.0
+        self.store = CountingBackend(os.path.join(self.tmp.name, "progress"))
+
+    def cache(self, **kwargs):
+        return CachedProgressBackend(self.store, clock=lambda: self.now, **kwargs)
+
+    def test_reruns_do_not_touch_the_backend(self):
+        cache = self.cache(revalidate_s=5)
+        cache.record_quiz_result("alice", "AI Fundamentals", 60.0)
+        cache.load("alice")
+        self.store.calls.clear()
+        for _ in range(10):
+            self.assertEqual(cache.load("alice").quiz_scores, {"AI Fundamentals": [60.0]})
+        self.assertEqual(self.store.calls, [])
+
+        cache.record_quiz_result("alice", "AI Fundamentals", 80.0)
+        self.assertEqual(cache.load("alice").quiz_scores, {"AI Fundamentals": [60.0, 80.0]})
+        self.assertNotIn("load", self.store.calls)
+
+    def test_writes_by_another_process_are_picked_up(self):
+        cache = self.cache(revalidate_s=5)
+        self.assertEqual(cache.load("alice"), UserProgress())
+        JSONProgressBackend(self.store.root).record_quiz_result("alice", "AI Fundamentals", 90.0)
+        self.assertEqual(cache.load("alice"), UserProgress())  # not rechecked yet
+        self.now += 5
+        self.assertEqual(cache.load("alice").quiz_scores, {"AI Fundamentals": [90.0]})
+
+    def test_other_learners_writes_keep_the_entry(self):
+        store = SQLiteProgressBackend(os.path.join(self.tmp.name, "progress.db"))
+        cache = CachedProgressBackend(store, revalidate_s=5, clock=lambda: self.now)
+        cache.record_quiz_result("alice", "AI Fundamentals", 60.0)
+        cache.load("alice")
+        other_process = SQLiteProgressBackend(store.db_path)
+        for _ in range(5):
+            other_process.record_quiz_result("bob", "AI Fundamentals", 70.0)
+            self.now += 5
+            cache.load("alice")
+        self.assertEqual((cache.stats["hits"], cache.stats["misses"]), (5, 1))
+
+        other_process.record_quiz_result("alice", "AI Fundamentals", 90.0)
+        self.now += 5
+        self.assertEqual(cache.load("alice").quiz_scores, {"AI Fundamentals": [60.0, 90.0]})
+
+    def test_write_behind_coalesces_saves(self):
+        cache = self.cache(write_behind_s=60)
+        for lessons in (["1.1"], ["1.1", "1.2"], ["1.1", "1.2", "1.3"]):
+            cache.save("alice", UserProgress(completed_lessons=lessons))
+        cache.record_quiz_result("alice", "AI Fundamentals", 70.0)
+        self.assertEqual(self.store.calls, [])
+        self.assertEqual(cache.load("alice").completed_lessons, ["1.1", "1.2", "1.3"])
+
+        cache.flush()
+        self.assertEqual([c for c in self.store.calls if c != "version"], ["save", "record_quiz_result"])
+        self.assertEqual(self.store.load("alice"),
+                         UserProgress(completed_lessons=["1.1", "1.2", "1.3"], quiz_scores={"AI Fundamentals": [70.0]}))
+
+    def test_returned_progress_is_a_copy(self):
+        cache = self.cache()
+        cache.load("alice").completed_lessons.append("9.9")
+        self.assertEqual(cache.load("alice"), UserProgress())
+
+
+class TestArtifactLibrary(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.library = ArtifactLibrary(os.path.join(self.tmp.name, "library.db"))
+
+    def lesson(self, title="Bias in Training Data", objective_id="2.1", content="Sampling bias skews predictions."):
+        return Lesson(title=title, domain="Responsible AI", objective_id=objective_id, level=DifficultyLevel.BEGINNER,
+                      duration_minutes=15, overview="Why datasets mislead models",
+                      sections=[Section(title="Sources of bias", content=content, duration_minutes=5)],
+                      key_terms=["Bias"], misconceptions=[], checks=[])
+
+    def test_round_trip_and_dedupe(self):
+        lesson = self.lesson()
+        lesson_id = self.library.add(lesson, role="IT Manager")
+        self.assertEqual(self.library.add(lesson, role="IT Manager"), lesson_id)
+        self.assertEqual(self.library.count(), 1)
+        self.assertEqual(self.library.load(lesson_id), lesson)
+        self.assertIsNone(self.library.load("missing"))
+
+    def test_search_text_and_keys(self):
+        self.library.add(self.lesson(), role="IT Manager")
+        lab = Lab(title="Audit a Dataset", domain="Responsible AI", objective_id="2.1", goal="Find skew",
+                  tools=["Excel"], steps=[LabStep(step_number=1, instruction="Compare class frequencies")],
+                  artifacts=[], rubric={"Identifies imbalance": 10})
+        self.library.add(lab)
+        quiz = Quiz(domain="AI Fundamentals", questions=[Question(
+            type=QuestionType.SINGLE_CHOICE, prompt="Which model predicts a number?", options=["Regression", "Clustering"],
+            answer="Regression", rationale="Regression outputs continuous values", difficulty=DifficultyLevel.INTERMEDIATE)])
+        self.library.add(quiz, level="Intermediate")
+        assignment = Assignment(title="Chatbot Rollout Plan", domain="AI Fundamentals", scenario="A helpdesk wants a chatbot",
+                                task="Draft a rollout plan", deliverables=["Plan"], submission_requirements="2 pages",
+                                rubric={"Stakeholder analysis": 5})
+        self.library.add(assignment, role="IT Manager")
+
+        self.assertEqual([e.kind for e in self.library.search("imbalance")], ["lab"])
+        self.assertEqual([e.kind for e in self.library.search("regress")], ["quiz"])  # prefix of the last word
+        self.assertEqual([e.title for e in self.library.search("stakeholder")], ["Chatbot Rollout Plan"])
+        self.assertEqual(len(self.library.search("bias")), 1)
+        self.assertIn("**", self.library.search("sampling")[0].snippet)
+        self.assertEqual({e.kind for e in self.library.search(role="it mgr")}, {"lesson", "assignment"})
+        self.assertEqual([e.kind for e in self.library.search(domain="Responsible AI", kind="lab")], ["lab"])
+        self.assertEqual([e.kind for e in self.library.search(level="Intermediate")], ["quiz"])
+        self.assertEqual(self.library.search("bias", kind="quiz"), [])
+        self.assertEqual(len(self.library.search()), 4)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(fts_query('model "AND" OR -bias*'), '"model" "and" "or" "bias"*')
+        self.assertIsNone(fts_query("  ?! "))
+        self.library.add(self.lesson())
+        self.assertEqual(self.library.search('bias" OR'), [])
+
+    def test_search_scales_to_many_artifacts(self):
+        for i in range(3000):
+            self.library.add(self.lesson(title=f"Lesson {i}", objective_id=f"{i % 40}.1", content=f"topic{i} details"))
+        self.assertEqual(self.library.count(), 3000)
+        start = time.perf_counter()
+        results = self.library.search("topic2999")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual([e.title for e in results], ["Lesson 2999"])
+        self.assertEqual(len(self.library.search("details", objective_id="7.1", limit=1000)), 75)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,725 @@
+import itertools
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from src.core.schemas import Lesson, Section, DifficultyLevel, Quiz, Lab, Assignment, LabStep, Question, QuestionType, ReviewCard, UserProgress
+from src.core.lesson_factory import expand_sections, SECTION_DONE, SECTION_WRITING
+from src.core.cache import ContentCache, make_cache_key
+from src.core.streaming_json import IncrementalJSONParser, build_partial
+from src.core.content_bank import ContentBank
+from src.tools.pregenerate import build_jobs, run_pregeneration
+from src.core.client_pool import get_shared_client
+from src.core.openai_client import OpenAIClient
+from src.core.telemetry import MetricsStore, CallMetrics
+from src.core.routing import ModelRouter
+from src.core.question_pool import QuestionPool, PoolRefiller
+from src.core.dedupe import MAX_BUCKET, NearDuplicateIndex
+from src.core.lesson_index import LessonIndex, normalize_role
+from src.core.prefetch import Prefetcher, PrefetchTarget, predict_next_objective
+from src.core.objectives import get_objective_by_id
+from src.core.cancellation import CancelToken, CancelRegistry, GenerationCancelled
+from src.core.rate_limit import RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+
+class FakeChatClient:
+    """Stands in for OpenAIClient: echoes the section title after a delay."""
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_chat_response(self, system_prompt, chat_history, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            prompt = chat_history[-1]["content"]
+            title = prompt.split('Current Section: "')[1].split('"')[0]
+            yield "Body of "
+            yield title
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_lesson(num_sections: int) -> Lesson:
+    return Lesson(
+        title="Intro to AI",
+        domain="AI Fundamentals",
+        objective_id="1.1",
+        level=DifficultyLevel.BEGINNER,
+        duration_minutes=30,
+        overview="Test overview",
+        sections=[Section(title=f"S{i}", duration_minutes=5) for i in range(num_sections)],
+        key_terms=[],
+        misconceptions=[],
+        checks=[]
+    )
+
+
+class TestSectionExpansion(unittest.TestCase):
+    def test_sections_expand_in_order_and_in_parallel(self):
+        client = FakeChatClient(delay=0.2)
+        lesson = make_lesson(5)
+        reported = []
+
+        start = time.perf_counter()
+        expand_sections(client, lesson, "Analyst", max_concurrency=5, on_progress=reported.append)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([s.content for s in lesson.sections], [f"Body of S{i}" for i in range(5)])
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(reported[-1], [SECTION_DONE] * 5)
+
+    def test_concurrency_cap(self):
+        client = FakeChatClient(delay=0.05)
+        expand_sections(client, make_lesson(6), "Analyst", max_concurrency=2)
+        self.assertLessEqual(client.peak, 2)
+
+
+class FakeStreamingClient:
+    """Streams each section as many small chunks with a paragraph break halfway."""
+    def __init__(self, chunks: int = 40, delay: float = 0.005):
+        self.chunks = chunks
+        self.delay = delay
+
+    def generate_chat_response(self, system_prompt, chat_history, **kwargs):
+        for i in range(self.chunks):
+            time.sleep(self.delay)
+            yield "\n\n" if i == self.chunks // 2 else "word "
+
+
+class TestStreamedSections(unittest.TestCase):
+    def test_updates_are_throttled_and_end_with_full_text(self):
+        lesson = make_lesson(3)
+        updates = []
+        expand_sections(FakeStreamingClient(), lesson, "Analyst", max_concurrency=3,
+                        on_section_update=lambda i, text, state: updates.append((i, text, state, time.monotonic())),
+                        render_interval_ms=100)
+
+        for i in range(3):
+            section_updates = [u for u in updates if u[0] == i]
+            final = section_updates[-1]
+            self.assertEqual(final[2], SECTION_DONE)
+            self.assertEqual(final[1], lesson.sections[i].content)
+            partial = [u for u in section_updates if u[2] == SECTION_WRITING]
+            self.assertTrue(partial, "no text was shown before the section finished")
+            self.assertTrue(all(len(u[1]) < len(final[1]) for u in partial))
+            # ~0.2s of streaming at a 100ms interval: a handful of renders, not one per chunk
+            self.assertLess(len(section_updates), 10)
+
+
+class TestContentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_key_depends_on_every_input(self):
+        base = make_cache_key("sys", "user", "gpt-4o", 0.5, "Lesson")
+        self.assertEqual(base, make_cache_key("sys", "user", "gpt-4o", 0.5, "Lesson"))
+        self.assertNotEqual(base, make_cache_key("sys", "user", "gpt-4o", 0.7, "Lesson"))
+        self.assertNotEqual(base, make_cache_key("sys", "user", "gpt-4o-mini", 0.5, "Lesson"))
+        self.assertNotEqual(base, make_cache_key("sys", "user", "gpt-4o", 0.5, "Quiz"))
+
+    def test_round_trip_and_schema_check(self):
+        cache = ContentCache(self.tmp.name)
+        cache.put("k", make_lesson(2))
+        hit = cache.get("k", Lesson)
+        self.assertEqual(hit.title, "Intro to AI")
+        self.assertEqual(len(hit.sections), 2)
+        self.assertIsNone(cache.get("k", Section))
+        self.assertIsNone(cache.get("missing", Lesson))
+
+    def test_lru_eviction_by_count(self):
+        cache = ContentCache(self.tmp.name, max_entries=2)
+        now = time.time()
+        for i, key in enumerate(["a", "b"]):
+            cache.put(key, make_lesson(1))
+            os.utime(os.path.join(self.tmp.name, f"{key}.json"), (now - 100 + i, now - 100 + i))
+        cache.get("a", Lesson)  # "a" becomes most recently used
+        cache.put("c", make_lesson(1))
+        self.assertIsNotNone(cache.get("a", Lesson))
+        self.assertIsNone(cache.get("b", Lesson))
+        self.assertIsNotNone(cache.get("c", Lesson))
+
+    def test_age_expiry(self):
+        cache = ContentCache(self.tmp.name, max_age_seconds=0)
+        cache.put("k", make_lesson(1))
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("k", Lesson))
+
+
+QUIZ_JSON = '''```json
+{"domain": "AI Fundamentals", "objective_id": "1.1", "questions": [
+  {"type": "True/False", "prompt": "Is a model trained?", "options": ["True", "False"],
+   "answer": "True", "rationale": "Yes, \\"trained\\" {really}.", "difficulty": "Beginner"},
+  {"type": "Single Choice", "prompt": "Pick one", "options": ["a", "b"],
+   "answer": "a", "rationale": "Because", "difficulty": "Advanced", "tags": ["x"]}
+]}
+```'''
+
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def feed_all(self, text, parser, step=3):
+        snapshots = []
+        for i in range(0, len(text), step):
+            if parser.feed(text[i:i + step]):
+                snap = parser.snapshot()
+                if snap is not None:
+                    snapshots.append(snap)
+        return snapshots
+
+    def test_questions_arrive_one_by_one(self):
+        parser = IncrementalJSONParser(root_fields=set(Quiz.model_fields))
+        snapshots = self.feed_all(QUIZ_JSON, parser)
+        self.assertTrue(parser.complete)
+        counts = [len(s.get("questions", [])) for s in snapshots]
+        self.assertIn(1, counts)
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(snapshots[-1]["questions"][0]["rationale"], 'Yes, "trained" {really}.')
+
+        partial = build_partial(Quiz, snapshots[counts.index(1)])
+        self.assertTrue(partial.has("domain"))
+        self.assertEqual(partial.value.questions[0].prompt, "Is a model trained?")
+
+    def test_wrapper_root_key_is_unwrapped(self):
+        parser = IncrementalJSONParser(root_fields=set(Quiz.model_fields))
+        body = QUIZ_JSON.strip("`json\n")
+        snapshots = self.feed_all('{"quiz": ' + body + '}', parser, step=5)
+        self.assertTrue(parser.unwrap)
+        self.assertIn(1, [len(s.get("questions", [])) for s in snapshots])
+
+
+class FakeStructuredClient(FakeChatClient):
+    """Returns a minimal valid object for every structured request."""
+    def __init__(self, fail_kinds=()):
+        super().__init__(delay=0)
+        self.fail_kinds = fail_kinds
+        self.calls = 0
+
+    def generate_content_stream(self, system_prompt, user_prompt, model_schema, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if model_schema.__name__.lower() in self.fail_kinds:
+            return
+        yield "{...}"
+        if model_schema is Lesson:
+            yield make_lesson(2)
+        elif model_schema is Lab:
+            yield Lab(title="L", domain="D", objective_id="1.1", goal="G", tools=[],
+                      steps=[LabStep(step_number=1, instruction="Do")], artifacts=[], rubric={})
+        elif model_schema is Quiz:
+            yield Quiz(domain="D", questions=[])
+        else:
+            yield Assignment(title="A", domain="D", scenario="S", task="T", deliverables=[],
+                             submission_requirements="R", rubric={})
+
+
+class TestPregeneration(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.bank = ContentBank(root=self.tmp.name, version="test")
+        self.log = lambda *args: None
+
+    def test_job_grid(self):
+        jobs = build_jobs(["A", "B"], ["Beginner"], ["lesson", "lab", "quiz", "assignment"], [30], [5])
+        kinds = [job.kind for job in jobs]
+        self.assertEqual(kinds.count("lesson"), 25 * 2)
+        self.assertEqual(kinds.count("lab"), 25)
+        self.assertEqual(kinds.count("quiz"), 5)
+        self.assertEqual(kinds.count("assignment"), 5 * 2)
+
+    def test_generates_into_bank_and_resumes(self):
+        jobs = build_jobs(["Analyst"], ["Beginner"], ["lesson", "quiz", "assignment"], [30], [5])[:8]
+        jobs += build_jobs(["Analyst"], ["Beginner"], ["lab"], [30], [5])[:1]
+        client = FakeStructuredClient(fail_kinds=("lab",))
+        stats = run_pregeneration(client, jobs, self.bank, workers=4, log=self.log)
+        self.assertEqual(stats, {"skipped": 0, "done": 8, "failed": 1})
+
+        lesson_job = jobs[0]
+        banked = self.bank.get("lesson", **lesson_job.params)
+        self.assertEqual([s.content for s in banked.sections], ["Body of S0", "Body of S1"])
+
+        # Second run only retries the failed job
+        client.fail_kinds = ()
+        stats = run_pregeneration(client, jobs, self.bank, workers=4, log=self.log)
+        self.assertEqual(stats, {"skipped": 8, "done": 1, "failed": 0})
+
+
+class TestClientPool(unittest.TestCase):
+    def test_clients_are_shared_per_key_and_endpoint(self):
+        a = get_shared_client("sk-test-a")
+        self.assertIs(a, get_shared_client("sk-test-a"))
+        self.assertIsNot(a, get_shared_client("sk-test-b"))
+        self.assertIsNot(a, get_shared_client("sk-test-a", "http://127.0.0.1:9/v1"))
+        self.assertEqual(get_shared_client("sk-test-b").api_key, "sk-test-b")
+
+
+class FakeUpstream:
+    """Minimal stand-in for openai.OpenAI streaming a fixed text in small pieces."""
+    def __init__(self, text: str, piece: int = 20, delay: float = 0.01):
+        self.text, self.piece, self.delay = text, piece, delay
+        self.requests = 0
+        self.pieces_sent = 0
+        self.closed = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests += 1
+        return self._stream()
+
+    def _stream(self):
+        try:
+            for i in range(0, len(self.text), self.piece):
+                time.sleep(self.delay)
+                self.pieces_sent += 1
+                delta = SimpleNamespace(content=self.text[i:i + self.piece])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        finally:
+            self.closed += 1
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.upstream = FakeUpstream(QUIZ_JSON)
+        self.client = OpenAIClient(cache=ContentCache(self.tmp.name), api_key="test", metrics=MetricsStore(db_path=None))
+        self.client._get_client = lambda: self.upstream
+
+    def consume(self, results, start_delay=0.0, client=None):
+        time.sleep(start_delay)
+        chunks, final = [], None
+        for chunk in (client or self.client).generate_content_stream("sys", "coalesce me", Quiz, use_cache=False):
+            if isinstance(chunk, str):
+                chunks.append(chunk)
+            else:
+                final = chunk
+        results.append(("".join(chunks), final))
+
+    def test_concurrent_identical_requests_share_one_upstream_stream(self):
+        results = []
+        threads = [threading.Thread(target=self.consume, args=(results, delay)) for delay in (0, 0, 0.1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.upstream.requests, 1)
+        self.assertEqual(len(results), 3)
+        for text, final in results:
+            self.assertEqual(text, QUIZ_JSON)  # late joiner got the prefix too
+            self.assertEqual(len(final.questions), 2)
+
+    def test_requests_on_different_keys_are_not_coalesced(self):
+        other_upstream = FakeUpstream(QUIZ_JSON)
+        other = OpenAIClient(cache=ContentCache(self.tmp.name), api_key="other", metrics=MetricsStore(db_path=None))
+        other._get_client = lambda: other_upstream
+        results = []
+        threads = [threading.Thread(target=self.consume, args=(results, 0, client)) for client in (self.client, other)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual((self.upstream.requests, other_upstream.requests), (1, 1))
+        self.assertEqual(len(results), 2)
+
+
+class TestCancellation(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.upstream = FakeUpstream("word " * 200, piece=5)
+        self.metrics = MetricsStore(db_path=None)
+        self.client = OpenAIClient(cache=ContentCache(self.tmp.name), api_key="test", metrics=self.metrics)
+        self.client._get_client = lambda: self.upstream
+
+    def test_new_run_cancels_previous_token(self):
+        registry = CancelRegistry()
+        first = registry.new_run("session")
+        second = registry.new_run("session")
+        self.assertTrue(first.cancelled)
+        self.assertFalse(second.cancelled)
+        self.assertIs(registry.current("session"), second)
+
+    def test_idle_sessions_are_evicted(self):
+        now = [0.0]
+        registry = CancelRegistry(idle_ttl_s=60.0, clock=lambda: now[0])
+        gone = registry.new_run("gone")
+        now[0] = 30.0
+        live = registry.new_run("live")
+        now[0] = 70.0
+        registry.current("live")
+        registry.new_run("new")
+        # Only the session idle past the TTL is dropped, and its generations stop
+        self.assertEqual(len(registry), 2)
+        self.assertTrue(gone.cancelled)
+        self.assertFalse(live.cancelled)
+        now[0] = 120.0
+        registry.new_run("other")
+        self.assertEqual(len(registry), 3)
+        self.assertIs(registry.current("live"), live)
+
+    def test_cancelled_chat_stream_is_closed_and_counted(self):
+        # A completed call of the same task gives the expected output size
+        self.metrics.record(CallMetrics(task="chat", model="gpt-4o-mini", started_at=time.time(),
+                                        duration_ms=100.0, completion_tokens=200))
+        token = CancelToken()
+        received = []
+        with self.assertRaises(GenerationCancelled):
+            for chunk in self.client.generate_chat_response("sys", [{"role": "user", "content": "hi"}],
+                                                             model="gpt-4o-mini", cancel_token=token):
+                received.append(chunk)
+                if len(received) == 3:
+                    token.cancel("navigated away")
+
+        self.assertEqual(len(received), 3)
+        self.assertEqual(self.upstream.closed, 1)
+        self.assertLess(self.upstream.pieces_sent, 200)
+        call = self.metrics.recent(task="chat")[-1]
+        self.assertTrue(call.cancelled)
+        self.assertGreater(call.tokens_saved, 0)
+        summary = self.metrics.summary_by_page()[0]
+        self.assertEqual(summary["Cancelled"], 1)
+        self.assertEqual(summary["Errors"], 0)
+
+    def test_abandoned_coalesced_stream_stops_upstream(self):
+        token = CancelToken()
+        stream = self.client.generate_content_stream("sys", "cancel me", Quiz, use_cache=False, cancel_token=token)
+        next(stream)
+        token.cancel("rerun")
+        with self.assertRaises(GenerationCancelled):
+            next(stream)
+
+        deadline = time.monotonic() + 2
+        while not self.upstream.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.upstream.closed, 1)
+        self.assertLess(self.upstream.pieces_sent, 200)
+
+    def test_pending_sections_are_not_started(self):
+        client = FakeChatClient(delay=0.2)
+        lesson = make_lesson(6)
+        token = CancelToken()
+        timer = threading.Timer(0.05, token.cancel)
+        timer.start()
+        start = time.perf_counter()
+        with self.assertRaises(GenerationCancelled):
+            expand_sections(client, lesson, "Analyst", max_concurrency=2, cancel_token=token)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertTrue(all(not s.content for s in lesson.sections[2:]))
+
+
+class TestRateLimiter(unittest.TestCase):
+    def queue_up(self, limiter, requests):
+        """Starts (session, priority) requests one after another against an empty bucket; returns grant order."""
+        granted, positions, threads = [], {}, []
+
+        def request(name, session, priority):
+            limiter.acquire(session, priority, tokens=10, on_wait=lambda p: positions.setdefault(name, p))
+            granted.append(name)
+
+        for name, session, priority in requests:
+            thread = threading.Thread(target=request, args=(name, session, priority))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(5)
+        return granted, positions
+
+    def test_priority_then_round_robin_across_sessions(self):
+        limiter = RateLimiter(requests_per_minute=300, tokens_per_minute=None)  # one request per 200ms
+        limiter._requests.level = 0
+        granted, positions = self.queue_up(limiter, [
+            ("batch", "cli", PRIORITY_BATCH),
+            ("a1", "alice", PRIORITY_INTERACTIVE),
+            ("a2", "alice", PRIORITY_INTERACTIVE),
+            ("a3", "alice", PRIORITY_INTERACTIVE),
+            ("b1", "bob", PRIORITY_INTERACTIVE),
+        ])
+        self.assertEqual(granted, ["a1", "b1", "a2", "a3", "batch"])
+        self.assertEqual(positions["batch"], 1)  # alone in the queue when it arrived
+        self.assertEqual(positions["b1"], 2)  # jumped ahead of alice's second and third requests
+
+    def test_token_budget_and_settlement(self):
+        limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=6000)  # 100 tokens/s
+        reservation = limiter.acquire("s", tokens=5000)
+        reservation.settle(6000)  # used more than estimated: the bucket is now empty
+        start = time.perf_counter()
+        limiter.acquire("s", tokens=20)
+        self.assertGreater(time.perf_counter() - start, 0.15)
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=None)
+        limiter._requests.level = 0
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        with self.assertRaises(GenerationCancelled):
+            limiter.acquire("s", should_stop=lambda: token.cancelled)
+        self.assertIsNone(limiter.position("s"))
+
+
+class TestModelRouter(unittest.TestCase):
+    def record(self, metrics, task, model, duration_ms, count=5):
+        for _ in range(count):
+            metrics.record(CallMetrics(task=task, model=model, started_at=time.time(), duration_ms=duration_ms))
+
+    def test_falls_back_when_p95_exceeds_budget(self):
+        router = ModelRouter.from_settings({"default_model": "gpt-4o"})
+        metrics = MetricsStore(db_path=None)
+        self.assertEqual(router.resolve("lab", metrics), "gpt-4o")  # not enough samples yet
+
+        self.record(metrics, "lab", "gpt-4o", 10000)
+        self.assertEqual(router.resolve("lab", metrics), "gpt-4o")
+
+        self.record(metrics, "lab", "gpt-4o", 90000)
+        decision = router.decide("lab", metrics)
+        self.assertTrue(decision.fell_back)
+        self.assertEqual(decision.model, "gpt-4o-mini")
+        self.assertIn("p95", decision.reason)
+
+    def test_settings_round_trip(self):
+        router = ModelRouter.from_settings({
+            "default_model": "gpt-4-turbo",
+            "model_routing": {"grading": {"model": "gpt-4o", "p95_budget_ms": 5000.0}}
+        })
+        self.assertEqual(router.primary_model("section"), "gpt-4-turbo")
+        self.assertEqual(router.primary_model("grading"), "gpt-4o")
+        self.assertEqual(router.routes["grading"].fallback_model, "gpt-4o-mini")
+        self.assertEqual(ModelRouter.from_settings(router.to_settings()).to_settings(), router.to_settings())
+
+
+def make_question(i, difficulty=DifficultyLevel.BEGINNER, tags=()):
+    return Question(id="q1", type=QuestionType.SINGLE_CHOICE, prompt=f"Question {i}?", options=["A", "B"],
+                    answer="A", rationale="R", difficulty=difficulty, tags=list(tags))
+
+
+class FakeQuizClient:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content_stream(self, system_prompt, user_prompt, model_schema, **kwargs):
+        self.calls += 1
+        yield Quiz(domain="AI Fundamentals", questions=[make_question(f"{user_prompt[-40:]} {i}") for i in range(10)])
+
+
+class TestQuestionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = QuestionPool(os.path.join(self.tmp.name, "pool.db"))
+
+    def test_dedupes_and_filters(self):
+        questions = [make_question(i, DifficultyLevel.ADVANCED if i % 2 else DifficultyLevel.BEGINNER,
+                                   tags=["ethics"] if i < 3 else []) for i in range(10)]
+        self.assertEqual(len(self.pool.add_questions(questions, "D", "1.1")), 10)
+        self.assertEqual(self.pool.add_questions(questions, "D", "1.1"), [])  # same content, same ids
+        self.assertEqual(self.pool.count("D"), 10)
+        self.assertEqual(self.pool.count("D", difficulty="Advanced"), 5)
+        self.assertEqual(self.pool.count("D", tags=["Ethics"]), 3)
+        self.assertEqual(self.pool.count("D", objective_id="1.2"), 0)
+        self.assertEqual(self.pool.count("Other"), 0)
+
+    def test_quiz_excludes_seen_questions(self):
+        self.pool.add_questions([make_question(i) for i in range(25)], "D")
+        first = self.pool.assemble_quiz("D", 20, "alice")
+        self.assertEqual(len({q.id for q in first.questions}), 20)
+        self.assertIsNone(self.pool.assemble_quiz("D", 20, "alice"))  # only 5 unseen left
+        self.assertEqual(self.pool.count("D", learner_id="alice"), 5)
+        self.assertEqual(self.pool.count("D", learner_id="bob"), 25)
+        self.assertTrue(self.pool.is_low("D", "alice", 5))
+
+    def test_generated_quiz_counts_as_seen(self):
+        quiz = Quiz(domain="D", questions=[make_question(i) for i in range(3)])
+        stored = self.pool.add_quiz(quiz, "alice")
+        self.assertEqual(len({q.id for q in stored.questions}), 3)
+        self.assertEqual(self.pool.count("D"), 3)
+        self.assertEqual(self.pool.count("D", learner_id="alice"), 0)
+
+    def test_review_quiz_repeats_due_questions(self):
+        stored = self.pool.add_questions([make_question(i) for i in range(6)], "D", "1.1")
+        self.pool.mark_seen("alice", [q.id for q in stored])
+        cards = [ReviewCard(kind="question", item_id=stored[0].id, domain="D"),
+                 ReviewCard(kind="objective", item_id="1.1", domain="D"),
+                 ReviewCard(kind="objective", item_id="9.9", domain="D")]  # nothing pooled for it
+        review = self.pool.assemble_review_quiz("D", cards)
+        self.assertEqual(len({q.id for q in review.questions}), 2)
+        self.assertEqual(review.questions[0].id, stored[0].id)
+        self.assertIsNone(self.pool.assemble_review_quiz("D", cards[2:]))
+
+    def test_background_top_up(self):
+        refiller = PoolRefiller(self.pool)
+        client = FakeQuizClient()
+        self.assertTrue(refiller.request_top_up(client, "AI Fundamentals"))
+        deadline = time.time() + 5
+        while refiller.is_running("AI Fundamentals") and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(self.pool.count("AI Fundamentals"), 10)
+        self.assertEqual(self.pool.count("AI Fundamentals", objective_id="1.1"), 10)
+
+
+def templated_stems(n):
+    """n distinct stems written from a few templates, like a generated question bank."""
+    templates = ["Which of the following best describes {} for {}?", "What is the primary purpose of {} in {}?",
+                 "Which statement about {} in {} is true?", "How should {} be used for {}?"]
+    adjectives = ("supervised unsupervised federated generative discriminative probabilistic adversarial robust private "
+                  "fair explainable transparent autonomous predictive prescriptive scalable secure biased regularized "
+                  "ensemble sparse dense recurrent convolutional pretrained multimodal synthetic labelled streaming").split()
+    nouns = ("learning model classifier pipeline dataset embedding agent policy audit benchmark metric loss gradient "
+             "feature prompt retriever tokenizer encoder decoder transformer chatbot guardrail evaluation deployment "
+             "monitoring governance drift bias hallucination inference").split()
+    contexts = [f"{sector} {team}" for sector in ("retail healthcare banking insurance logistics education government "
+                                                  "manufacturing telecom energy").split()
+                for team in "operations compliance analytics support forecasting hiring marketing security research "
+                                "procurement onboarding legal".split()]
+    combos = itertools.product(contexts, adjectives, nouns)
+    return [templates[i % len(templates)].format(f"{adjective} {noun}", context)
+            for i, (context, adjective, noun) in zip(range(n), combos)]
+
+
+class TestNearDuplicates(unittest.TestCase):
+    def test_reworded_stem_is_a_near_duplicate(self):
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.add("a", "Which of the following best describes supervised learning?"))
+        self.assertIsNone(index.add("b", "What is the main risk of prompt injection in an LLM application?"))
+        self.assertEqual(index.find("Which of the following best defines supervised learning?"), "a")
+        self.assertEqual(index.add("c", "which of the following BEST describes supervised learning"), "a")
+        self.assertIsNone(index.find("How should an IT manager audit model drift?"))
+        self.assertIsNone(index.find("Which of the following best describes unsupervised learning?"))
+        self.assertIsNone(index.find("Which of the following does NOT describe supervised learning?"))
+        self.assertEqual(len(index), 2)
+
+    def test_templated_stems_stay_apart_and_fast(self):
+        index = NearDuplicateIndex()
+        stems = templated_stems(100_000)
+        for i, stem in enumerate(stems):
+            index.add_signature(i, index.signature(stem))
+        self.assertLessEqual(max(len(bucket) for band in index._bands for bucket in band.values()), MAX_BUCKET)
+        self.assertIsNone(index.find("Which of the following best describes unsupervised learning for retail operations?"))
+
+        queries = [(i, stems[i].replace("best describes", "best defines")) for i in range(0, 100_000, 997)]
+        start = time.perf_counter()
+        found = [index.find(query) for _, query in queries]
+        self.assertLess((time.perf_counter() - start) / len(queries), 0.001)
+        self.assertEqual(found, [i for i, _ in queries])
+
+    def test_pool_rejects_near_duplicates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = QuestionPool(os.path.join(tmp, "pool.db"))
+            original = make_question(0).model_copy(update={"prompt": "Which of the following best describes supervised learning?"})
+            reworded = original.model_copy(update={"prompt": "Which of the following best defines supervised learning?"})
+            self.assertEqual(len(pool.add_questions([original], "D")), 1)
+            self.assertEqual(pool.add_questions([reworded], "D"), [])
+
+            quiz = pool.add_quiz(Quiz(domain="D", questions=[reworded, make_question(1), reworded]), "alice")
+            self.assertEqual(len(quiz.questions), 2)  # prompts are unique again, so answers cannot collide
+            self.assertEqual(quiz.questions[0], pool.get([quiz.questions[0].id])[0])  # the pooled original is served
+            self.assertEqual(quiz.questions[0].prompt, original.prompt)
+            self.assertEqual(pool.count("D"), 2)
+            self.assertEqual(pool.count("D", learner_id="alice"), 0)  # the pooled original counts as seen
+
+            # The index is rebuilt from the stored signatures
+            self.assertEqual(QuestionPool(pool.db_path).add_questions([reworded], "D"), [])
+
+
+class TestLessonIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = LessonIndex(self.tmp.name)
+        for role in ["IT Support Specialist", "IT Manager", "Data Analyst"]:
+            self.index.add(make_lesson(2).model_copy(update={"title": role}), "1.1", "Beginner", 30, role)
+
+    def test_normalizes_roles(self):
+        self.assertEqual(normalize_role(" it support  specialist "), "it support specialist")
+        self.assertEqual(normalize_role("IT Support Spec."), "it support specialist")
+
+    def test_matches_near_identical_roles(self):
+        for role in ["it support specialist ", "IT Support Spec.", "IT Support Specialists"]:
+            match = self.index.best_match("1.1", "Beginner", 30, role)
+            self.assertEqual(match.role, "IT Support Specialist", role)
+            self.assertEqual(self.index.load(match.lesson_id).title, "IT Support Specialist")
+        self.assertIsNone(self.index.best_match("1.1", "Beginner", 30, "Network Administrator"))
+
+    def test_filters_on_objective_level_and_duration(self):
+        self.assertIsNone(self.index.best_match("1.2", "Beginner", 30, "IT Manager"))
+        self.assertIsNone(self.index.best_match("1.1", "Advanced", 30, "IT Manager"))
+        self.assertIsNone(self.index.best_match("1.1", "Beginner", 45, "IT Manager"))
+        top = LessonIndex(self.tmp.name).search("1.1", "Beginner", 30, "IT Mgr", k=3)  # reloaded from disk
+        self.assertEqual([m.role for m in top][0], "IT Manager")
+        self.assertEqual(len(top), 3)
+
+
+class FakeLessonClient(FakeChatClient):
+    """Outline + sections, with the outline call optionally held until released."""
+    def __init__(self, delay: float = 0.01):
+        super().__init__(delay)
+        self.release = threading.Event()
+        self.release.set()
+        self.outlines = 0
+
+    def generate_content_stream(self, system_prompt, user_prompt, model_schema, **kwargs):
+        self.outlines += 1
+        self.release.wait(5)
+        yield make_lesson(3)
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = LessonIndex(self.tmp.name)
+
+    def target(self, objective_id):
+        return PrefetchTarget.lesson(get_objective_by_id(objective_id), "Beginner", 30, "IT Manager")
+
+    def test_predicts_next_objective(self):
+        self.assertEqual(predict_next_objective(UserProgress()).id, "1.1")
+        self.assertEqual(predict_next_objective(UserProgress(), last_objective_id="1.5").id, "2.1")
+        weak = UserProgress(quiz_scores={"AI Fundamentals": [90.0], "Ethics & Security": [40.0]})
+        self.assertEqual(predict_next_objective(weak).id, "4.1")
+        self.assertEqual(predict_next_objective(UserProgress(completed_lessons=["1.1"])).id, "1.2")
+
+    def test_prefetched_lesson_is_ready(self):
+        prefetcher = Prefetcher(self.index)
+        target = self.target("1.2")
+        self.assertTrue(prefetcher.prefetch("alice", FakeLessonClient(), target))
+        prefetcher.pending("alice", target).result(timeout=5)
+        self.assertTrue(prefetcher.is_ready(target))
+        lesson = self.index.load(self.index.best_match("1.2", "Beginner", 30, "it manager").lesson_id)
+        self.assertEqual(lesson.sections[0].content, "Body of S0")
+        self.assertFalse(prefetcher.prefetch("alice", FakeLessonClient(), target))  # already warm
+
+    def test_wrong_prediction_is_cancelled(self):
+        prefetcher = Prefetcher(self.index)
+        client = FakeLessonClient()
+        client.release.clear()
+        wrong, right = self.target("1.2"), self.target("1.3")
+        prefetcher.prefetch("alice", client, wrong)
+        future = prefetcher.pending("alice", wrong)
+        prefetcher.cancel("alice", keep=right)
+        client.release.set()
+        future.result(timeout=5)
+        self.assertIsNone(prefetcher.pending("alice", wrong))
+        self.assertFalse(prefetcher.is_ready(wrong))
+        self.assertEqual(client.peak, 0)  # no section was written
+        self.assertEqual(prefetcher.stats["cancelled"], 1)
+
+    def test_budget_per_learner(self):
+        prefetcher = Prefetcher(self.index, budget=2)
+        client = FakeLessonClient()
+        started = [prefetcher.prefetch("alice", client, self.target(obj)) for obj in ("1.1", "1.2", "1.3")]
+        self.assertEqual(started, [True, True, False])
+        self.assertTrue(prefetcher.prefetch("bob", client, self.target("1.3")))
+
+
+if __name__ == '__main__':
+    unittest.main()
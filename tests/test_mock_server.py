@@ -0,0 +1,169 @@
+import os
+import tempfile
+import time
+import unittest
+from src.core.cache import ContentCache
+from src.core.openai_client import OpenAIClient
+from src.core.prompts import PromptBuilder
+from src.core.schemas import Lesson, Lab, Quiz, Assignment
+from src.core.telemetry import MetricsStore
+from src.core.rate_limit import RateLimiter
+from src.core.hedging import HedgePolicy
+from src.tools.mock_server import MockLLMConfig, start_mock_server
+from src.tools.benchmark import percentile, run_benchmark, record_run, find_regressions
+
+FAST = MockLLMConfig(ttft_ms=5, tokens_per_sec=20000)
+
+
+class MockServerTestCase(unittest.TestCase):
+    config = FAST
+
+    def setUp(self):
+        self.server = start_mock_server(self.config)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.metrics = MetricsStore(db_path=None)
+        self.client = OpenAIClient(cache=ContentCache(self.tmp.name), api_key="mock",
+                                   base_url=self.server.base_url, metrics=self.metrics)
+
+    def generate(self, system_prompt, prompt, schema, task="structured"):
+        final = None
+        for chunk in self.client.generate_content_stream(system_prompt, prompt, schema, use_cache=False, task=task):
+            if not isinstance(chunk, str):
+                final = chunk
+        return final
+
+
+class TestMockServer(MockServerTestCase):
+    def test_streams_schema_valid_objects(self):
+        lesson = self.generate(PromptBuilder.SYSTEM_LESSON,
+                               PromptBuilder.lesson_outline_prompt("AI Fundamentals", "Define AI", "Beginner", 30, "Analyst"),
+                               Lesson)
+        self.assertIsInstance(lesson, Lesson)
+        self.assertGreaterEqual(len(lesson.sections), 3)
+        self.assertIsInstance(self.generate(PromptBuilder.SYSTEM_LAB, PromptBuilder.lab_prompt("AI Fundamentals", "1.1", []), Lab), Lab)
+        quiz = self.generate(PromptBuilder.SYSTEM_QUIZ, PromptBuilder.quiz_prompt("Ethics & Security", "General", 7), Quiz)
+        self.assertEqual(len(quiz.questions), 7)
+        self.assertEqual(quiz.domain, "Ethics & Security")
+        self.assertIsInstance(self.generate(PromptBuilder.SYSTEM_SCENARIO, PromptBuilder.scenario_prompt("AI Fundamentals", "CTO"), Assignment), Assignment)
+
+    def test_deterministic_content(self):
+        history = [{"role": "user", "content": "Write about inference."}]
+        first = "".join(self.client.generate_chat_response("You are a technical writer.", history))
+        second = "".join(self.client.generate_chat_response("You are a technical writer.", history))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith("### "))
+
+    def test_calls_are_instrumented(self):
+        self.generate(PromptBuilder.SYSTEM_QUIZ, PromptBuilder.quiz_prompt("AI Fundamentals", "General", 3), Quiz, "quiz")
+        "".join(self.client.generate_chat_response("sys", [{"role": "user", "content": "hi"}], task="grading"))
+        quiz_call, grading_call = self.metrics.recent()
+        self.assertEqual((quiz_call.task, quiz_call.page), ("quiz", "Quiz Engine"))
+        self.assertEqual(grading_call.page, "Submission & Grading")
+        for call in (quiz_call, grading_call):
+            self.assertTrue(call.usage_reported)
+            self.assertGreater(call.completion_tokens, 0)
+            self.assertGreater(call.cost_usd, 0)
+            self.assertLessEqual(call.ttft_ms, call.duration_ms)
+            self.assertEqual(sum(call.gap_histogram), call.chunks - 1)
+        pages = {row["Page"]: row for row in self.metrics.summary_by_page()}
+        self.assertEqual(pages["Quiz Engine"]["Calls"], 1)
+
+
+class TestMockServerErrors(MockServerTestCase):
+    config = MockLLMConfig(ttft_ms=5, tokens_per_sec=20000, error_rate=1.0, error_status=400)
+
+    def test_error_injection(self):
+        with self.assertRaises(Exception):
+            "".join(self.client.generate_chat_response("sys", [{"role": "user", "content": "hi"}]))
+
+
+class TestMockServerRateLimited(MockServerTestCase):
+    # With seed 2 the first request draws a 429 and the second goes through
+    config = MockLLMConfig(ttft_ms=5, tokens_per_sec=20000, error_rate=0.6, error_status=429,
+                           retry_after_s=0.05, seed=2)
+
+    def test_429_is_retried_after_retry_after(self):
+        limiter = RateLimiter(None, None)
+        self.client.limiter = limiter
+        start = time.perf_counter()
+        text = "".join(self.client.generate_chat_response("sys", [{"role": "user", "content": "hi"}]))
+        self.assertTrue(text)
+        self.assertEqual(self.server.request_count, 2)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual((limiter.stats["retries"], limiter.stats["rate_limited"]), (1, 1))
+        self.assertIsNone(self.metrics.recent()[-1].error)
+
+
+class TestMockServerHedging(MockServerTestCase):
+    # With seed 4 the first request stalls and the second (the hedge) does not
+    config = MockLLMConfig(ttft_ms=5, tokens_per_sec=20000, stall_rate=0.3, stall_ms=1000, seed=4)
+
+    def setUp(self):
+        super().setUp()
+        self.client.hedge = HedgePolicy(enabled=True, default_delay_ms=100)
+
+    def test_hedge_wins_over_stalled_stream(self):
+        start = time.perf_counter()
+        quiz = self.generate(PromptBuilder.SYSTEM_QUIZ, PromptBuilder.quiz_prompt("AI Fundamentals", "General", 3), Quiz, "quiz")
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(quiz.questions), 3)
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(self.server.request_count, 2)
+        self.assertEqual((self.client.hedge.stats["fired"], self.client.hedge.stats["won"]), (1, 1))
+
+        # The stalled request is recorded once its thread notices it lost (at the latest at its first chunk)
+        deadline = time.monotonic() + 3
+        while len(self.metrics.recent()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stalled, hedge = sorted(self.metrics.recent(), key=lambda m: m.hedge)
+        self.assertTrue(stalled.cancelled)
+        self.assertTrue(hedge.hedge)
+        self.assertIsNone(hedge.error)
+        row = self.metrics.summary_by_page()[0]
+        self.assertEqual((row["Hedges"], row["Hedge wins"]), (1, 1))
+
+    def test_fast_stream_is_not_hedged(self):
+        self.server.config = FAST
+        self.generate(PromptBuilder.SYSTEM_LAB, PromptBuilder.lab_prompt("AI Fundamentals", "1.1", []), Lab, "lab")
+        self.assertEqual(self.server.request_count, 1)
+        self.assertEqual((self.client.hedge.stats["calls"], self.client.hedge.stats["fired"]), (1, 0))
+
+    def test_budget_caps_hedges(self):
+        policy = HedgePolicy(enabled=True, budget_fraction=0.5, max_credit=1.0)
+        self.assertTrue(policy.try_fire())
+        self.assertFalse(policy.try_fire())
+        policy.on_call()
+        self.assertFalse(policy.try_fire())
+        policy.on_call()
+        self.assertTrue(policy.try_fire())
+        self.assertEqual(policy.stats["over_budget"], 2)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertAlmostEqual(percentile(values, 50), 50.5)
+        self.assertAlmostEqual(percentile(values, 99), 99.01)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_run_and_compare(self):
+        results = run_benchmark(["quiz", "grading"], iterations=4, concurrency=2, mock_config=FAST)
+        self.assertEqual(set(results), {"quiz", "grading"})
+        for stats in results.values():
+            self.assertEqual(stats["errors"], 0)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            history = os.path.join(tmp, "history.jsonl")
+            before = {"config": {"c": 1}, "results": {"quiz": {"p95_ms": 100.0}}}
+            after = {"config": {"c": 1}, "results": {"quiz": {"p95_ms": 150.0}}}
+            self.assertIsNone(record_run(before, history))
+            previous = record_run(after, history)
+            self.assertEqual(find_regressions(after, previous, 0.15), ["quiz: p95 100.0ms -> 150.0ms"])
+
+
+if __name__ == '__main__':
+    unittest.main()